@@ -1,10 +1,23 @@
+import os
+import threading
 from flask import Flask
 from routes.api import api_blueprint
 from routes.map import map_blueprint
 from routes.tasks import tasks_blueprint
 from routes.auth import auth_blueprint
 from routes.index import index_blueprint
-from db import initialize_database
+from routes.tick import tick_blueprint
+from routes.system import system_blueprint
+from routes.stream import stream_blueprint
+from routes.market import market_blueprint
+from routes.governance import governance_blueprint
+from db import release_connection
+from migrations import migrate
+from metrics import init_app as init_metrics
+from read_path import init_app as init_read_path
+from response_encoding import init_app as init_response_encoding
+from player_cache import init_app as init_player_cache
+from tick import tick_loop
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -18,10 +31,39 @@ app.register_blueprint(map_blueprint)
 app.register_blueprint(tasks_blueprint)
 app.register_blueprint(auth_blueprint)
 app.register_blueprint(index_blueprint)
+app.register_blueprint(tick_blueprint)
+app.register_blueprint(system_blueprint)
+app.register_blueprint(stream_blueprint)
+app.register_blueprint(market_blueprint)
+app.register_blueprint(governance_blueprint)
 
-# Initialize the database
+# Time every request and count the SQL statements it issues (served on /metrics)
+init_metrics(app)
+
+# Encode /api responses as MessagePack for clients that ask, and gzip large ones
+init_response_encoding(app)
+
+# Hand the request's pooled database connection back once the request is done
+@app.teardown_request
+def return_connection(exception=None):
+    release_connection(force=True)
+
+# Bring the database schema up to date
 with app.app_context():
-    initialize_database()
+    migrate()
+
+# Serve @read_only views from the read path set by EXOGENESIS_READ_PATH
+init_read_path(app)
+
+# Start the tick engine in a background thread. Off by default so that only
+# the one process started with EXOGENESIS_TICK_THREAD=1 advances the clock
+runs_tick = os.environ.get("EXOGENESIS_TICK_THREAD", "0") != "0"
+if runs_tick:
+    tick_thread = threading.Thread(target=tick_loop, daemon=True)
+    tick_thread.start()
+
+# Flush cached player state on a timer when the tick runs in another process
+init_player_cache(app, runs_tick)
 
 if __name__ == "__main__":
     # Run the Flask app
@@ -1,23 +1,44 @@
 from flask import Flask, jsonify, request, render_template, send_from_directory
+import argparse
 import threading
 import time
 import random
 import json
+import math
 import os
+import sys
+from collections import defaultdict
 
 app = Flask(__name__)
 
-# Global game state
+# Global game state, persisted as a compacted snapshot plus an append-only
+# journal of the mutations made since that snapshot (one JSON record per line)
 GAME_STATE_FILE = "game_state.json"
-game_state = {
-    "resources": {
-        "energy": 75,
-        "materials": 60,
-        "data": 40
-    },
-    "tasks": [],
-    "alerts": []
-}
+GAME_JOURNAL_FILE = "game_state.journal"
+
+def initial_game_state():
+    """Return the state a new game starts from."""
+    return {
+        "seq": 0,  # Sequence number of the last mutation applied
+        "tick": 0,
+        "next_task_id": 1,
+        "resources": {
+            "energy": 75,
+            "materials": 60,
+            "data": 40
+        },
+        "tasks": {},  # Task ID -> task, each scheduled against an absolute "due_tick"
+        "alerts": []
+    }
+
+game_state = initial_game_state()
+
+# Due-queue of task IDs bucketed by the tick they finish (or fail) on, so a
+# tick only touches the tasks that are due instead of every task in flight
+task_wheel = defaultdict(list)
+
+# Serializes the tick thread and request handlers that mutate game_state
+state_lock = threading.Lock()
 
 # Tasks data with costs and prerequisites
 TASKS_DATA = {
@@ -31,58 +52,365 @@ TASKS_DATA = {
 # Tick interval in seconds
 tick_interval = 10
 
+# Chance that an in-flight task fails on any given tick
+TASK_FAILURE_CHANCE = 0.02
+
+# Random source for task failures; set EXOGENESIS_SEED for a reproducible game
+rng = random.Random(os.environ.get("EXOGENESIS_SEED"))
+
+# Longest simulation /api/simulate will run, and the most actions it applies per tick and in a workload
+MAX_SIMULATION_TICKS = 100000
+MAX_ACTIONS_PER_TICK = 100
+MAX_WORKLOAD_ACTIONS = 100000
+
+class RealClock:
+    """Wall clock: waiting for the next tick really sleeps."""
+
+    def now(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+class SimulatedClock:
+    """Virtual clock for headless runs: waiting for the next tick returns at once."""
+
+    def __init__(self, start=0.0):
+        self.time = start
+
+    def now(self):
+        return self.time
+
+    def sleep(self, seconds):
+        self.time += seconds
+
+# Journal durability: fsync at most this often (seconds), and compact into a
+# fresh snapshot after this many journaled mutations
+JOURNAL_FSYNC_INTERVAL = 1.0
+SNAPSHOT_INTERVAL = 500
+
+journal_file = None
+journal_records = 0
+journal_dirty = False
+last_fsync = 0.0
+
 def save_game_state():
-    """Save the current game state to a file."""
-    with open(GAME_STATE_FILE, "w") as file:
+    """Write a compacted snapshot atomically and start a fresh journal."""
+    global journal_file, journal_records, journal_dirty
+    temp_file = GAME_STATE_FILE + ".tmp"
+    with open(temp_file, "w") as file:
         json.dump(game_state, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_file, GAME_STATE_FILE)
+
+    # Everything journaled so far is covered by the snapshot
+    if journal_file is not None:
+        journal_file.close()
+    journal_file = open(GAME_JOURNAL_FILE, "w")
+    journal_records = 0
+    journal_dirty = False
+
+def sync_journal(force=False):
+    """fsync journaled mutations, at most once per JOURNAL_FSYNC_INTERVAL unless forced."""
+    global journal_dirty, last_fsync
+    now = time.monotonic()
+    if journal_dirty and (force or now - last_fsync >= JOURNAL_FSYNC_INTERVAL):
+        os.fsync(journal_file.fileno())
+        journal_dirty = False
+        last_fsync = now
+
+def commit_mutation(record):
+    """Apply a mutation to game_state and append it to the journal.
+
+    Callers hold state_lock. The cost is proportional to the mutation, not
+    to the size of the state; snapshots are only rewritten every
+    SNAPSHOT_INTERVAL mutations.
+    """
+    global journal_records, journal_dirty
+    record["seq"] = game_state["seq"] + 1
+    apply_mutation(record)
+
+    journal_file.write(json.dumps(record) + "\n")
+    journal_file.flush()
+    journal_records += 1
+    journal_dirty = True
+
+    if journal_records >= SNAPSHOT_INTERVAL:
+        save_game_state()
+    else:
+        sync_journal()
+
+def apply_mutation(record, state=None, wheel=None):
+    """Apply one mutation to game_state (used live, on replay and by simulations).
+
+    Returns advance_tick's counts for tick records, otherwise None.
+    """
+    state = game_state if state is None else state
+    result = None
+    if record["op"] == "tick":
+        result = advance_tick(state, wheel)
+    elif record["op"] == "assign":
+        for resource, cost in record["costs"].items():
+            state["resources"][resource] -= cost
+        add_task(record["task_id"], record["task"], state, wheel)
+    elif record["op"] == "clear_alerts":
+        state["alerts"] = []
+    state["seq"] = record["seq"]
+    return result
+
+def replay_journal():
+    """Apply journaled mutations newer than the loaded snapshot."""
+    try:
+        with open(GAME_JOURNAL_FILE, "r") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # Torn final record from a crash mid-write
+                if record["seq"] > game_state["seq"]:
+                    apply_mutation(record)
+    except FileNotFoundError:
+        pass
 
 def load_game_state():
-    """Load the game state from a file."""
+    """Load the latest snapshot, replay the journal tail and compact."""
     global game_state
     try:
         with open(GAME_STATE_FILE, "r") as file:
             game_state = json.load(file)
     except FileNotFoundError:
-        save_game_state()
+        pass
+    upgrade_game_state()
+    rebuild_task_wheel()
+    replay_journal()
+    save_game_state()
 
-# Load the game state on startup
-load_game_state()
+def upgrade_game_state():
+    """Convert a state file using per-task countdowns into due-tick scheduling."""
+    game_state.setdefault("seq", 0)
+    game_state.setdefault("tick", 0)
+    game_state.setdefault("next_task_id", 1)
+    if isinstance(game_state["tasks"], list):
+        tasks = game_state["tasks"]
+        game_state["tasks"] = {}
+        for task in tasks:
+            add_task(*schedule_task(task["name"], task.get("room"), task["ticks_remaining"]))
 
-def process_tick():
-    """Process a game tick."""
-    global game_state
+def schedule_task(name, room, ticks_required, state=None, random_source=None):
+    """Build a new task scheduled on the tick it resolves; returns (task_id, task).
+
+    The per-tick failure roll is sampled once up front (geometric
+    distribution), so the task is only touched again on the tick it either
+    fails or completes.
+    """
+    state = game_state if state is None else state
+    random_source = rng if random_source is None else random_source
+    task_id = str(state["next_task_id"])
+    try:
+        ticks_required = max(int(ticks_required), 1)
+    except OverflowError:
+        raise ValueError("ticks_required must be finite.") from None
+
+    ticks_to_failure = int(math.log(1.0 - random_source.random()) / math.log(1.0 - TASK_FAILURE_CHANCE)) + 1
+    fails = ticks_to_failure <= ticks_required
+    due_tick = state["tick"] + (ticks_to_failure if fails else ticks_required)
+
+    return task_id, {
+        "name": name,
+        "room": room,
+        "due_tick": due_tick,
+        "fails": fails
+    }
+
+def add_task(task_id, task, state=None, wheel=None):
+    """Add a task to the game state and its due-queue bucket."""
+    state = game_state if state is None else state
+    wheel = task_wheel if wheel is None else wheel
+    state["tasks"][task_id] = task
+    state["next_task_id"] = max(state["next_task_id"], int(task_id) + 1)
+    wheel[task["due_tick"]].append(task_id)
+
+def rebuild_task_wheel():
+    """Rebuild the due-queue from the tasks in the game state."""
+    task_wheel.clear()
+    for task_id, task in game_state["tasks"].items():
+        task_wheel[task["due_tick"]].append(task_id)
+
+def advance_tick(state=None, wheel=None):
+    """Advance the game by one tick, resolving only the tasks due now.
+
+    Returns the number of tasks that completed and failed.
+    """
+    state = game_state if state is None else state
+    wheel = task_wheel if wheel is None else wheel
+    state["tick"] += 1
+
+    # Resolve due tasks
+    completed = failed = 0
+    for task_id in wheel.pop(state["tick"], []):
+        task = state["tasks"].pop(task_id, None)
+        if task is None:
+            continue
+        if task["fails"]:
+            state["alerts"].append(f"Task {task['name']} failed!")
+            failed += 1
+            continue
+        completed += 1
+        if task["name"] == "Repair Comms Hub":
+            state["resources"]["energy"] += 10
+
+    # Example alerts
+    if state["resources"]["energy"] < 20:
+        if "Low energy levels!" not in state["alerts"]:
+            state["alerts"].append("Low energy levels!")
+
+    return {"completed": completed, "failed": failed}
+
+def assignment_error(task_name, state=None):
+    """Return why `task_name` cannot be assigned right now, or None if it can."""
+    state = game_state if state is None else state
+    if task_name not in TASKS_DATA:
+        return "Invalid task name."
+    task_data = TASKS_DATA[task_name]
+
+    # Check prerequisites
+    in_flight = {task["name"] for task in state["tasks"].values()}
+    if any(prereq not in in_flight for prereq in task_data["prerequisites"]):
+        return "Prerequisites not met."
+
+    # Check resource costs
+    for resource, cost in task_data["costs"].items():
+        if state["resources"].get(resource, 0) < cost:
+            return f"Not enough {resource} to start task."
+    return None
+
+def process_tick(clock=None):
+    """Process a game tick every tick_interval seconds of `clock`, forever."""
+    clock = RealClock() if clock is None else clock
     while True:
-        time.sleep(tick_interval)
+        clock.sleep(tick_interval)
+        with state_lock:
+            commit_mutation({"op": "tick"})
 
-        # Update tasks
-        for task in game_state["tasks"]:
-            if task["ticks_remaining"] > 0:
-                task["ticks_remaining"] -= 1
+            # Bound what a crash can lose to one tick
+            sync_journal(force=True)
 
-                # Lower failure chance
-                if random.random() < 0.02:  # 2% chance
-                    game_state["alerts"].append(f"Task {task['name']} failed!")
-                    game_state["tasks"].remove(task)
+def simulate(ticks, seed=0, workload=None, actions_per_tick=1.0, state=None, clock=None, on_tick=None):
+    """Fast-forward a copy of a game `ticks` ticks with the live rules and return a summary.
 
-        # Remove completed tasks
-        completed_tasks = [task for task in game_state["tasks"] if task["ticks_remaining"] == 0]
-        for task in completed_tasks:
-            if task["name"] == "Repair Comms Hub":
-                game_state["resources"]["energy"] += 10
+    `workload` is a list of scripted actions applied just before their
+    tick ({"tick", "task", "room", "ticks_required"} or {"tick", "op":
+    "clear_alerts"}); without one, random tasks are assigned at an average
+    of `actions_per_tick` per tick. Starts from `state` (default: a new
+    game), never touches the live game or its files, and waits on a
+    SimulatedClock unless given another clock. The same seed and workload
+    always give the same run. Each tick's stats are passed to `on_tick`.
+    """
+    if not math.isfinite(actions_per_tick) or not 0 <= actions_per_tick <= MAX_ACTIONS_PER_TICK:
+        raise ValueError(f"actions_per_tick must be between 0 and {MAX_ACTIONS_PER_TICK}")
+    if workload is not None and (not isinstance(workload, list) or len(workload) > MAX_WORKLOAD_ACTIONS):
+        raise ValueError(f"workload must be a list of at most {MAX_WORKLOAD_ACTIONS} actions")
+    random_source = random.Random(seed)
+    state = json.loads(json.dumps(initial_game_state() if state is None else state))
+    wheel = defaultdict(list)
+    for task_id, task in state["tasks"].items():
+        wheel[task["due_tick"]].append(task_id)
+    clock = SimulatedClock() if clock is None else clock
 
-        game_state["tasks"] = [task for task in game_state["tasks"] if task["ticks_remaining"] > 0]
+    scripted = defaultdict(list)
+    for action in workload or []:
+        scripted[int(action["tick"])].append(action)
+    task_names = list(TASKS_DATA)
 
-        # Example alerts
-        if game_state["resources"]["energy"] < 20:
-            if "Low energy levels!" not in game_state["alerts"]:
-                game_state["alerts"].append("Low energy levels!")
+    summary = {"ticks": ticks, "seed": seed, "assigned": {}, "rejected": {}, "completed": 0, "failed": 0}
+    started = time.perf_counter()
+    for _ in range(ticks):
+        tick = state["tick"] + 1
+        if workload is None:
+            count = int(actions_per_tick) + (random_source.random() < actions_per_tick % 1)
+            actions = [{"task": random_source.choice(task_names), "ticks_required": random_source.randint(1, 10)} for _ in range(count)]
+        else:
+            actions = scripted.pop(tick, [])
 
-        # Save the updated game state
-        save_game_state()
+        assigned = rejected = 0
+        for action in actions:
+            if action.get("op") == "clear_alerts":
+                apply_mutation({"op": "clear_alerts", "seq": state["seq"] + 1}, state, wheel)
+                continue
+            task_name = action["task"]
+            error = assignment_error(task_name, state)
+            if error:
+                reason = f"{task_name}: {error}"
+                summary["rejected"][reason] = summary["rejected"].get(reason, 0) + 1
+                rejected += 1
+                continue
+            task_id, task = schedule_task(task_name, action.get("room"), action.get("ticks_required", 1), state, random_source)
+            apply_mutation({"op": "assign", "seq": state["seq"] + 1, "task_id": task_id, "task": task,
+                            "costs": TASKS_DATA[task_name]["costs"]}, state, wheel)
+            summary["assigned"][task_name] = summary["assigned"].get(task_name, 0) + 1
+            assigned += 1
 
-# Start the tick system in a background thread
-tick_thread = threading.Thread(target=process_tick, daemon=True)
-tick_thread.start()
+        clock.sleep(tick_interval)
+        counts = apply_mutation({"op": "tick", "seq": state["seq"] + 1}, state, wheel)
+        summary["completed"] += counts["completed"]
+        summary["failed"] += counts["failed"]
+        if on_tick is not None:
+            on_tick({
+                "tick": state["tick"],
+                "clock": clock.now(),
+                "assigned": assigned,
+                "rejected": rejected,
+                **counts,
+                "in_flight": len(state["tasks"]),
+                "resources": dict(state["resources"]),
+                "alerts": len(state["alerts"]),
+            })
+
+    elapsed = time.perf_counter() - started
+    summary["elapsed_s"] = round(elapsed, 3)
+    summary["ticks_per_second"] = round(ticks / elapsed, 1) if elapsed else None
+    summary["final_state"] = {"tick": state["tick"], "resources": state["resources"], "in_flight": len(state["tasks"])}
+    return summary
+
+def simulate_cli(argv):
+    """python backend.py simulate --ticks N [--seed S] [--workload actions.json] [--state game_state.json]"""
+    parser = argparse.ArgumentParser(prog="backend.py simulate", description="Fast-forward the game headlessly.")
+    parser.add_argument("--ticks", type=int, required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workload", help="JSON list of scripted actions; random assignments if omitted")
+    parser.add_argument("--actions-per-tick", type=float, default=1.0)
+    parser.add_argument("--state", help="start from a saved game state file instead of a new game")
+    parser.add_argument("--ticks-output", help="write per-tick stats here as JSON lines")
+    args = parser.parse_args(argv)
+
+    workload = state = None
+    if args.workload:
+        with open(args.workload) as file:
+            workload = json.load(file)
+    if args.state:
+        with open(args.state) as file:
+            state = json.load(file)
+
+    ticks_file = open(args.ticks_output, "w") if args.ticks_output else None
+    on_tick = (lambda stats: ticks_file.write(json.dumps(stats) + "\n")) if ticks_file else None
+    try:
+        summary = simulate(args.ticks, args.seed, workload, args.actions_per_tick, state, on_tick=on_tick)
+    finally:
+        if ticks_file:
+            ticks_file.close()
+    print(json.dumps(summary, indent=2))
+
+# Headless simulations (python backend.py simulate ...) leave the saved game and tick thread alone
+HEADLESS = __name__ == "__main__" and sys.argv[1:2] == ["simulate"]
+
+if not HEADLESS:
+    # Load the game state on startup
+    load_game_state()
+
+    # Start the tick system in a background thread
+    tick_thread = threading.Thread(target=process_tick, daemon=True)
+    tick_thread.start()
 
 @app.route("/")
 def index():
@@ -99,7 +427,12 @@ def favicon():
 @app.route("/api/state", methods=["GET"])
 def get_game_state():
     """API endpoint to get the current game state."""
-    return jsonify(game_state)
+    with state_lock:
+        tasks = [
+            {"name": task["name"], "room": task["room"], "ticks_remaining": task["due_tick"] - game_state["tick"]}
+            for task in game_state["tasks"].values()
+        ]
+        return jsonify({**game_state, "tasks": tasks})
 
 @app.route("/api/assign_task", methods=["POST"])
 def assign_task():
@@ -107,44 +440,69 @@ def assign_task():
     global game_state
     task_name = request.json.get("task")
     room = request.json.get("room")
-    ticks_required = request.json.get("ticks_required", 1)
+    try:
+        ticks_required = int(request.json.get("ticks_required", 1))
+    except (TypeError, ValueError, OverflowError):
+        return jsonify({"error": "ticks_required must be a finite number."}), 400
 
     if task_name not in TASKS_DATA:
         return jsonify({"error": "Invalid task name."}), 400
 
     task_data = TASKS_DATA[task_name]
-    prerequisites = task_data["prerequisites"]
-
-    # Check prerequisites
-    if any(prereq not in [t["name"] for t in game_state["tasks"]] for prereq in prerequisites):
-        return jsonify({"error": "Prerequisites not met."}), 400
 
-    # Check resource costs
-    for resource, cost in task_data["costs"].items():
-        if game_state["resources"].get(resource, 0) < cost:
-            return jsonify({"error": f"Not enough {resource} to start task."}), 400
-
-    # Deduct resources
-    for resource, cost in task_data["costs"].items():
-        game_state["resources"][resource] -= cost
+    with state_lock:
+        # Check prerequisites and resource costs
+        error = assignment_error(task_name)
+        if error:
+            return jsonify({"error": error}), 400
 
-    # Add task to game state
-    game_state["tasks"].append({
-        "name": task_name,
-        "room": room,
-        "ticks_remaining": ticks_required
-    })
-
-    save_game_state()
+        # Deduct resources and add the task to the game state
+        task_id, task = schedule_task(task_name, room, ticks_required)
+        commit_mutation({"op": "assign", "task_id": task_id, "task": task, "costs": task_data["costs"]})
     return jsonify({"message": "Task added successfully!"}), 201
 
 @app.route("/api/clear_alerts", methods=["POST"])
 def clear_alerts():
     """API endpoint to clear all alerts."""
     global game_state
-    game_state["alerts"] = []
-    save_game_state()
+    with state_lock:
+        commit_mutation({"op": "clear_alerts"})
     return jsonify({"message": "Alerts cleared!"})
 
+@app.route("/api/simulate", methods=["POST"])
+def run_simulation():
+    """Fast-forward a copy of the game (a new one, or the current one) and return per-tick stats."""
+    data = request.json or {}
+    try:
+        ticks = int(data["ticks"])
+        seed = int(data.get("seed", 0))
+        actions_per_tick = float(data.get("actions_per_tick", 1.0))
+    except (KeyError, TypeError, ValueError, OverflowError):
+        return jsonify({"error": "ticks is required; ticks, seed and actions_per_tick must be numbers."}), 400
+    if not 1 <= ticks <= MAX_SIMULATION_TICKS:
+        return jsonify({"error": f"ticks must be between 1 and {MAX_SIMULATION_TICKS}."}), 400
+    if not math.isfinite(actions_per_tick):
+        return jsonify({"error": "actions_per_tick must be a finite number."}), 400
+    actions_per_tick = min(max(actions_per_tick, 0), MAX_ACTIONS_PER_TICK)
+    workload = data.get("workload")
+    if workload is not None and (not isinstance(workload, list) or len(workload) > MAX_WORKLOAD_ACTIONS):
+        return jsonify({"error": f"workload must be a list of at most {MAX_WORKLOAD_ACTIONS} actions."}), 400
+
+    state = None
+    if data.get("from_current_state"):
+        with state_lock:
+            state = json.loads(json.dumps(game_state))
+
+    per_tick = []
+    try:
+        summary = simulate(ticks, seed, workload, actions_per_tick, state,
+                           on_tick=per_tick.append if data.get("include_ticks", True) else None)
+    except (KeyError, TypeError, ValueError, OverflowError) as error:
+        return jsonify({"error": f"Invalid workload: {error}"}), 400
+    return jsonify({"summary": summary, "ticks": per_tick})
+
 if __name__ == "__main__":
-    app.run(debug=True)
+    if HEADLESS:
+        simulate_cli(sys.argv[2:])
+    else:
+        app.run(debug=True)
@@ -0,0 +1,44 @@
+import math
+
+# Most items accepted by one batch request
+MAX_BATCH_SIZE = 100000
+
+# How read_batch() names the item types it checks for
+ITEM_TYPE_NAMES = {dict: "an object", int: "an integer"}
+
+def read_batch(data, key, item_type=dict):
+    """Return the list of items under `key` in a batch request body; each must be an `item_type`."""
+    items = (data or {}).get(key)
+    if not isinstance(items, list) or not items:
+        raise ValueError(f"'{key}' must be a non-empty list.")
+    if len(items) > MAX_BATCH_SIZE:
+        raise ValueError(f"At most {MAX_BATCH_SIZE} items per batch.")
+    if not all(isinstance(item, item_type) and not isinstance(item, bool) for item in items):
+        raise ValueError(f"Every item in '{key}' must be {ITEM_TYPE_NAMES[item_type]}.")
+    return items
+
+def finite_float(value):
+    """Convert an item field to a float, rejecting NaN and infinities (SQLite would store NaN as NULL)."""
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError("Numbers must be finite.")
+    return number
+
+def next_ids(cursor, table, count):
+    """Reserve `count` consecutive ids for explicit inserts into `table`.
+
+    The caller must hold the write lock (BEGIN IMMEDIATE) until the rows
+    are inserted. AUTOINCREMENT tables also skip ids already handed out.
+    """
+    first = cursor.execute(f"""
+        SELECT MAX(
+            IFNULL((SELECT MAX(id) FROM {table}), 0),
+            IFNULL((SELECT seq FROM sqlite_sequence WHERE name = ?), 0)
+        ) + 1
+    """, (table,)).fetchone()[0]
+    return range(first, first + count)
+
+def batch_response(results):
+    """Summarize per-item results: {"created", "failed", "results"}."""
+    created = sum(1 for result in results if result["ok"])
+    return {"created": created, "failed": len(results) - created, "results": results}
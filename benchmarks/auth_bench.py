@@ -0,0 +1,100 @@
+"""Benchmark login throughput through the hashing pool.
+
+Registers users in a scratch database, then fires concurrent logins at
+/api/auth/login through the Flask test client while a probe thread times
+a cheap route, and reports logins per second (and per hashing worker),
+busy rejections and the probe's latency during the burst.
+
+    python benchmarks/auth_bench.py --users 50 --logins 400 --threads 16
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+from werkzeug.security import check_password_hash, generate_password_hash
+
+def percentile(samples, fraction):
+    """Return the sample at `fraction` of the sorted samples."""
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else None
+
+def inline_rate(logins):
+    """Logins per second when hashing runs on the calling thread."""
+    password_hash = generate_password_hash("benchmark")
+    started = time.perf_counter()
+    for _ in range(logins):
+        check_password_hash(password_hash, "benchmark")
+    return logins / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--logins", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-pending", type=int, default=64)
+    args = parser.parse_args()
+
+    os.environ["EXOGENESIS_TICK_THREAD"] = "0"
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(), "auth_bench.db")
+    from app import app
+    from password_hashing import configure_hashing, hashing_stats
+    configure_hashing(workers=args.workers, max_pending=args.max_pending)
+    client = app.test_client()
+
+    for index in range(args.users):
+        client.post("/api/auth/register", json={"username": f"user{index}", "password": "benchmark"})
+
+    # Time a cheap route while the login burst runs
+    probe_latencies = []
+    burst_running = threading.Event()
+    burst_running.set()
+
+    def probe():
+        probe_client = app.test_client()
+        while burst_running.is_set():
+            started = time.perf_counter()
+            probe_client.get("/api/tick/stats")
+            probe_latencies.append(time.perf_counter() - started)
+            time.sleep(0.005)
+
+    def login(index):
+        response = app.test_client().post("/api/auth/login", json={"username": f"user{index % args.users}", "password": "benchmark"})
+        return response.status_code
+
+    probe_thread = threading.Thread(target=probe)
+    probe_thread.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        statuses = list(executor.map(login, range(args.logins)))
+    elapsed = time.perf_counter() - started
+    burst_running.clear()
+    probe_thread.join()
+
+    succeeded = statuses.count(200)
+    report = {
+        "logins": args.logins,
+        "threads": args.threads,
+        "hashing_workers": args.workers,
+        "succeeded": succeeded,
+        "busy_rejections": statuses.count(503),
+        "logins_per_second": round(succeeded / elapsed, 1),
+        "logins_per_second_per_worker": round(succeeded / elapsed / args.workers, 1),
+        "inline_logins_per_second": round(inline_rate(min(args.logins, 50)), 1),
+        "probe_p50_ms": round(statistics.median(probe_latencies) * 1000, 2) if probe_latencies else None,
+        "probe_p99_ms": round(percentile(probe_latencies, 0.99) * 1000, 2) if probe_latencies else None,
+        "hashing": hashing_stats(),
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
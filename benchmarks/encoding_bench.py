@@ -0,0 +1,102 @@
+"""Benchmark response size and server time of JSON against MessagePack.
+
+Seeds a scratch database with players and map bodies, then requests each
+route repeatedly through the Flask test client as JSON and as MessagePack,
+each with and without gzip, with the response cache off so every request
+is encoded. Reports body bytes and p50/p99 request time per combination.
+
+    python benchmarks/encoding_bench.py --bodies 20000 --requests 200
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["EXOGENESIS_TICK_THREAD"] = "0"
+
+import db
+from migrations import migrate
+from tick_bench import seed
+
+# Routes measured, from a list of map bodies down to one player
+ROUTES = (
+    "/api/map",
+    "/api/map?bbox=0,0,16384,16384",
+    "/api/map/tiles/0/0/0",
+    "/api/tasks/active/1",
+    "/api/player/1",
+)
+
+# Accept and Accept-Encoding combinations compared
+ENCODINGS = {
+    "json": {"Accept": "application/json"},
+    "json+gzip": {"Accept": "application/json", "Accept-Encoding": "gzip"},
+    "msgpack": {"Accept": "application/msgpack"},
+    "msgpack+gzip": {"Accept": "application/msgpack", "Accept-Encoding": "gzip"},
+}
+
+def percentile(samples, fraction):
+    """Return the sample at `fraction` of the sorted samples."""
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)] if samples else None
+
+def seed_bodies(client, bodies):
+    """Add `bodies` map bodies spread over the galaxy through the batch endpoint."""
+    rng = random.Random(0)
+    client.post("/api/map/add_batch", json={"bodies": [{
+        "name": f"Bench Body {index}",
+        "type": rng.choice(("planet", "moon", "asteroid")),
+        "x": rng.uniform(0, 65536),
+        "y": rng.uniform(0, 65536),
+        "resources": {"energy": rng.randint(0, 50), "materials": rng.randint(0, 50)},
+    } for index in range(bodies)]})
+
+def measure(client, path, headers, requests):
+    """Request `path` `requests` times; return body size and request time percentiles."""
+    times = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get(path, headers=headers)
+        times.append((time.perf_counter() - started) * 1000)
+    times.sort()
+    return {
+        "status": response.status_code,
+        "bytes": len(response.data),
+        "p50_ms": round(percentile(times, 0.5), 3),
+        "p99_ms": round(percentile(times, 0.99), 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--bodies", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(), "encoding.db")
+    migrate()
+    seed(args.players)
+
+    from app import app
+    from response_cache import cache
+    from response_encoding import configure_encoding
+
+    client = app.test_client()
+    seed_bodies(client, args.bodies)
+    # Encode and compress every request rather than replaying cached bodies
+    cache.max_entries = 0
+    configure_encoding(compressed_cache_bytes=0)
+
+    report = {"players": args.players, "bodies": args.bodies, "routes": []}
+    for path in ROUTES:
+        report["routes"].append({
+            "path": path,
+            **{name: measure(client, path, headers, args.requests) for name, headers in ENCODINGS.items()},
+        })
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
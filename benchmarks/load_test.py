@@ -0,0 +1,317 @@
+"""Load test: simulated players driving the real blueprints.
+
+Seeds a scratch database with players, tasks, celestial bodies and a
+currency pair, then replays a seeded mix of player actions (assign, poll,
+explore, trade) through the Flask test client, or through a running
+server with --url, while a separate thread runs ticks through
+/api/tick/run. Reports p50/p95/p99 latency per route, throughput, tick
+duration and database size as JSON; with --baseline, compares against an
+earlier report and exits 1 if any route's p95 latency or the overall
+throughput regressed by more than --tolerance (p95 also by more than
+--min-delta-ms).
+
+    python benchmarks/load_test.py --players 1000 --requests 20000 --output load.json
+    python benchmarks/load_test.py --baseline load.json
+    python benchmarks/load_test.py --url http://127.0.0.1:5000 --players 200
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+
+# Relative weights of the player actions in the request mix
+ACTION_WEIGHTS = {
+    "assign_task": 15,
+    "poll_tasks": 20,
+    "poll_player": 15,
+    "poll_inbox": 10,
+    "view_map": 10,
+    "explore": 10,
+    "place_order": 10,
+    "view_book": 5,
+    "buy_currency": 5,
+}
+
+# Tasks seeded into a local scratch database (name, required_resources, rewards, duration)
+SEED_TASKS = [
+    ("Mine Regolith", {"energy": 2}, {"materials": 3}, 2),
+    ("Run Solar Array", {"materials": 1}, {"energy": 3}, 1),
+    ("Survey Orbit", {"energy": 3, "materials": 1}, {"data": 2}, 3),
+]
+
+# Side of the square the seeded bodies are scattered over
+SEED_MAP_SIZE = 4096
+
+# Items per batch request while seeding
+SEED_BATCH_SIZE = 10000
+
+def percentile(samples, fraction):
+    """Return the sample at `fraction` of the sorted samples."""
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else None
+
+def summarize(samples):
+    """Return count and p50/p95/p99/max in milliseconds for a list of seconds."""
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3),
+    }
+
+class TestClientTarget:
+    """Sends requests through the Flask test client of an in-process app."""
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def request(self, method, path, body=None):
+        """Return (status, parsed JSON or None)."""
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        return response.status_code, response.get_json(silent=True)
+
+class HttpTarget:
+    """Sends requests to a running server."""
+
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+
+    def request(self, method, path, body=None):
+        """Return (status, parsed JSON or None)."""
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.url + path, data=data, method=method, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return response.status, json.loads(response.read() or b"null")
+        except urllib.error.HTTPError as error:
+            return error.code, None
+
+def seed_local_tasks():
+    """Insert SEED_TASKS into the local scratch database and return their ids."""
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    ids = []
+    for name, required, rewards, duration in SEED_TASKS:
+        cursor.execute("""
+            INSERT INTO tasks (name, required_resources, rewards, duration)
+            VALUES (?, ?, ?, ?)
+        """, (name, json.dumps(required), json.dumps(rewards), duration))
+        ids.append(cursor.lastrowid)
+    conn.commit()
+    conn.close()
+    return ids
+
+def seed(target, args, rng):
+    """Create players, bodies and a currency pair through the batch endpoints.
+
+    Returns the ids the request mix draws from.
+    """
+    run = f"{int(time.time())}-{args.seed}"
+    player_ids = []
+    for start in range(0, args.players, SEED_BATCH_SIZE):
+        count = min(SEED_BATCH_SIZE, args.players - start)
+        _, body = target.request("POST", "/api/player/create_batch", {
+            "players": [{"name": f"Load Player {start + index}"} for index in range(count)]
+        })
+        player_ids += [result["id"] for result in body["results"] if result["ok"]]
+
+    body_ids = []
+    for start in range(0, args.bodies, SEED_BATCH_SIZE):
+        count = min(SEED_BATCH_SIZE, args.bodies - start)
+        _, body = target.request("POST", "/api/map/add_batch", {
+            "bodies": [{
+                "name": f"Load Body {run} {start + index}",
+                "type": rng.choice(("planet", "moon", "asteroid")),
+                "x": rng.uniform(0, SEED_MAP_SIZE),
+                "y": rng.uniform(0, SEED_MAP_SIZE),
+                "resources": {"energy": rng.randint(0, 50), "materials": rng.randint(0, 50)},
+            } for index in range(count)]
+        })
+        body_ids += [result["id"] for result in body["results"] if result["ok"]]
+
+    # Trades use currencies 1 and 2, which these are in a fresh database
+    for name in ("Base", "Quote"):
+        target.request("POST", "/api/currency/create_planetary", {"planet_id": player_ids[0], "planet_name": f"Load {name} {run}"})
+
+    if args.url:
+        # A running server keeps its own task catalog; use what the first player can afford
+        _, body = target.request("GET", f"/api/tasks/{player_ids[0]}")
+        task_ids = [task["id"] for task in (body or {}).get("tasks", [])]
+    else:
+        task_ids = seed_local_tasks()
+
+    return {"players": player_ids, "bodies": body_ids, "tasks": task_ids, "currencies": (1, 2)}
+
+def plan_requests(ids, count, rng):
+    """Draw `count` (route label, method, path, body) requests from the action mix."""
+    base, quote = ids["currencies"]
+    actions = list(ACTION_WEIGHTS)
+    weights = list(ACTION_WEIGHTS.values())
+    planned = []
+    for action in rng.choices(actions, weights, k=count):
+        player_id = rng.choice(ids["players"])
+        if action == "assign_task" and ids["tasks"]:
+            planned.append(("POST /api/tasks/assign", "POST", "/api/tasks/assign", {"player_id": player_id, "task_id": rng.choice(ids["tasks"])}))
+        elif action == "poll_tasks" or action == "assign_task":
+            planned.append(("GET /api/tasks/active/<player_id>", "GET", f"/api/tasks/active/{player_id}", None))
+        elif action == "poll_player":
+            planned.append(("GET /api/player/<player_id>", "GET", f"/api/player/{player_id}", None))
+        elif action == "poll_inbox":
+            planned.append(("GET /api/currency/notify", "GET", f"/api/currency/notify?player_id={player_id}", None))
+        elif action == "view_map":
+            x, y = rng.uniform(0, SEED_MAP_SIZE), rng.uniform(0, SEED_MAP_SIZE)
+            planned.append(("GET /api/map?bbox", "GET", f"/api/map?bbox={x:.0f},{y:.0f},{x + 256:.0f},{y + 256:.0f}", None))
+        elif action == "explore" and ids["bodies"]:
+            planned.append(("POST /api/map/explore", "POST", "/api/map/explore", {"id": rng.choice(ids["bodies"])}))
+        elif action == "place_order":
+            side = rng.choice(("buy", "sell"))
+            planned.append(("POST /api/market/orders", "POST", "/api/market/orders", {
+                "player_id": player_id, "base_currency_id": base, "quote_currency_id": quote,
+                "side": side, "price": round(rng.gauss(100, 2), 2), "quantity": rng.randint(1, 10),
+            }))
+        elif action == "view_book":
+            planned.append(("GET /api/market/book/<base>/<quote>", "GET", f"/api/market/book/{base}/{quote}?depth=10", None))
+        else:
+            planned.append(("POST /api/currency/buy", "POST", "/api/currency/buy", {
+                "buyer_id": player_id, "seller_id": rng.choice(ids["players"]), "currency_from_id": quote,
+                "currency_to_id": base, "amount": rng.randint(1, 10), "rate": round(rng.gauss(100, 2), 2),
+            }))
+    return planned
+
+def run_load(target, planned, threads, tick_interval):
+    """Replay the planned requests on `threads` workers while ticks run alongside.
+
+    Returns (latencies and error counts per route, tick durations, elapsed seconds).
+    """
+    latencies = {}
+    errors = {}
+    tick_durations = []
+    lock = threading.Lock()
+    running = threading.Event()
+    running.set()
+
+    def send(item):
+        label, method, path, body = item
+        started = time.perf_counter()
+        status, _ = target.request(method, path, body)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.setdefault(label, []).append(elapsed)
+            if status >= 400:
+                errors[label] = errors.get(label, 0) + 1
+
+    def ticker():
+        while running.is_set():
+            status, body = target.request("POST", "/api/tick/run")
+            if status == 200:
+                tick_durations.append(body["tick"]["duration_ms"] / 1000)
+            time.sleep(tick_interval)
+
+    tick_thread = threading.Thread(target=ticker, daemon=True)
+    started = time.perf_counter()
+    tick_thread.start()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(send, planned))
+    elapsed = time.perf_counter() - started
+    running.clear()
+    tick_thread.join()
+    return latencies, errors, tick_durations, elapsed
+
+def database_size():
+    """Bytes used by the local database file and its WAL."""
+    return sum(os.path.getsize(path) for path in (db.DB_PATH, db.DB_PATH + "-wal") if os.path.exists(path))
+
+def compare(report, baseline, tolerance, min_delta_ms):
+    """Return regression messages for p95 latency per route and overall throughput.
+
+    A route regresses when its p95 grew by more than `tolerance` and by
+    more than `min_delta_ms`, so sub-millisecond jitter is not reported.
+    """
+    regressions = []
+    for label, current in report["routes"].items():
+        previous = baseline.get("routes", {}).get(label)
+        if not previous or not previous.get("p95_ms") or "p95_ms" not in current:
+            continue
+        limit = max(previous["p95_ms"] * (1 + tolerance), previous["p95_ms"] + min_delta_ms)
+        if current["p95_ms"] > limit:
+            regressions.append(f"{label}: p95 {previous['p95_ms']} ms -> {current['p95_ms']} ms")
+    previous_rate = baseline.get("throughput_rps")
+    if previous_rate and report["throughput_rps"] < previous_rate * (1 - tolerance):
+        regressions.append(f"throughput: {previous_rate} -> {report['throughput_rps']} requests/s")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--bodies", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--tick-interval", type=float, default=0.25, help="seconds between ticks during the run")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--url", help="drive a running server instead of an in-process app")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="compare against an earlier JSON report")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed fractional regression against the baseline")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="p95 growth always allowed, in milliseconds")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.url:
+        target = HttpTarget(args.url)
+    else:
+        os.environ["EXOGENESIS_TICK_THREAD"] = "0"
+        os.environ["EXOGENESIS_MANUAL_TICKS"] = "1"
+        db.DB_PATH = os.path.join(tempfile.mkdtemp(), "load_test.db")
+        from app import app
+        target = TestClientTarget(app)
+
+    seeding_started = time.perf_counter()
+    ids = seed(target, args, rng)
+    seeding_elapsed = time.perf_counter() - seeding_started
+
+    planned = plan_requests(ids, args.requests, rng)
+    latencies, errors, tick_durations, elapsed = run_load(target, planned, args.threads, args.tick_interval)
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "seeding_s": round(seeding_elapsed, 3),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(planned) / elapsed, 1),
+        "routes": {label: {**summarize(samples), "errors": errors.get(label, 0)} for label, samples in sorted(latencies.items())},
+        "ticks": summarize(tick_durations),
+        "db_size_bytes": None if args.url else database_size(),
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(report, json.load(baseline_file), args.tolerance, args.min_delta_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
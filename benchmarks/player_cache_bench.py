@@ -0,0 +1,102 @@
+"""Benchmark player reads and task assignments with and without the player cache.
+
+Seeds a scratch database with N players, then for each cache size drives a
+mix of /api/player/<id> reads and /api/tasks/assign calls over a small set
+of active players from client threads for a few seconds, running a tick
+every second. Reports p50/p99 latency per route, requests per second and
+the cache's hit and flush counters.
+
+    python benchmarks/player_cache_bench.py --players 100000 --sizes 0 10000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["EXOGENESIS_TICK_THREAD"] = "0"
+
+import db
+from migrations import migrate
+from tick_bench import seed
+
+def percentile(samples, fraction):
+    """Return the sample at `fraction` of the sorted samples."""
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)] if samples else None
+
+def ticker(stop_event):
+    """Run a tick every second until stopped."""
+    from tick import run_tick
+    while not stop_event.wait(1):
+        run_tick()
+
+def client_loop(client, active, stop_event, latencies):
+    """Read and assign tasks for random active players until stopped, recording latency by route."""
+    rng = random.Random(threading.get_ident())
+    while not stop_event.is_set():
+        player_id = rng.choice(active)
+        started = time.perf_counter()
+        if rng.random() < 0.8:
+            client.get(f"/api/player/{player_id}")
+            route = "player"
+        else:
+            client.post("/api/tasks/assign", json={"player_id": player_id, "task_id": 1})
+            route = "assign"
+        latencies[route].append((time.perf_counter() - started) * 1000)
+
+def measure(app, active, clients, seconds):
+    """Run the clients and the ticker for `seconds`; return latency stats per route."""
+    stop_event = threading.Event()
+    latencies = {"player": [], "assign": []}
+    threads = [threading.Thread(target=client_loop, args=(app.test_client(), active, stop_event, latencies))
+               for _ in range(clients)]
+    threads.append(threading.Thread(target=ticker, args=(stop_event,)))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop_event.set()
+    for thread in threads:
+        thread.join()
+
+    report = {"requests_per_second": round(sum(map(len, latencies.values())) / seconds, 1)}
+    for route, samples in latencies.items():
+        samples.sort()
+        report[route] = {
+            "requests": len(samples),
+            "p50_ms": round(percentile(samples, 0.5), 3),
+            "p99_ms": round(percentile(samples, 0.99), 3),
+        }
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=50000)
+    parser.add_argument("--active", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 10000])
+    args = parser.parse_args()
+
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(), "player_cache.db")
+    migrate()
+    seed(args.players)
+
+    from app import app
+    from player_cache import cache, configure_player_cache
+
+    active = random.Random(0).sample(range(1, args.players + 1), args.active)
+    report = {"players": args.players, "active": args.active, "clients": args.clients,
+              "cpu_count": os.cpu_count(), "runs": []}
+    for size in args.sizes:
+        configure_player_cache(max_players=size)
+        report["runs"].append({"max_players": size, **measure(app, active, args.clients, args.seconds),
+                               "cache": cache.snapshot()})
+    configure_player_cache(max_players=0)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Benchmark GET latency with and without heavy ticks, for each read path mode.
+
+Seeds a scratch database with N players, then for every mode reads random
+players through /api/player/<id> from reader threads for a few seconds
+while idle, and again while a ticker thread completes a task for every
+player each tick. Reports p50/p99 read latency, reads per second, ticks
+run and the largest staleness reported by the responses.
+
+    python benchmarks/read_path_bench.py --players 100000 --modes primary snapshot backup
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["EXOGENESIS_TICK_THREAD"] = "0"
+
+import db
+from migrations import migrate
+from tick_bench import seed
+
+def percentile(samples, fraction):
+    """Return the sample at `fraction` of the sorted samples."""
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)] if samples else None
+
+def ticker(stop_event, ticks):
+    """Give every player a task due next tick, then run that tick, until stopped."""
+    from tick import current_tick, run_tick
+    while not stop_event.is_set():
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO active_tasks (player_id, task_id, ticks_remaining, due_tick)
+            SELECT id, 1, 1, ? FROM players
+        """, (current_tick(cursor) + 1,))
+        conn.commit()
+        conn.close()
+        run_tick()
+        ticks.append(1)
+
+def reader(client, players, stop_event, latencies, staleness):
+    """Read random players until stopped, recording latency and reported staleness."""
+    rng = random.Random(threading.get_ident())
+    while not stop_event.is_set():
+        started = time.perf_counter()
+        response = client.get(f"/api/player/{rng.randint(1, players)}")
+        latencies.append((time.perf_counter() - started) * 1000)
+        staleness.append(int(response.headers.get("X-Read-Staleness-Ms", 0)))
+
+def measure(app, players, readers, seconds, ticking):
+    """Run the readers (and the ticker if `ticking`) for `seconds`; return their stats."""
+    stop_event = threading.Event()
+    latencies, staleness, ticks = [], [], []
+    threads = [threading.Thread(target=reader, args=(app.test_client(), players, stop_event, latencies, staleness))
+               for _ in range(readers)]
+    if ticking:
+        threads.append(threading.Thread(target=ticker, args=(stop_event, ticks)))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop_event.set()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        "reads": len(latencies),
+        "reads_per_second": round(len(latencies) / seconds, 1),
+        "p50_ms": round(percentile(latencies, 0.5), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "ticks": len(ticks),
+        "max_staleness_ms": max(staleness, default=0),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=50000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--refresh-seconds", type=float, default=2)
+    parser.add_argument("--modes", nargs="+", default=["primary", "snapshot", "backup"])
+    args = parser.parse_args()
+
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(), "read_path.db")
+    migrate()
+    seed(args.players)
+
+    from app import app
+    from read_path import configure_read_path
+
+    report = {"players": args.players, "readers": args.readers, "cpu_count": os.cpu_count(), "runs": []}
+    for mode in args.modes:
+        configure_read_path(mode=mode, refresh_seconds=args.refresh_seconds)
+        report["runs"].append({
+            "mode": mode,
+            "idle": measure(app, args.players, args.readers, args.seconds, ticking=False),
+            "ticking": measure(app, args.players, args.readers, args.seconds, ticking=True),
+        })
+    configure_read_path(mode="primary")
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Benchmark tick wall time, serial versus partitioned across worker processes.
+
+Seeds a scratch database with N players, one due task and one due currency
+exchange per player, copies it once per configuration, runs a single tick
+on each copy and reports the tick duration. The resulting balances of
+every partitioned run are checked against the serial run.
+
+    python benchmarks/tick_bench.py --players 200000 --workers 0 2 4 8
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+from migrations import migrate
+from tick import run_tick
+from tick_shards import configure_tick_shards, start_tick_shards
+
+def seed(players):
+    """Fill the scratch database with players, due tasks and due exchanges."""
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO tasks (id, name, required_resources, rewards, duration)
+        VALUES (1, 'Mine', '{}', '{"energy": 3, "materials": 2}', 1)
+    """)
+    cursor.execute("""
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+        INSERT INTO players (id, name, resources) SELECT i, 'Player ' || i, '{}' FROM n
+    """, (players,))
+    cursor.execute("""
+        INSERT INTO active_tasks (player_id, task_id, ticks_remaining, due_tick)
+        SELECT id, 1, 1, 1 FROM players
+    """)
+    cursor.execute("""
+        INSERT INTO currency_exchange (buyer_id, seller_id, currency_from_id, currency_to_id, amount, rate, ticks_remaining, due_tick)
+        SELECT id, id % :players + 1, 1 + id % 3, 4 + id % 2, id % 10 + 1, 1.5, 1, 1 FROM players
+    """, {"players": players})
+    conn.commit()
+    conn.close()
+
+def copy_database(source, destination):
+    """Copy a database, including pages still in its WAL, with the backup API."""
+    with sqlite3.connect(source) as source_conn, sqlite3.connect(destination) as destination_conn:
+        source_conn.backup(destination_conn)
+
+def balances():
+    """Return every resource and currency balance, for comparing runs."""
+    conn = db.get_connection()
+    rows = (
+        conn.execute("SELECT player_id, resource, amount FROM player_resources ORDER BY 1, 2").fetchall(),
+        conn.execute("SELECT player_id, currency_id, round(amount, 6) FROM currency_balances ORDER BY 1, 2").fetchall(),
+    )
+    conn.close()
+    return [[tuple(row) for row in table] for table in rows]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=100000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 2, 4])
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    seeded = os.path.join(directory, "seeded.db")
+    db.DB_PATH = seeded
+    migrate()
+    seed(args.players)
+
+    report = {"players": args.players, "cpu_count": os.cpu_count(), "runs": []}
+    expected = None
+    for workers in args.workers:
+        db.DB_PATH = os.path.join(directory, f"workers-{workers}.db")
+        copy_database(seeded, db.DB_PATH)
+        configure_tick_shards(workers=workers)
+        start_tick_shards()
+
+        started = time.perf_counter()
+        stats = run_tick()
+        elapsed = time.perf_counter() - started
+
+        result = balances()
+        expected = expected or result
+        report["runs"].append({
+            "workers": workers,
+            "tick_ms": round(elapsed * 1000, 1),
+            "stage_ms": stats["stage_ms"],
+            "tasks_completed": stats["tasks"]["tasks_completed"],
+            "exchanges_settled": stats["settlement"]["exchanges_settled"],
+            "matches_first_run": result == expected,
+        })
+    configure_tick_shards(workers=0)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,59 +1,354 @@
+import contextlib
 import sqlite3
+import threading
+import time
 
 DB_PATH = "game.db"
 
+# Tables whose writes bump a counter in table_versions (triggers are added by migrations)
+VERSIONED_TABLES = ("tasks", "celestial_bodies", "currencies", "alliance_members")
+
+# Connection pool limits and per-connection tuning
+POOL_SETTINGS = {
+    "max_connections": 16,       # Connections open at once, idle or in use
+    "acquire_timeout": 10.0,     # Seconds to wait for a free connection
+    "busy_timeout_ms": 5000,     # How long SQLite waits on a locked database
+    "cached_statements": 512,    # Prepared statements kept per connection
+    "mmap_size": 256 * 1024 * 1024,
+}
+
+# Called with every statement run on pooled connections (see set_statement_trace)
+statement_trace = None
+
+# Called as query_observer(sql, parameters, seconds) after every execute on
+# pooled connections (see set_query_observer)
+query_observer = None
+
+class ObservedCursor(sqlite3.Cursor):
+    """Cursor that reports how long each execute took to query_observer.
+
+    Only the execute call is timed, which for a SELECT covers running the
+    statement up to its first row.
+    """
+
+    def execute(self, sql, parameters=()):
+        observer = query_observer
+        if observer is None:
+            return super().execute(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            observer(sql, parameters, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        observer = query_observer
+        if observer is None:
+            return super().executemany(sql, seq_of_parameters)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            observer(sql, None, time.perf_counter() - started)
+
+class PooledConnection(sqlite3.Connection):
+    """SQLite connection whose close() hands it back to the pool.
+
+    Code that keeps state outside SQLite (see player_cache.py) can tie it
+    to the transaction with on_commit().
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.commit_callbacks = []
+
+    def on_commit(self, callback):
+        """Call `callback(committed)` when the current transaction commits (True) or rolls back (False)."""
+        self.commit_callbacks.append(callback)
+
+    def finish_callbacks(self, committed):
+        """Run and clear the on_commit() callbacks."""
+        callbacks, self.commit_callbacks = self.commit_callbacks, []
+        for callback in callbacks:
+            callback(committed)
+
+    def commit(self):
+        super().commit()
+        self.finish_callbacks(True)
+
+    def rollback(self):
+        super().rollback()
+        self.finish_callbacks(False)
+
+    def cursor(self, factory=ObservedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        self.pool.release(self)
+
+class ConnectionPool:
+    """Thread-aware pool of tuned SQLite connections.
+
+    A thread keeps the same connection until it has closed it as many times
+    as it asked for it, so nested get_connection() calls within one request
+    share a connection and a transaction.
+    """
+
+    def __init__(self):
+        self.idle = []
+        self.local = threading.local()
+        self.condition = threading.Condition()
+        self.open_connections = 0
+        self.stats = {"created": 0, "checkouts": 0, "reuses": 0, "waits": 0, "wait_seconds": 0.0, "timeouts": 0, "discarded": 0}
+
+    def target(self):
+        """Return the database file new connections open."""
+        return DB_PATH
+
+    def connect(self, path, uri=False):
+        """Connect to `path` with the pool's connection class and limits."""
+        return sqlite3.connect(
+            path,
+            uri=uri,
+            timeout=POOL_SETTINGS["busy_timeout_ms"] / 1000,
+            check_same_thread=False,
+            cached_statements=POOL_SETTINGS["cached_statements"],
+            factory=PooledConnection,
+        )
+
+    def open(self):
+        """Open and tune a new connection to target()."""
+        path = self.target()
+        conn = self.connect(path)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA busy_timeout = {int(POOL_SETTINGS['busy_timeout_ms'])}")
+        conn.execute(f"PRAGMA mmap_size = {int(POOL_SETTINGS['mmap_size'])}")
+        conn.db_path = path
+        conn.pool = self
+        conn.read_only = False
+        if statement_trace is not None:
+            conn.set_trace_callback(statement_trace)
+        return conn
+
+    def acquire(self):
+        """Return this thread's connection, checking one out if needed."""
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            self.local.depth += 1
+            return conn
+
+        deadline = time.monotonic() + POOL_SETTINGS["acquire_timeout"]
+        with self.condition:
+            while True:
+                # Drop idle connections left over from a different database path
+                while self.idle and self.idle[-1].db_path != self.target():
+                    self.discard(self.idle.pop())
+                if self.idle:
+                    conn = self.idle.pop()
+                    self.stats["reuses"] += 1
+                    break
+                if self.open_connections < POOL_SETTINGS["max_connections"]:
+                    self.open_connections += 1
+                    conn = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats["timeouts"] += 1
+                    raise sqlite3.OperationalError("Timed out waiting for a pooled database connection.")
+                self.stats["waits"] += 1
+                waited = time.monotonic()
+                self.condition.wait(remaining)
+                self.stats["wait_seconds"] += time.monotonic() - waited
+            self.stats["checkouts"] += 1
+
+        if conn is None:
+            try:
+                conn = self.open()
+            except sqlite3.Error:
+                with self.condition:
+                    self.open_connections -= 1
+                    self.condition.notify()
+                raise
+            with self.condition:
+                self.stats["created"] += 1
+
+        self.local.conn = conn
+        self.local.depth = 1
+        return conn
+
+    def release(self, conn=None, force=False):
+        """Give a connection back once its thread is done with it."""
+        held = getattr(self.local, "conn", None)
+        if held is None or (conn is not None and conn is not held):
+            # Already released, or not checked out by this thread
+            return
+        self.local.depth -= 1
+        if self.local.depth > 0 and not force:
+            return
+
+        self.local.conn = None
+        if held.in_transaction or held.commit_callbacks:
+            held.rollback()
+        with self.condition:
+            if len(self.idle) < POOL_SETTINGS["max_connections"] and held.db_path == self.target():
+                self.idle.append(held)
+            else:
+                self.discard(held)
+            self.condition.notify()
+
+    def discard(self, conn):
+        """Really close a connection and free its slot (caller holds the lock)."""
+        sqlite3.Connection.close(conn)
+        self.open_connections -= 1
+        self.stats["discarded"] += 1
+
+    def close_all(self):
+        """Close every idle connection."""
+        with self.condition:
+            while self.idle:
+                self.discard(self.idle.pop())
+            self.condition.notify_all()
+
+    def snapshot(self):
+        """Return current pool counters."""
+        with self.condition:
+            return {
+                **self.stats,
+                "open": self.open_connections,
+                "idle": len(self.idle),
+                "in_use": self.open_connections - len(self.idle),
+                **{f"limit_{key}": value for key, value in POOL_SETTINGS.items()},
+            }
+
+class ReadOnlyPool(ConnectionPool):
+    """Pool of read-only connections for views that never write.
+
+    Connections open the live database (mode=ro; under WAL each read
+    transaction sees one committed snapshot while the tick writes) or,
+    once set_read_source() names one, a copy of it that is never written
+    in place (immutable=1, so no locks are taken at all).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.source = None
+
+    def target(self):
+        return self.source or DB_PATH
+
+    def open(self):
+        path = self.target()
+        if self.source:
+            conn = self.connect(f"file:{path}?mode=ro&immutable=1", uri=True)
+        else:
+            conn = self.connect(f"file:{path}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only = ON")
+        conn.execute(f"PRAGMA mmap_size = {int(POOL_SETTINGS['mmap_size'])}")
+        conn.db_path = path
+        conn.pool = self
+        conn.read_only = True
+        if statement_trace is not None:
+            conn.set_trace_callback(statement_trace)
+        return conn
+
+_pool = ConnectionPool()
+_read_pool = ReadOnlyPool()
+
+# Marks threads serving a read-only view, whose connections come from _read_pool
+_routing = threading.local()
+
 def get_connection():
-    """Get a connection to the SQLite database."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Get a pooled connection to the SQLite database.
 
-def initialize_database():
-    """Initialize the database schema."""
-    conn = get_connection()
-    cursor = conn.cursor()
+    Calling close() on it returns it to the pool; the same thread gets the
+    same connection back until every get_connection() has been closed.
+    Inside read_only_connections() the connection comes from the read pool.
+    """
+    if getattr(_routing, "read_only", False):
+        return _read_pool.acquire()
+    return _pool.acquire()
 
-    # Create tables if they don't exist
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE NOT NULL,
-        password_hash TEXT NOT NULL
-    );
-    """)
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS resources (
-        id INTEGER PRIMARY KEY,
-        name TEXT UNIQUE NOT NULL,
-        amount INTEGER NOT NULL
-    );
-    """)
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS tasks (
-        id INTEGER PRIMARY KEY,
-        name TEXT NOT NULL,
-        room TEXT NOT NULL,
-        ticks_remaining INTEGER NOT NULL
-    );
-    """)
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS alerts (
-        id INTEGER PRIMARY KEY,
-        message TEXT NOT NULL
-    );
-    """)
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS celestial_bodies (
-        id INTEGER PRIMARY KEY,
-        name TEXT UNIQUE NOT NULL,
-        type TEXT NOT NULL,
-        explored BOOLEAN NOT NULL DEFAULT FALSE,
-        resources TEXT
-    );
-    """)
+def release_connection(conn=None, force=False):
+    """Return the current thread's connection to the pool.
 
-    conn.commit()
-    conn.close()
+    With force=True the connection is returned regardless of how many
+    get_connection() calls are still open (used at the end of a request).
+    """
+    if conn is not None:
+        conn.pool.release(conn, force)
+    elif force:
+        _pool.release(force=True)
+        _read_pool.release(force=True)
+    else:
+        (_read_pool if getattr(_routing, "read_only", False) else _pool).release()
+
+@contextlib.contextmanager
+def read_only_connections():
+    """Hand the calling thread read pool connections from get_connection() until the block ends."""
+    _routing.read_only = True
+    try:
+        yield
+    finally:
+        _routing.read_only = False
+
+def set_read_source(path):
+    """Point the read pool at a copy of the database, or back at DB_PATH with None.
+
+    Idle connections to the previous source are closed; those in use are
+    closed when they are released.
+    """
+    _read_pool.source = path
+    _read_pool.close_all()
+
+def configure_pool(**settings):
+    """Change pool limits; idle connections are reopened with the new settings."""
+    unknown = set(settings) - set(POOL_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown pool settings: {', '.join(sorted(unknown))}")
+    POOL_SETTINGS.update(settings)
+    _pool.close_all()
+    _read_pool.close_all()
+
+def set_statement_trace(callback):
+    """Pass the SQL of every statement on newly opened pooled connections to `callback`.
+
+    Idle connections are closed so the next checkout picks the callback up;
+    pass None to stop tracing.
+    """
+    global statement_trace
+    statement_trace = callback
+    _pool.close_all()
+    _read_pool.close_all()
+
+def set_query_observer(callback):
+    """Call `callback(sql, parameters, seconds)` after every execute on pooled connections.
+
+    parameters is None for executemany. Pass None to stop observing.
+    """
+    global query_observer
+    query_observer = callback
+
+def pool_stats():
+    """Return connection pool counters and limits."""
+    return _pool.snapshot()
+
+def read_pool_stats():
+    """Return read pool counters and the file it reads."""
+    return {**_read_pool.snapshot(), "source": _read_pool.target()}
+
+def table_version(cursor, table):
+    """Return the change counter of a versioned table."""
+    row = cursor.execute("SELECT version FROM table_versions WHERE name = ?", (table,)).fetchone()
+    return row[0] if row else 0
 
 def seed_database():
     """Seed the database with default values."""
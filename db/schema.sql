@@ -1,85 +1,139 @@
--- Players table
-CREATE TABLE players (
-    id INTEGER PRIMARY KEY,
+-- Generated by `python migrations.py --schema` from MIGRATIONS; do not edit by hand.
+
+CREATE TABLE schema_migrations (
+    version INTEGER PRIMARY KEY,
     name TEXT NOT NULL,
-    resources TEXT NOT NULL, -- JSON format: {"energy": 50, "materials": 100}
-    tech_level INTEGER DEFAULT 0,
-    location TEXT DEFAULT "Home Moon"
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL
+);
+
+CREATE TABLE resources (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    amount INTEGER NOT NULL
 );
 
--- Tasks table
 CREATE TABLE tasks (
     id INTEGER PRIMARY KEY,
     name TEXT NOT NULL,
     description TEXT,
-    required_traits TEXT, -- JSON array of traits required
-    rewards TEXT, -- JSON format: {"energy": 10, "materials": 5}
-    duration INTEGER DEFAULT 1 -- Duration in ticks
+    required_resources TEXT NOT NULL, -- JSON format: {"energy": 10, "materials": 5}
+    rewards TEXT NOT NULL, -- JSON format: {"energy": 5, "materials": 10}
+    duration INTEGER DEFAULT 1
 );
 
--- Currencies table
-CREATE TABLE currencies (
+CREATE TABLE alerts (
     id INTEGER PRIMARY KEY,
-    name TEXT NOT NULL,
-    type TEXT NOT NULL, -- "planetary", "alliance", "government"
-    owner_id INTEGER, -- Planet ID, Alliance ID, or Government ID
-    exchange_rate REAL DEFAULT 1.0, -- Relative to Galactic Standard
-    total_supply REAL DEFAULT 1000
+    message TEXT NOT NULL
 );
 
--- Currency balances table
-CREATE TABLE currency_balances (
+CREATE TABLE celestial_bodies (
     id INTEGER PRIMARY KEY,
-    player_id INTEGER NOT NULL,
-    currency_id INTEGER NOT NULL,
-    amount REAL DEFAULT 0
+    name TEXT UNIQUE NOT NULL,
+    type TEXT NOT NULL,
+    explored BOOLEAN NOT NULL DEFAULT FALSE,
+    resources TEXT,
+    x REAL NOT NULL DEFAULT 0,
+    y REAL NOT NULL DEFAULT 0
+);
+
+CREATE TABLE players (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    resources TEXT NOT NULL DEFAULT '{}', -- Legacy JSON blob; see player_resources
+    tech_level INTEGER DEFAULT 0,
+    location TEXT DEFAULT "Home Moon"
 );
 
-CREATE TABLE IF NOT EXISTS active_tasks (
+CREATE TABLE player_resources (
+    player_id INTEGER NOT NULL,
+    resource TEXT NOT NULL,
+    amount INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (player_id, resource)
+) WITHOUT ROWID;
+
+CREATE TABLE active_tasks (
     id INTEGER PRIMARY KEY,
     player_id INTEGER NOT NULL,
     task_id INTEGER NOT NULL,
-    ticks_remaining INTEGER NOT NULL
+    ticks_remaining INTEGER NOT NULL,
+    due_tick INTEGER
 );
 
-
--- Currency exchange table
 CREATE TABLE currency_exchange (
-    id INTEGER PRIMARY KEY,
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
     buyer_id INTEGER NOT NULL,
     seller_id INTEGER NOT NULL,
     currency_from_id INTEGER NOT NULL,
     currency_to_id INTEGER NOT NULL,
     amount REAL NOT NULL,
     rate REAL NOT NULL,
-    ticks_remaining INTEGER DEFAULT 5 -- Delay for interstellar transactions
+    ticks_remaining INTEGER DEFAULT 5,
+    due_tick INTEGER
 );
 
--- Alliances table
-CREATE TABLE alliances (
+CREATE TABLE currency_balances (
     id INTEGER PRIMARY KEY,
-    name TEXT NOT NULL,
-    leader_id INTEGER NOT NULL,
-    description TEXT
+    player_id INTEGER NOT NULL,
+    currency_id INTEGER NOT NULL,
+    amount REAL DEFAULT 0
 );
 
--- Alliance members table
-CREATE TABLE alliance_members (
+CREATE UNIQUE INDEX idx_currency_balances_player_currency ON currency_balances (player_id, currency_id);
+
+CREATE TABLE currency_exchange_history (
     id INTEGER PRIMARY KEY,
-    alliance_id INTEGER NOT NULL,
-    player_id INTEGER NOT NULL,
-    role TEXT -- e.g., "leader", "member", "diplomat"
+    buyer_id INTEGER NOT NULL,
+    seller_id INTEGER NOT NULL,
+    currency_from_id INTEGER NOT NULL,
+    currency_to_id INTEGER NOT NULL,
+    amount REAL NOT NULL,
+    rate REAL NOT NULL,
+    due_tick INTEGER NOT NULL,
+    settled_tick INTEGER NOT NULL
 );
 
--- Celestial bodies table
-CREATE TABLE celestial_bodies (
+CREATE INDEX idx_currency_exchange_history_settled_tick
+ON currency_exchange_history (settled_tick);
+
+CREATE TABLE exchange_candles (
+    base_currency_id INTEGER NOT NULL,
+    quote_currency_id INTEGER NOT NULL,
+    resolution INTEGER NOT NULL, -- Ticks per candle
+    bucket INTEGER NOT NULL, -- First tick of the candle
+    open REAL NOT NULL,
+    high REAL NOT NULL,
+    low REAL NOT NULL,
+    close REAL NOT NULL,
+    volume REAL NOT NULL, -- Base currency traded
+    notional REAL NOT NULL, -- Quote currency traded (VWAP = notional / volume)
+    PRIMARY KEY (base_currency_id, quote_currency_id, resolution, bucket)
+) WITHOUT ROWID;
+
+CREATE INDEX idx_exchange_candles_recent ON exchange_candles (resolution, bucket);
+
+CREATE TABLE market_orders (
     id INTEGER PRIMARY KEY,
-    name TEXT NOT NULL,
-    type TEXT NOT NULL, -- "moon", "planet", etc.
-    resources TEXT -- JSON format: {"energy": 20, "materials": 50}
+    player_id INTEGER NOT NULL,
+    base_currency_id INTEGER NOT NULL,
+    quote_currency_id INTEGER NOT NULL,
+    side TEXT NOT NULL, -- "buy" or "sell"
+    order_type TEXT NOT NULL, -- "limit" or "market"
+    price REAL, -- Quote currency per unit of base; NULL for market orders
+    quantity REAL NOT NULL,
+    remaining REAL NOT NULL,
+    status TEXT NOT NULL, -- "open", "filled" or "cancelled"
+    created_tick INTEGER NOT NULL
 );
 
--- Notifications table
+CREATE INDEX idx_market_orders_open
+ON market_orders (base_currency_id, quote_currency_id) WHERE status = 'open';
+
 CREATE TABLE notifications (
     id INTEGER PRIMARY KEY,
     player_id INTEGER NOT NULL,
@@ -87,15 +141,44 @@ CREATE TABLE notifications (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Votes table for governments and alliances
-CREATE TABLE votes (
+CREATE INDEX idx_notifications_player_id ON notifications (player_id, id);
+
+CREATE TABLE game_clock (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    current_tick INTEGER NOT NULL
+);
+
+CREATE INDEX idx_active_tasks_due_tick ON active_tasks (due_tick);
+
+CREATE INDEX idx_currency_exchange_due_tick ON currency_exchange (due_tick);
+
+CREATE VIRTUAL TABLE celestial_bodies_rtree USING rtree (
+    id, min_x, max_x, min_y, max_y
+);
+
+CREATE TABLE currencies (
     id INTEGER PRIMARY KEY,
-    legislation_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL, -- "planetary", "alliance", "government"
+    owner_id INTEGER, -- Planet ID, Alliance ID, or Government ID
+    exchange_rate REAL DEFAULT 1.0, -- Relative to Galactic Standard
+    total_supply REAL DEFAULT 1000
+);
+
+CREATE TABLE alliances (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    leader_id INTEGER NOT NULL,
+    description TEXT
+);
+
+CREATE TABLE alliance_members (
+    id INTEGER PRIMARY KEY,
+    alliance_id INTEGER NOT NULL,
     player_id INTEGER NOT NULL,
-    vote TEXT NOT NULL -- "yes" or "no"
+    role TEXT -- e.g., "leader", "member", "diplomat"
 );
 
--- Governments table
 CREATE TABLE governments (
     id INTEGER PRIMARY KEY,
     alliance_id INTEGER NOT NULL,
@@ -103,11 +186,284 @@ CREATE TABLE governments (
     constitution TEXT -- JSON defining the rules and roles
 );
 
--- Legislation table
 CREATE TABLE legislation (
     id INTEGER PRIMARY KEY,
     government_id INTEGER NOT NULL,
     title TEXT NOT NULL,
     description TEXT NOT NULL,
     status TEXT -- "proposed", "enacted", "rejected"
+, proposer_id INTEGER, deadline_tick INTEGER, resolved_tick INTEGER, yes_votes INTEGER NOT NULL DEFAULT 0, no_votes INTEGER NOT NULL DEFAULT 0);
+
+CREATE TABLE votes (
+    id INTEGER PRIMARY KEY,
+    legislation_id INTEGER NOT NULL,
+    player_id INTEGER NOT NULL,
+    vote TEXT NOT NULL -- "yes" or "no"
+);
+
+CREATE TABLE table_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
 );
+
+CREATE TRIGGER tasks_version_insert
+AFTER INSERT ON tasks
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE name = 'tasks';
+END;
+
+CREATE TRIGGER tasks_version_update
+AFTER UPDATE ON tasks
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE name = 'tasks';
+END;
+
+CREATE TRIGGER tasks_version_delete
+AFTER DELETE ON tasks
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE name = 'tasks';
+END;
+
+CREATE TRIGGER celestial_bodies_version_insert
+AFTER INSERT ON celestial_bodies
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE name = 'celestial_bodies';
+END;
+
+CREATE TRIGGER celestial_bodies_version_update
+AFTER UPDATE ON celestial_bodies
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE name = 'celestial_bodies';
+END;
+
+CREATE TRIGGER celestial_bodies_version_delete
+AFTER DELETE ON celestial_bodies
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE name = 'celestial_bodies';
+END;
+
+CREATE TRIGGER currencies_version_insert
+AFTER INSERT ON currencies
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE name = 'currencies';
+END;
+
+CREATE TRIGGER currencies_version_update
+AFTER UPDATE ON currencies
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE name = 'currencies';
+END;
+
+CREATE TRIGGER currencies_version_delete
+AFTER DELETE ON currencies
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE name = 'currencies';
+END;
+
+CREATE TRIGGER alliance_members_version_insert
+AFTER INSERT ON alliance_members
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE name = 'alliance_members';
+END;
+
+CREATE TRIGGER alliance_members_version_update
+AFTER UPDATE ON alliance_members
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE name = 'alliance_members';
+END;
+
+CREATE TRIGGER alliance_members_version_delete
+AFTER DELETE ON alliance_members
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE name = 'alliance_members';
+END;
+
+CREATE INDEX idx_alliance_members_alliance_id ON alliance_members (alliance_id);
+
+CREATE UNIQUE INDEX idx_alliance_members_alliance_player ON alliance_members (alliance_id, player_id);
+
+CREATE INDEX idx_alliance_members_player_id ON alliance_members (player_id);
+
+CREATE TABLE alliance_stats (
+    alliance_id INTEGER PRIMARY KEY,
+    member_count INTEGER NOT NULL DEFAULT 0,
+    total_resources INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE alliance_resources (
+    alliance_id INTEGER NOT NULL,
+    resource TEXT NOT NULL,
+    amount INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (alliance_id, resource)
+) WITHOUT ROWID;
+
+CREATE INDEX idx_alliance_stats_members ON alliance_stats (member_count DESC, alliance_id);
+
+CREATE INDEX idx_alliance_stats_total ON alliance_stats (total_resources DESC, alliance_id);
+
+CREATE INDEX idx_alliance_resources_rank ON alliance_resources (resource, amount DESC, alliance_id);
+
+CREATE TRIGGER alliances_stats_insert
+AFTER INSERT ON alliances
+BEGIN
+    INSERT OR IGNORE INTO alliance_stats (alliance_id) VALUES (new.id);
+END;
+
+CREATE TRIGGER alliances_stats_delete
+AFTER DELETE ON alliances
+BEGIN
+    DELETE FROM alliance_stats WHERE alliance_id = old.id;
+    DELETE FROM alliance_resources WHERE alliance_id = old.id;
+END;
+
+CREATE TRIGGER alliance_members_stats_insert
+AFTER INSERT ON alliance_members
+BEGIN
+
+    INSERT INTO alliance_stats (alliance_id, member_count) VALUES (new.alliance_id, 1)
+    ON CONFLICT (alliance_id) DO UPDATE SET member_count = member_count + 1;
+    INSERT INTO alliance_resources (alliance_id, resource, amount)
+    SELECT new.alliance_id, resource, amount FROM player_resources WHERE player_id = new.player_id
+    ON CONFLICT (alliance_id, resource) DO UPDATE SET amount = amount + excluded.amount;
+
+END;
+
+CREATE TRIGGER alliance_members_stats_delete
+AFTER DELETE ON alliance_members
+BEGIN
+
+    UPDATE alliance_stats SET member_count = member_count - 1 WHERE alliance_id = old.alliance_id;
+    UPDATE alliance_resources
+    SET amount = amount - (SELECT pr.amount FROM player_resources pr
+                           WHERE pr.player_id = old.player_id AND pr.resource = alliance_resources.resource)
+    WHERE alliance_id = old.alliance_id
+      AND resource IN (SELECT resource FROM player_resources WHERE player_id = old.player_id);
+
+END;
+
+CREATE TRIGGER alliance_members_stats_update
+AFTER UPDATE OF alliance_id, player_id ON alliance_members
+BEGIN
+
+    UPDATE alliance_stats SET member_count = member_count - 1 WHERE alliance_id = old.alliance_id;
+    UPDATE alliance_resources
+    SET amount = amount - (SELECT pr.amount FROM player_resources pr
+                           WHERE pr.player_id = old.player_id AND pr.resource = alliance_resources.resource)
+    WHERE alliance_id = old.alliance_id
+      AND resource IN (SELECT resource FROM player_resources WHERE player_id = old.player_id);
+
+
+    INSERT INTO alliance_stats (alliance_id, member_count) VALUES (new.alliance_id, 1)
+    ON CONFLICT (alliance_id) DO UPDATE SET member_count = member_count + 1;
+    INSERT INTO alliance_resources (alliance_id, resource, amount)
+    SELECT new.alliance_id, resource, amount FROM player_resources WHERE player_id = new.player_id
+    ON CONFLICT (alliance_id, resource) DO UPDATE SET amount = amount + excluded.amount;
+
+END;
+
+CREATE TRIGGER player_resources_alliance_insert
+AFTER INSERT ON player_resources
+BEGIN
+    INSERT INTO alliance_resources (alliance_id, resource, amount)
+    SELECT alliance_id, new.resource, new.amount FROM alliance_members WHERE player_id = new.player_id
+    ON CONFLICT (alliance_id, resource) DO UPDATE SET amount = amount + excluded.amount;
+END;
+
+CREATE TRIGGER player_resources_alliance_update
+AFTER UPDATE OF amount ON player_resources
+WHEN new.amount != old.amount AND new.player_id = old.player_id AND new.resource = old.resource
+BEGIN
+    UPDATE alliance_resources SET amount = amount + new.amount - old.amount
+    WHERE resource = new.resource
+      AND alliance_id IN (SELECT alliance_id FROM alliance_members WHERE player_id = new.player_id);
+END;
+
+CREATE TRIGGER player_resources_alliance_move
+AFTER UPDATE OF player_id, resource ON player_resources
+WHEN new.player_id != old.player_id OR new.resource != old.resource
+BEGIN
+    UPDATE alliance_resources SET amount = amount - old.amount
+    WHERE resource = old.resource
+      AND alliance_id IN (SELECT alliance_id FROM alliance_members WHERE player_id = old.player_id);
+    INSERT INTO alliance_resources (alliance_id, resource, amount)
+    SELECT alliance_id, new.resource, new.amount FROM alliance_members WHERE player_id = new.player_id
+    ON CONFLICT (alliance_id, resource) DO UPDATE SET amount = amount + excluded.amount;
+END;
+
+CREATE TRIGGER player_resources_alliance_delete
+AFTER DELETE ON player_resources
+BEGIN
+    UPDATE alliance_resources SET amount = amount - old.amount
+    WHERE resource = old.resource
+      AND alliance_id IN (SELECT alliance_id FROM alliance_members WHERE player_id = old.player_id);
+END;
+
+CREATE TRIGGER alliance_resources_total_insert
+AFTER INSERT ON alliance_resources
+BEGIN
+    UPDATE alliance_stats SET total_resources = total_resources + new.amount WHERE alliance_id = new.alliance_id;
+END;
+
+CREATE TRIGGER alliance_resources_total_update
+AFTER UPDATE OF amount ON alliance_resources
+BEGIN
+    UPDATE alliance_stats SET total_resources = total_resources + new.amount - old.amount WHERE alliance_id = new.alliance_id;
+END;
+
+CREATE TRIGGER alliance_resources_total_delete
+AFTER DELETE ON alliance_resources
+BEGIN
+    UPDATE alliance_stats SET total_resources = total_resources - old.amount WHERE alliance_id = old.alliance_id;
+END;
+
+CREATE UNIQUE INDEX idx_votes_legislation_player ON votes (legislation_id, player_id);
+
+CREATE INDEX idx_governments_alliance_id ON governments (alliance_id);
+
+CREATE INDEX idx_legislation_government_id ON legislation (government_id);
+
+CREATE INDEX idx_legislation_open_deadline
+ON legislation (deadline_tick) WHERE status = 'proposed';
+
+CREATE TRIGGER votes_count_insert
+AFTER INSERT ON votes
+BEGIN
+
+    UPDATE legislation SET
+        yes_votes = yes_votes + (new.vote = 'yes'),
+        no_votes = no_votes + (new.vote = 'no')
+    WHERE id = new.legislation_id;
+
+END;
+
+CREATE TRIGGER votes_count_delete
+AFTER DELETE ON votes
+BEGIN
+
+    UPDATE legislation SET
+        yes_votes = yes_votes - (old.vote = 'yes'),
+        no_votes = no_votes - (old.vote = 'no')
+    WHERE id = old.legislation_id;
+
+END;
+
+CREATE TRIGGER votes_count_update
+AFTER UPDATE OF legislation_id, vote ON votes
+WHEN new.vote != old.vote OR new.legislation_id != old.legislation_id
+BEGIN
+
+    UPDATE legislation SET
+        yes_votes = yes_votes - (old.vote = 'yes'),
+        no_votes = no_votes - (old.vote = 'no')
+    WHERE id = old.legislation_id;
+
+
+    UPDATE legislation SET
+        yes_votes = yes_votes + (new.vote = 'yes'),
+        no_votes = no_votes + (new.vote = 'no')
+    WHERE id = new.legislation_id;
+
+END;
+
+CREATE INDEX idx_active_tasks_player_due ON active_tasks (player_id, due_tick);
+
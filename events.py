@@ -0,0 +1,77 @@
+import threading
+import uuid
+from collections import deque
+
+class TickEvents:
+    """Per-player changes collected while a tick (or a request) runs."""
+
+    def __init__(self):
+        self.players = {}
+
+    def player(self, player_id):
+        """Return the mutable payload for one player."""
+        return self.players.setdefault(player_id, {})
+
+    def set_resources(self, player_id, resources):
+        """Record new balances for the resources a player had changed."""
+        self.player(player_id).setdefault("resources", {}).update(resources)
+
+    def append(self, player_id, key, item):
+        """Append an item to a list field of a player's payload."""
+        self.player(player_id).setdefault(key, []).append(item)
+
+class EventBus:
+    """In-memory ring buffer of numbered events that stream clients wait on.
+
+    Each event holds a payload per affected player plus an optional payload
+    broadcast to everyone (e.g. the new tick number). Clients resume from
+    the last event id they saw; if that id has already left the buffer they
+    need a fresh snapshot instead. Numbering restarts with the process, so
+    `epoch` (new for every bus) tells ids from an earlier run apart.
+    """
+
+    def __init__(self, capacity=1024):
+        self.events = deque(maxlen=capacity)
+        self.epoch = uuid.uuid4().hex[:12]
+        self.last_id = 0
+        self.condition = threading.Condition()
+
+    def publish(self, players=None, broadcast=None):
+        """Append an event and wake every waiting client."""
+        if not players and broadcast is None:
+            return None
+        with self.condition:
+            self.last_id += 1
+            self.events.append((self.last_id, players or {}, broadcast))
+            self.condition.notify_all()
+            return self.last_id
+
+    def publish_player(self, player_id, payload):
+        """Publish an event that concerns a single player."""
+        return self.publish(players={player_id: payload})
+
+    def wait(self, player_id, after_id, timeout):
+        """Wait for events newer than `after_id` and return those for `player_id`.
+
+        Returns (messages, newest_id, missed) where messages is a list of
+        (event_id, payload) pairs and missed is True when events after
+        `after_id` were already evicted from the buffer.
+        """
+        with self.condition:
+            if self.last_id <= after_id:
+                self.condition.wait(timeout)
+            if not self.events or self.last_id <= after_id:
+                return [], max(after_id, self.last_id), False
+            missed = self.events[0][0] > after_id + 1
+            messages = []
+            for event_id, players, broadcast in self.events:
+                if event_id <= after_id:
+                    continue
+                payload = dict(broadcast or {})
+                payload.update(players.get(player_id, {}))
+                if payload:
+                    messages.append((event_id, payload))
+            return messages, self.last_id, missed
+
+# Shared bus fed by the tick engine and write routes
+bus = EventBus()
@@ -0,0 +1,71 @@
+import json
+
+from notifications import notify_from_select
+
+# Ticks a proposal stays open for votes unless the proposer asks otherwise, and the longest allowed
+VOTING_TICKS = 360
+MAX_VOTING_TICKS = 8640
+
+def is_member(cursor, government_id, player_id):
+    """Whether the player belongs to the alliance that runs the government."""
+    return cursor.execute("""
+        SELECT 1 FROM governments g
+        JOIN alliance_members am ON am.alliance_id = g.alliance_id AND am.player_id = ?
+        WHERE g.id = ?
+    """, (player_id, government_id)).fetchone() is not None
+
+def propose(cursor, government_id, player_id, title, description, deadline_tick):
+    """Open a legislation item for votes until `deadline_tick`; returns its id."""
+    cursor.execute("""
+        INSERT INTO legislation (government_id, proposer_id, title, description, status, deadline_tick)
+        VALUES (?, ?, ?, ?, 'proposed', ?)
+    """, (government_id, player_id, title, description, deadline_tick))
+    return cursor.lastrowid
+
+def cast_vote(cursor, legislation_id, player_id, vote):
+    """Record or change the player's vote and return the legislation's tallies.
+
+    The votes triggers move yes_votes and no_votes in the same statement,
+    so the counters always agree with the votes table.
+    """
+    cursor.execute("""
+        INSERT INTO votes (legislation_id, player_id, vote) VALUES (?, ?, ?)
+        ON CONFLICT (legislation_id, player_id) DO UPDATE SET vote = excluded.vote
+        WHERE vote != excluded.vote
+    """, (legislation_id, player_id, vote))
+    return cursor.execute("""
+        SELECT yes_votes, no_votes FROM legislation WHERE id = ?
+    """, (legislation_id,)).fetchone()
+
+def resolve_due_legislation(cursor, tick, events=None):
+    """Close every open legislation item whose deadline is `tick` or earlier.
+
+    One statement enacts or rejects all of them from their counters (a
+    strict yes majority enacts), and one more notifies every member of
+    the alliances concerned.
+    """
+    resolved = cursor.execute("""
+        UPDATE legislation
+        SET status = CASE WHEN yes_votes > no_votes THEN 'enacted' ELSE 'rejected' END,
+            resolved_tick = ?
+        WHERE status = 'proposed' AND deadline_tick <= ?
+        RETURNING id, status
+    """, (tick, tick)).fetchall()
+    if not resolved:
+        return {"legislation_resolved": 0, "enacted": 0, "members_notified": 0}
+
+    notified = notify_from_select(cursor, """
+        SELECT am.player_id,
+               'Legislation "' || l.title || '" was ' || l.status || ' ('
+               || l.yes_votes || ' yes, ' || l.no_votes || ' no)'
+        FROM json_each(?) r
+        JOIN legislation l ON l.id = r.value
+        JOIN governments g ON g.id = l.government_id
+        JOIN alliance_members am ON am.alliance_id = g.alliance_id
+    """, (json.dumps([row["id"] for row in resolved]),), events)
+
+    return {
+        "legislation_resolved": len(resolved),
+        "enacted": sum(row["status"] == "enacted" for row in resolved),
+        "members_notified": notified,
+    }
@@ -0,0 +1,164 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from flask import request
+
+from db import set_query_observer
+
+logger = logging.getLogger(__name__)
+
+# Instrumentation thresholds
+METRICS_SETTINGS = {
+    "slow_query_seconds": 0.05,    # Statements slower than this are logged with their parameters
+    "request_query_warning": 50,   # Requests issuing more statements than this are logged (likely N+1)
+}
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds of the statements-per-request histogram buckets
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Longest parameter repr written to the slow query log
+MAX_LOGGED_PARAMETERS = 500
+
+class Histogram:
+    """Bucketed observation counts, rendered cumulatively as Prometheus expects."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """Count one observation in the first bucket whose bound is >= value."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Registry:
+    """Histograms and counters keyed by metric name and label values."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        """Add an observation to the histogram `name` with the given labels."""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def increment(self, name, amount=1, **labels):
+        """Add `amount` to the counter `name` with the given labels."""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def render(self, gauges=None):
+        """Return every metric, plus the given {name: value} gauges, in Prometheus text format."""
+        lines = []
+        with self.lock:
+            histograms = sorted((key, histogram.counts[:], histogram.sum, histogram.count, histogram.buckets)
+                                for key, histogram in self.histograms.items())
+            counters = sorted(self.counters.items())
+
+        declared = set()
+        for (name, labels), counts, total, count, buckets in histograms:
+            if name not in declared:
+                lines.append(f"# TYPE {name} histogram")
+                declared.add(name)
+            cumulative = 0
+            for bound, bucket_count in zip((*buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{name}_count{format_labels(labels)} {count}")
+
+        for (name, labels), value in counters:
+            if name not in declared:
+                lines.append(f"# TYPE {name} counter")
+                declared.add(name)
+            lines.append(f"{name}{format_labels(labels)} {value}")
+
+        for name, value in sorted((gauges or {}).items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+def escape_label(value):
+    """Escape a label value for the Prometheus text format."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(labels):
+    """Render label pairs as {key="value",...}."""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in labels) + "}"
+
+# Process-wide metrics, exposed on /metrics
+registry = Registry()
+
+# Statement count and time of the request running on this thread
+_request = threading.local()
+
+def observe_query(sql, parameters, seconds):
+    """Record one statement's time, count it against the current request, log it if slow."""
+    statement = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else "EMPTY"
+    registry.observe("exogenesis_db_query_duration_seconds", seconds, statement=statement)
+    if getattr(_request, "active", False):
+        _request.queries += 1
+        _request.query_seconds += seconds
+    if seconds >= METRICS_SETTINGS["slow_query_seconds"]:
+        registry.increment("exogenesis_db_slow_queries_total")
+        logger.warning(
+            "Slow query (%.1f ms): %s parameters=%s",
+            seconds * 1000, " ".join(sql.split()),
+            "<executemany>" if parameters is None else repr(parameters)[:MAX_LOGGED_PARAMETERS],
+        )
+
+def start_request():
+    """Begin timing and counting statements for a request on this thread."""
+    _request.active = True
+    _request.started = time.perf_counter()
+    _request.queries = 0
+    _request.query_seconds = 0.0
+    _request.status = None
+
+def finish_request(method, route):
+    """Record latency, statement count and database time of the request on this thread."""
+    if not getattr(_request, "active", False):
+        return
+    _request.active = False
+    elapsed = time.perf_counter() - _request.started
+    status = str(_request.status or 500)
+    registry.observe("exogenesis_http_request_duration_seconds", elapsed, method=method, route=route, status=status)
+    registry.observe("exogenesis_http_request_db_seconds", _request.query_seconds, method=method, route=route)
+    registry.observe("exogenesis_http_request_queries", _request.queries, QUERY_COUNT_BUCKETS, method=method, route=route)
+    if _request.queries > METRICS_SETTINGS["request_query_warning"]:
+        logger.warning("%s %s issued %d queries in %.1f ms", method, route, _request.queries, elapsed * 1000)
+
+def init_app(app):
+    """Time every request to `app` and count the statements it issues."""
+    set_query_observer(observe_query)
+
+    @app.before_request
+    def start_request_metrics():
+        start_request()
+
+    @app.after_request
+    def record_response_status(response):
+        _request.status = response.status_code
+        return response
+
+    # Runs after unhandled errors too, which are recorded as 500s
+    @app.teardown_request
+    def finish_request_metrics(exception=None):
+        finish_request(request.method, request.url_rule.rule if request.url_rule else "<unmatched>")
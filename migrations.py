@@ -0,0 +1,704 @@
+import os
+import sys
+import tempfile
+import textwrap
+
+import db
+from db import get_connection
+
+# Reference copy of the schema, regenerated by `python migrations.py --schema`
+SCHEMA_FILE = "db/schema.sql"
+
+def add_column_if_missing(cursor, table, column, definition):
+    """Add a column to an existing table unless it is already there."""
+    columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def add_version_triggers(cursor, table):
+    """Bump `table`'s counter in table_versions on every write (see db.VERSIONED_TABLES)."""
+    cursor.execute("INSERT OR IGNORE INTO table_versions (name, version) VALUES (?, 0)", (table,))
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()}
+        AFTER {event} ON {table}
+        BEGIN
+            UPDATE table_versions SET version = version + 1 WHERE name = '{table}';
+        END;
+        """)
+
+def baseline_schema(cursor):
+    """Create every table, index and trigger the game had before versioned migrations.
+
+    Older databases may be at any earlier shape, so each step is idempotent
+    and legacy data (resource blobs, countdown ticks) is converted in place.
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS resources (
+        id INTEGER PRIMARY KEY,
+        name TEXT UNIQUE NOT NULL,
+        amount INTEGER NOT NULL
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS tasks (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        description TEXT,
+        required_resources TEXT NOT NULL, -- JSON format: {"energy": 10, "materials": 5}
+        rewards TEXT NOT NULL, -- JSON format: {"energy": 5, "materials": 10}
+        duration INTEGER DEFAULT 1
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS alerts (
+        id INTEGER PRIMARY KEY,
+        message TEXT NOT NULL
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS celestial_bodies (
+        id INTEGER PRIMARY KEY,
+        name TEXT UNIQUE NOT NULL,
+        type TEXT NOT NULL,
+        explored BOOLEAN NOT NULL DEFAULT FALSE,
+        resources TEXT,
+        x REAL NOT NULL DEFAULT 0,
+        y REAL NOT NULL DEFAULT 0
+    );
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS players (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        resources TEXT NOT NULL DEFAULT '{}', -- Legacy JSON blob; see player_resources
+        tech_level INTEGER DEFAULT 0,
+        location TEXT DEFAULT "Home Moon"
+    );
+    """)
+
+    # One row per (player, resource) so balances can be changed in place
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS player_resources (
+        player_id INTEGER NOT NULL,
+        resource TEXT NOT NULL,
+        amount INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (player_id, resource)
+    ) WITHOUT ROWID;
+    """)
+
+    # Move resources of players created before player_resources existed
+    cursor.execute("""
+    INSERT INTO player_resources (player_id, resource, amount)
+    SELECT p.id, r.key, r.value
+    FROM players p, json_each(p.resources) r
+    WHERE json_valid(p.resources)
+      AND NOT EXISTS (SELECT 1 FROM player_resources pr WHERE pr.player_id = p.id)
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS active_tasks (
+        id INTEGER PRIMARY KEY,
+        player_id INTEGER NOT NULL,
+        task_id INTEGER NOT NULL,
+        ticks_remaining INTEGER NOT NULL,
+        due_tick INTEGER
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS currency_exchange (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        buyer_id INTEGER NOT NULL,
+        seller_id INTEGER NOT NULL,
+        currency_from_id INTEGER NOT NULL,
+        currency_to_id INTEGER NOT NULL,
+        amount REAL NOT NULL,
+        rate REAL NOT NULL,
+        ticks_remaining INTEGER DEFAULT 5,
+        due_tick INTEGER
+    );
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS currency_balances (
+        id INTEGER PRIMARY KEY,
+        player_id INTEGER NOT NULL,
+        currency_id INTEGER NOT NULL,
+        amount REAL DEFAULT 0
+    );
+    """)
+
+    # Settlement upserts balances per (player, currency); merge any duplicate rows first
+    has_unique_index = cursor.execute("""
+    SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_currency_balances_player_currency'
+    """).fetchone()
+    if not has_unique_index:
+        cursor.execute("""
+        UPDATE currency_balances
+        SET amount = (
+            SELECT SUM(cb.amount) FROM currency_balances cb
+            WHERE cb.player_id = currency_balances.player_id AND cb.currency_id = currency_balances.currency_id
+        )
+        WHERE id IN (SELECT MIN(id) FROM currency_balances GROUP BY player_id, currency_id HAVING COUNT(*) > 1)
+        """)
+        cursor.execute("""
+        DELETE FROM currency_balances
+        WHERE id NOT IN (SELECT MIN(id) FROM currency_balances GROUP BY player_id, currency_id)
+        """)
+        cursor.execute("""
+        CREATE UNIQUE INDEX idx_currency_balances_player_currency ON currency_balances (player_id, currency_id)
+        """)
+
+    # Settled exchanges, moved out of currency_exchange by the tick
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS currency_exchange_history (
+        id INTEGER PRIMARY KEY,
+        buyer_id INTEGER NOT NULL,
+        seller_id INTEGER NOT NULL,
+        currency_from_id INTEGER NOT NULL,
+        currency_to_id INTEGER NOT NULL,
+        amount REAL NOT NULL,
+        rate REAL NOT NULL,
+        due_tick INTEGER NOT NULL,
+        settled_tick INTEGER NOT NULL
+    );
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_currency_exchange_history_settled_tick
+    ON currency_exchange_history (settled_tick)
+    """)
+
+    # Per-pair OHLC candles at several resolutions, written by the settlement stage
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS exchange_candles (
+        base_currency_id INTEGER NOT NULL,
+        quote_currency_id INTEGER NOT NULL,
+        resolution INTEGER NOT NULL, -- Ticks per candle
+        bucket INTEGER NOT NULL, -- First tick of the candle
+        open REAL NOT NULL,
+        high REAL NOT NULL,
+        low REAL NOT NULL,
+        close REAL NOT NULL,
+        volume REAL NOT NULL, -- Base currency traded
+        notional REAL NOT NULL, -- Quote currency traded (VWAP = notional / volume)
+        PRIMARY KEY (base_currency_id, quote_currency_id, resolution, bucket)
+    ) WITHOUT ROWID;
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_exchange_candles_recent ON exchange_candles (resolution, bucket)
+    """)
+
+    # Marketplace orders; open rows are the resting book, rebuilt into memory on restart
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS market_orders (
+        id INTEGER PRIMARY KEY,
+        player_id INTEGER NOT NULL,
+        base_currency_id INTEGER NOT NULL,
+        quote_currency_id INTEGER NOT NULL,
+        side TEXT NOT NULL, -- "buy" or "sell"
+        order_type TEXT NOT NULL, -- "limit" or "market"
+        price REAL, -- Quote currency per unit of base; NULL for market orders
+        quantity REAL NOT NULL,
+        remaining REAL NOT NULL,
+        status TEXT NOT NULL, -- "open", "filled" or "cancelled"
+        created_tick INTEGER NOT NULL
+    );
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_market_orders_open
+    ON market_orders (base_currency_id, quote_currency_id) WHERE status = 'open'
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS notifications (
+        id INTEGER PRIMARY KEY,
+        player_id INTEGER NOT NULL,
+        message TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_notifications_player_id ON notifications (player_id, id)
+    """)
+
+    # Single-row game clock; in-flight work is scheduled against absolute ticks
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS game_clock (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        current_tick INTEGER NOT NULL
+    );
+    """)
+    cursor.execute("INSERT OR IGNORE INTO game_clock (id, current_tick) VALUES (1, 0)")
+
+    # Convert countdowns from older databases into absolute due ticks
+    for table in ("active_tasks", "currency_exchange"):
+        add_column_if_missing(cursor, table, "due_tick", "INTEGER")
+        cursor.execute(f"""
+        UPDATE {table}
+        SET due_tick = (SELECT current_tick FROM game_clock WHERE id = 1) + ticks_remaining
+        WHERE due_tick IS NULL
+        """)
+
+    # Settled exchanges leave the table, so older databases are rebuilt with
+    # AUTOINCREMENT to stop ids being reused and clashing in the history
+    exchange_sql = cursor.execute("""
+    SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'currency_exchange'
+    """).fetchone()[0]
+    if "AUTOINCREMENT" not in exchange_sql.upper():
+        columns = "id, buyer_id, seller_id, currency_from_id, currency_to_id, amount, rate, ticks_remaining, due_tick"
+        cursor.execute("ALTER TABLE currency_exchange RENAME TO currency_exchange_old")
+        cursor.execute(exchange_sql.replace("PRIMARY KEY", "PRIMARY KEY AUTOINCREMENT", 1))
+        cursor.execute(f"INSERT INTO currency_exchange ({columns}) SELECT {columns} FROM currency_exchange_old")
+        cursor.execute("DROP TABLE currency_exchange_old")
+        cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'currency_exchange'")
+        cursor.execute("""
+        INSERT INTO sqlite_sequence (name, seq)
+        SELECT 'currency_exchange', MAX(
+            (SELECT IFNULL(MAX(id), 0) FROM currency_exchange),
+            (SELECT IFNULL(MAX(id), 0) FROM currency_exchange_history)
+        )
+        """)
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_active_tasks_due_tick ON active_tasks (due_tick)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_currency_exchange_due_tick ON currency_exchange (due_tick)")
+
+    # Galactic coordinates, indexed by an R*Tree kept in sync by triggers
+    add_column_if_missing(cursor, "celestial_bodies", "x", "REAL NOT NULL DEFAULT 0")
+    add_column_if_missing(cursor, "celestial_bodies", "y", "REAL NOT NULL DEFAULT 0")
+    cursor.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS celestial_bodies_rtree USING rtree (
+        id, min_x, max_x, min_y, max_y
+    );
+    """)
+    cursor.execute("""
+    INSERT INTO celestial_bodies_rtree (id, min_x, max_x, min_y, max_y)
+    SELECT id, x, x, y, y FROM celestial_bodies
+    WHERE id NOT IN (SELECT id FROM celestial_bodies_rtree)
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS celestial_bodies_rtree_insert
+    AFTER INSERT ON celestial_bodies
+    BEGIN
+        INSERT INTO celestial_bodies_rtree (id, min_x, max_x, min_y, max_y)
+        VALUES (new.id, new.x, new.x, new.y, new.y);
+    END;
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS celestial_bodies_rtree_update
+    AFTER UPDATE OF x, y ON celestial_bodies
+    BEGIN
+        UPDATE celestial_bodies_rtree
+        SET min_x = new.x, max_x = new.x, min_y = new.y, max_y = new.y
+        WHERE id = new.id;
+    END;
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS celestial_bodies_rtree_delete
+    AFTER DELETE ON celestial_bodies
+    BEGIN
+        DELETE FROM celestial_bodies_rtree WHERE id = old.id;
+    END;
+    """)
+
+    # Tables created by the old initialize_database.py script and db/schema.sql
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS currencies (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        type TEXT NOT NULL, -- "planetary", "alliance", "government"
+        owner_id INTEGER, -- Planet ID, Alliance ID, or Government ID
+        exchange_rate REAL DEFAULT 1.0, -- Relative to Galactic Standard
+        total_supply REAL DEFAULT 1000
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS alliances (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        leader_id INTEGER NOT NULL,
+        description TEXT
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS alliance_members (
+        id INTEGER PRIMARY KEY,
+        alliance_id INTEGER NOT NULL,
+        player_id INTEGER NOT NULL,
+        role TEXT -- e.g., "leader", "member", "diplomat"
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS governments (
+        id INTEGER PRIMARY KEY,
+        alliance_id INTEGER NOT NULL,
+        type TEXT NOT NULL, -- "democracy", "monarchy", etc.
+        constitution TEXT -- JSON defining the rules and roles
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS legislation (
+        id INTEGER PRIMARY KEY,
+        government_id INTEGER NOT NULL,
+        title TEXT NOT NULL,
+        description TEXT NOT NULL,
+        status TEXT -- "proposed", "enacted", "rejected"
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS votes (
+        id INTEGER PRIMARY KEY,
+        legislation_id INTEGER NOT NULL,
+        player_id INTEGER NOT NULL,
+        vote TEXT NOT NULL -- "yes" or "no"
+    );
+    """)
+
+    # Per-table version counters, bumped by triggers so caches can tell when to rebuild
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS table_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    );
+    """)
+    for table in ("tasks", "celestial_bodies", "currencies", "alliance_members"):
+        add_version_triggers(cursor, table)
+
+def add_foreign_key_indexes(cursor):
+    """Index the foreign keys that routes filter or join on."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_active_tasks_player_id ON active_tasks (player_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_alliance_members_alliance_id ON alliance_members (alliance_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_votes_legislation_id ON votes (legislation_id)")
+
+def add_alliance_aggregates(cursor):
+    """Materialize per-alliance member counts and resource totals.
+
+    alliance_resources holds the summed resources of each alliance's
+    members and alliance_stats its member count and grand total. Triggers
+    on alliances, alliance_members and player_resources apply every change
+    as a delta, so reads and leaderboards never join members to resources.
+    """
+    # A player belongs to an alliance at most once, so each membership adds their resources once
+    cursor.execute("""
+    DELETE FROM alliance_members
+    WHERE id NOT IN (SELECT MIN(id) FROM alliance_members GROUP BY alliance_id, player_id)
+    """)
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_alliance_members_alliance_player ON alliance_members (alliance_id, player_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_alliance_members_player_id ON alliance_members (player_id)")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS alliance_stats (
+        alliance_id INTEGER PRIMARY KEY,
+        member_count INTEGER NOT NULL DEFAULT 0,
+        total_resources INTEGER NOT NULL DEFAULT 0
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS alliance_resources (
+        alliance_id INTEGER NOT NULL,
+        resource TEXT NOT NULL,
+        amount INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (alliance_id, resource)
+    ) WITHOUT ROWID;
+    """)
+
+    # Leaderboards read the top of these indexes
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_alliance_stats_members ON alliance_stats (member_count DESC, alliance_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_alliance_stats_total ON alliance_stats (total_resources DESC, alliance_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_alliance_resources_rank ON alliance_resources (resource, amount DESC, alliance_id)")
+
+    # Backfill from the current members before the triggers take over
+    cursor.execute("INSERT OR IGNORE INTO alliance_stats (alliance_id) SELECT id FROM alliances")
+    cursor.execute("""
+    INSERT INTO alliance_stats (alliance_id, member_count)
+    SELECT alliance_id, COUNT(*) FROM alliance_members GROUP BY alliance_id
+    ON CONFLICT (alliance_id) DO UPDATE SET member_count = excluded.member_count
+    """)
+    cursor.execute("""
+    INSERT OR REPLACE INTO alliance_resources (alliance_id, resource, amount)
+    SELECT am.alliance_id, pr.resource, SUM(pr.amount)
+    FROM alliance_members am JOIN player_resources pr ON pr.player_id = am.player_id
+    GROUP BY am.alliance_id, pr.resource
+    """)
+    cursor.execute("""
+    UPDATE alliance_stats SET total_resources = IFNULL(
+        (SELECT SUM(amount) FROM alliance_resources r WHERE r.alliance_id = alliance_stats.alliance_id), 0)
+    """)
+
+    # Alliances get a stats row when created and lose their aggregates when removed
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS alliances_stats_insert
+    AFTER INSERT ON alliances
+    BEGIN
+        INSERT OR IGNORE INTO alliance_stats (alliance_id) VALUES (new.id);
+    END;
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS alliances_stats_delete
+    AFTER DELETE ON alliances
+    BEGIN
+        DELETE FROM alliance_stats WHERE alliance_id = old.id;
+        DELETE FROM alliance_resources WHERE alliance_id = old.id;
+    END;
+    """)
+
+    # A joining member adds their resources to the alliance, a leaving one takes them away
+    join = """
+        INSERT INTO alliance_stats (alliance_id, member_count) VALUES ({member}.alliance_id, 1)
+        ON CONFLICT (alliance_id) DO UPDATE SET member_count = member_count + 1;
+        INSERT INTO alliance_resources (alliance_id, resource, amount)
+        SELECT {member}.alliance_id, resource, amount FROM player_resources WHERE player_id = {member}.player_id
+        ON CONFLICT (alliance_id, resource) DO UPDATE SET amount = amount + excluded.amount;
+    """
+    leave = """
+        UPDATE alliance_stats SET member_count = member_count - 1 WHERE alliance_id = {member}.alliance_id;
+        UPDATE alliance_resources
+        SET amount = amount - (SELECT pr.amount FROM player_resources pr
+                               WHERE pr.player_id = {member}.player_id AND pr.resource = alliance_resources.resource)
+        WHERE alliance_id = {member}.alliance_id
+          AND resource IN (SELECT resource FROM player_resources WHERE player_id = {member}.player_id);
+    """
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS alliance_members_stats_insert
+    AFTER INSERT ON alliance_members
+    BEGIN
+        {join.format(member="new")}
+    END;
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS alliance_members_stats_delete
+    AFTER DELETE ON alliance_members
+    BEGIN
+        {leave.format(member="old")}
+    END;
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS alliance_members_stats_update
+    AFTER UPDATE OF alliance_id, player_id ON alliance_members
+    BEGIN
+        {leave.format(member="old")}
+        {join.format(member="new")}
+    END;
+    """)
+
+    # Member resource changes flow into every alliance the player belongs to
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS player_resources_alliance_insert
+    AFTER INSERT ON player_resources
+    BEGIN
+        INSERT INTO alliance_resources (alliance_id, resource, amount)
+        SELECT alliance_id, new.resource, new.amount FROM alliance_members WHERE player_id = new.player_id
+        ON CONFLICT (alliance_id, resource) DO UPDATE SET amount = amount + excluded.amount;
+    END;
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS player_resources_alliance_update
+    AFTER UPDATE OF amount ON player_resources
+    WHEN new.amount != old.amount AND new.player_id = old.player_id AND new.resource = old.resource
+    BEGIN
+        UPDATE alliance_resources SET amount = amount + new.amount - old.amount
+        WHERE resource = new.resource
+          AND alliance_id IN (SELECT alliance_id FROM alliance_members WHERE player_id = new.player_id);
+    END;
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS player_resources_alliance_move
+    AFTER UPDATE OF player_id, resource ON player_resources
+    WHEN new.player_id != old.player_id OR new.resource != old.resource
+    BEGIN
+        UPDATE alliance_resources SET amount = amount - old.amount
+        WHERE resource = old.resource
+          AND alliance_id IN (SELECT alliance_id FROM alliance_members WHERE player_id = old.player_id);
+        INSERT INTO alliance_resources (alliance_id, resource, amount)
+        SELECT alliance_id, new.resource, new.amount FROM alliance_members WHERE player_id = new.player_id
+        ON CONFLICT (alliance_id, resource) DO UPDATE SET amount = amount + excluded.amount;
+    END;
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS player_resources_alliance_delete
+    AFTER DELETE ON player_resources
+    BEGIN
+        UPDATE alliance_resources SET amount = amount - old.amount
+        WHERE resource = old.resource
+          AND alliance_id IN (SELECT alliance_id FROM alliance_members WHERE player_id = old.player_id);
+    END;
+    """)
+
+    # Keep each alliance's grand total in step with its per-resource sums
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS alliance_resources_total_insert
+    AFTER INSERT ON alliance_resources
+    BEGIN
+        UPDATE alliance_stats SET total_resources = total_resources + new.amount WHERE alliance_id = new.alliance_id;
+    END;
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS alliance_resources_total_update
+    AFTER UPDATE OF amount ON alliance_resources
+    BEGIN
+        UPDATE alliance_stats SET total_resources = total_resources + new.amount - old.amount WHERE alliance_id = new.alliance_id;
+    END;
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS alliance_resources_total_delete
+    AFTER DELETE ON alliance_resources
+    BEGIN
+        UPDATE alliance_stats SET total_resources = total_resources - old.amount WHERE alliance_id = old.alliance_id;
+    END;
+    """)
+
+def add_legislation_voting(cursor):
+    """Keep per-legislation vote counters and give legislation a deadline.
+
+    Triggers on votes move yes_votes and no_votes as votes are cast,
+    changed or withdrawn, so tallies never count the votes table, and the
+    tick resolves legislation whose deadline_tick has passed.
+    """
+    # One vote per player per legislation; keep each player's latest vote
+    cursor.execute("""
+    DELETE FROM votes
+    WHERE id NOT IN (SELECT MAX(id) FROM votes GROUP BY legislation_id, player_id)
+    """)
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_votes_legislation_player ON votes (legislation_id, player_id)")
+    cursor.execute("DROP INDEX IF EXISTS idx_votes_legislation_id")
+
+    add_column_if_missing(cursor, "legislation", "proposer_id", "INTEGER")
+    add_column_if_missing(cursor, "legislation", "deadline_tick", "INTEGER")
+    add_column_if_missing(cursor, "legislation", "resolved_tick", "INTEGER")
+    add_column_if_missing(cursor, "legislation", "yes_votes", "INTEGER NOT NULL DEFAULT 0")
+    add_column_if_missing(cursor, "legislation", "no_votes", "INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_governments_alliance_id ON governments (alliance_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_legislation_government_id ON legislation (government_id)")
+
+    # The tick reads only the open legislation that is due
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_legislation_open_deadline
+    ON legislation (deadline_tick) WHERE status = 'proposed'
+    """)
+
+    # Backfill the counters before the triggers take over
+    cursor.execute("""
+    UPDATE legislation SET
+        yes_votes = (SELECT COUNT(*) FROM votes v WHERE v.legislation_id = legislation.id AND v.vote = 'yes'),
+        no_votes = (SELECT COUNT(*) FROM votes v WHERE v.legislation_id = legislation.id AND v.vote = 'no')
+    """)
+
+    count = """
+        UPDATE legislation SET
+            yes_votes = yes_votes {sign} ({vote}.vote = 'yes'),
+            no_votes = no_votes {sign} ({vote}.vote = 'no')
+        WHERE id = {vote}.legislation_id;
+    """
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS votes_count_insert
+    AFTER INSERT ON votes
+    BEGIN
+        {count.format(sign="+", vote="new")}
+    END;
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS votes_count_delete
+    AFTER DELETE ON votes
+    BEGIN
+        {count.format(sign="-", vote="old")}
+    END;
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS votes_count_update
+    AFTER UPDATE OF legislation_id, vote ON votes
+    WHEN new.vote != old.vote OR new.legislation_id != old.legislation_id
+    BEGIN
+        {count.format(sign="-", vote="old")}
+        {count.format(sign="+", vote="new")}
+    END;
+    """)
+
+def add_active_task_shard_index(cursor):
+    """Index active tasks by player and due tick for range-partitioned ticks.
+
+    It also serves every lookup the plain player_id index did, so that one goes.
+    """
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_active_tasks_player_due ON active_tasks (player_id, due_tick)")
+    cursor.execute("DROP INDEX IF EXISTS idx_active_tasks_player_id")
+
+# Schema changes in the order they are applied; never edit or renumber a
+# released migration, add a new one instead
+MIGRATIONS = [
+    (1, "baseline schema", baseline_schema),
+    (2, "foreign key indexes", add_foreign_key_indexes),
+    (3, "alliance aggregates", add_alliance_aggregates),
+    (4, "legislation voting", add_legislation_voting),
+    (5, "active task shard index", add_active_task_shard_index),
+]
+
+def schema_version(cursor):
+    """Return the highest migration applied to the database."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+    return cursor.execute("SELECT IFNULL(MAX(version), 0) FROM schema_migrations").fetchone()[0]
+
+def migrate():
+    """Apply every pending migration, each in its own transaction.
+
+    The version is re-read after taking the write lock, so several
+    processes starting at once apply each migration exactly once.
+    Returns the versions applied.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    applied = []
+    try:
+        for version, name, step in MIGRATIONS:
+            if schema_version(cursor) >= version:
+                continue
+            cursor.execute("BEGIN IMMEDIATE")
+            if schema_version(cursor) < version:
+                step(cursor)
+                cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (?, ?)", (version, name))
+                applied.append(version)
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return applied
+
+def dump_schema():
+    """Return the migrated schema as SQL, in creation order."""
+    conn = get_connection()
+    rows = conn.execute("""
+        SELECT sql FROM sqlite_master
+        WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' AND name NOT LIKE '%_rtree_%'
+        ORDER BY rowid
+    """).fetchall()
+    conn.close()
+    header = "-- Generated by `python migrations.py --schema` from MIGRATIONS; do not edit by hand.\n\n"
+    statements = []
+    for row in rows:
+        first, _, rest = row[0].partition("\n")
+        statements.append(f"{first}\n{textwrap.dedent(rest)}".strip() + ";\n\n")
+    return header + "".join(statements)
+
+if __name__ == "__main__":
+    if "--schema" in sys.argv:
+        # Dump from a scratch database so the reference reflects MIGRATIONS alone
+        db.DB_PATH = os.path.join(tempfile.mkdtemp(), "schema.db")
+        migrate()
+        with open(SCHEMA_FILE, "w") as schema:
+            schema.write(dump_schema())
+        print(f"Wrote {SCHEMA_FILE}")
+    else:
+        applied = migrate()
+        print(f"Applied migrations to {db.DB_PATH}: {applied or 'none'}")
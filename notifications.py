@@ -0,0 +1,69 @@
+import json
+import time
+
+from db import get_connection
+from events import bus
+
+# Notifications returned per inbox page by default, and at most
+INBOX_PAGE_SIZE = 50
+MAX_INBOX_PAGE_SIZE = 500
+
+# Longest a long-poll request may be parked, in seconds
+MAX_LONG_POLL = 30
+
+def notify_from_select(cursor, select, params=(), events=None):
+    """Insert the (player_id, message) rows produced by `select` in one statement.
+
+    Used by tick stages to notify many players at once; the new rows are
+    appended to `events` so stream and long-poll clients wake up.
+    """
+    rows = cursor.execute(f"""
+        INSERT INTO notifications (player_id, message)
+        {select}
+        RETURNING id, player_id, message, created_at
+    """, params).fetchall()
+
+    if events is not None:
+        for row in rows:
+            events.append(row["player_id"], "notifications", dict(row))
+    return len(rows)
+
+def notify(cursor, messages, events=None):
+    """Insert a list of (player_id, message) pairs in one statement."""
+    return notify_from_select(cursor, """
+        SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]') FROM json_each(?)
+    """, (json.dumps(messages),), events)
+
+def read_inbox(cursor, player_id, after=0, limit=INBOX_PAGE_SIZE):
+    """Return a player's notifications with ids above `after`, oldest first."""
+    rows = cursor.execute("""
+        SELECT id, message, created_at FROM notifications
+        WHERE player_id = ? AND id > ?
+        ORDER BY id
+        LIMIT ?
+    """, (player_id, after, limit)).fetchall()
+    return [dict(row) for row in rows]
+
+def wait_for_inbox(player_id, after, limit, timeout):
+    """Return new notifications, parking until some arrive or `timeout` seconds pass.
+
+    The event bus position is taken before each read, so a notification
+    committed between the read and the wait still wakes the request.
+    """
+    deadline = time.monotonic() + timeout
+    event_id = bus.last_id
+    while True:
+        conn = get_connection()
+        items = read_inbox(conn.cursor(), player_id, after, limit)
+        conn.close()
+
+        remaining = deadline - time.monotonic()
+        if items or not remaining > 0:
+            return items
+
+        # Sleep until an event carries notifications for this player
+        while remaining > 0:
+            messages, event_id, missed = bus.wait(player_id, event_id, remaining)
+            if missed or any("notifications" in payload for _, payload in messages):
+                break
+            remaining = deadline - time.monotonic()
@@ -0,0 +1,273 @@
+import fcntl
+import heapq
+import threading
+
+import db
+from tick import current_tick
+
+# Ticks before a fill settles into currency_balances (same delay as /api/currency/buy)
+SETTLEMENT_DELAY = 5
+
+# Quantities at or below this are treated as fully filled
+EPSILON = 1e-9
+
+class MatchingUnavailable(Exception):
+    """Raised in a process that does not own order matching for the database."""
+
+class Order:
+    """An order in the book; `price` is quote currency per unit of base (None for market orders)."""
+
+    __slots__ = ("id", "player_id", "side", "price", "remaining")
+
+    def __init__(self, order_id, player_id, side, price, remaining):
+        self.id = order_id
+        self.player_id = player_id
+        self.side = side
+        self.price = price
+        self.remaining = remaining
+
+class OrderBook:
+    """In-memory price-time priority order book for one currency pair.
+
+    Bids and asks are heaps keyed by (price, order id), so the best price
+    wins and the oldest order wins within a price. Cancelled and filled
+    orders are dropped lazily when they reach the top of their heap.
+    A discarded book is marked stale; holders of its lock must fetch the
+    replacement rather than use it.
+    """
+
+    def __init__(self, base_currency_id, quote_currency_id):
+        self.pair = (base_currency_id, quote_currency_id)
+        self.lock = threading.Lock()
+        self.stale = False
+        self.heaps = {"buy": [], "sell": []}
+        self.orders = {}
+        self.levels = {"buy": {}, "sell": {}}  # Price -> total resting quantity
+
+    def add(self, order):
+        """Rest an order on its side of the book."""
+        key = -order.price if order.side == "buy" else order.price
+        heapq.heappush(self.heaps[order.side], (key, order.id))
+        self.orders[order.id] = order
+        levels = self.levels[order.side]
+        levels[order.price] = levels.get(order.price, 0) + order.remaining
+
+    def reduce(self, order, quantity):
+        """Take `quantity` off a resting order, removing it once filled."""
+        order.remaining -= quantity
+        levels = self.levels[order.side]
+        levels[order.price] -= quantity
+        if levels[order.price] <= EPSILON:
+            del levels[order.price]
+        if order.remaining <= EPSILON:
+            del self.orders[order.id]
+
+    def cancel(self, order_id):
+        """Remove a resting order; returns it, or None if it is not resting."""
+        order = self.orders.get(order_id)
+        if order is not None:
+            self.reduce(order, order.remaining)
+        return order
+
+    def best(self, side):
+        """Return the best resting order on `side`, discarding stale heap entries."""
+        heap = self.heaps[side]
+        while heap:
+            order = self.orders.get(heap[0][1])
+            if order is not None:
+                return order
+            heapq.heappop(heap)
+        return None
+
+    def match(self, order):
+        """Fill an incoming order against the opposite side.
+
+        Returns [(maker, quantity)] and whether matching stopped at one of
+        the same player's resting orders, which is never filled.
+        """
+        fills = []
+        opposite = "sell" if order.side == "buy" else "buy"
+        while order.remaining > EPSILON:
+            maker = self.best(opposite)
+            if maker is None:
+                break
+            if order.price is not None:
+                if order.side == "buy" and maker.price > order.price:
+                    break
+                if order.side == "sell" and maker.price < order.price:
+                    break
+            if maker.player_id == order.player_id:
+                return fills, True
+            quantity = min(order.remaining, maker.remaining)
+            order.remaining -= quantity
+            self.reduce(maker, quantity)
+            fills.append((maker, quantity))
+        return fills, False
+
+    def depth(self, levels=10):
+        """Return aggregated price levels, best first, and the top of book."""
+        bids = sorted(self.levels["buy"].items(), reverse=True)[:levels]
+        asks = sorted(self.levels["sell"].items())[:levels]
+        return {
+            "base_currency_id": self.pair[0],
+            "quote_currency_id": self.pair[1],
+            "best_bid": bids[0][0] if bids else None,
+            "best_ask": asks[0][0] if asks else None,
+            "bids": [[price, quantity] for price, quantity in bids],
+            "asks": [[price, quantity] for price, quantity in asks]
+        }
+
+# Books by (base_currency_id, quote_currency_id), loaded from SQLite on first use
+books = {}
+books_lock = threading.Lock()
+
+# Lock files held by this process, by database path, while it owns matching
+matching_claims = {}
+
+def claim_matching():
+    """Make this process the only one matching orders against the database.
+
+    Books live in process memory, so two worker processes would each match
+    against their own copy. The first process to match takes an exclusive
+    lock on a file beside the database, held until it exits; any other
+    process gets MatchingUnavailable.
+    """
+    path = f"{db.DB_PATH}.matching.lock"
+    if path in matching_claims:
+        return
+    with books_lock:
+        if path in matching_claims:
+            return
+        claim = open(path, "a")
+        try:
+            fcntl.flock(claim, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            claim.close()
+            raise MatchingUnavailable("Order matching runs in another worker process.") from None
+        matching_claims[path] = claim
+
+def load_book(cursor, base_currency_id, quote_currency_id):
+    """Rebuild a pair's book from its open orders in SQLite."""
+    book = OrderBook(base_currency_id, quote_currency_id)
+    rows = cursor.execute("""
+        SELECT id, player_id, side, price, remaining FROM market_orders
+        WHERE status = 'open' AND base_currency_id = ? AND quote_currency_id = ?
+        ORDER BY id
+    """, (base_currency_id, quote_currency_id)).fetchall()
+    for row in rows:
+        book.add(Order(row["id"], row["player_id"], row["side"], row["price"], row["remaining"]))
+    return book
+
+def get_book(cursor, base_currency_id, quote_currency_id):
+    """Return the in-memory book for a pair, recovering it from SQLite if needed."""
+    claim_matching()
+    pair = (base_currency_id, quote_currency_id)
+    book = books.get(pair)
+    if book is None:
+        with books_lock:
+            book = books.get(pair)
+            if book is None:
+                book = books[pair] = load_book(cursor, *pair)
+    return book
+
+def lock_book(cursor, base_currency_id, quote_currency_id):
+    """Return a pair's current book with its lock held; the caller releases it."""
+    while True:
+        book = get_book(cursor, base_currency_id, quote_currency_id)
+        book.lock.acquire()
+        if not book.stale:
+            return book
+        book.lock.release()
+
+def discard_book(base_currency_id, quote_currency_id):
+    """Forget a pair's in-memory book so the next access reloads it from SQLite."""
+    with books_lock:
+        book = books.pop((base_currency_id, quote_currency_id), None)
+        if book is not None:
+            book.stale = True
+
+def submit_order(conn, player_id, base_currency_id, quote_currency_id, side, order_type, price, quantity):
+    """Match an order against the book and persist the result in one transaction.
+
+    Each fill becomes a currency_exchange row at the resting order's price,
+    settled by the tick after SETTLEMENT_DELAY ticks. An unfilled limit
+    remainder rests in the book; an unfilled market remainder is cancelled,
+    as is any remainder that would trade with the player's own resting order.
+    """
+    cursor = conn.cursor()
+    book = lock_book(cursor, base_currency_id, quote_currency_id)
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        tick = current_tick(cursor)
+        cursor.execute("""
+            INSERT INTO market_orders
+                (player_id, base_currency_id, quote_currency_id, side, order_type, price, quantity, remaining, status, created_tick)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'open', ?)
+        """, (player_id, base_currency_id, quote_currency_id, side, order_type, price, quantity, quantity, tick))
+        order = Order(cursor.lastrowid, player_id, side, price, quantity)
+
+        fills, self_trade = book.match(order)
+
+        # Record fills as exchanges for the settlement stage
+        cursor.executemany("""
+            INSERT INTO currency_exchange
+                (buyer_id, seller_id, currency_from_id, currency_to_id, amount, rate, ticks_remaining, due_tick)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(
+            order.player_id if side == "buy" else maker.player_id,
+            maker.player_id if side == "buy" else order.player_id,
+            quote_currency_id, base_currency_id, quantity, maker.price,
+            SETTLEMENT_DELAY, tick + SETTLEMENT_DELAY
+        ) for maker, quantity in fills])
+
+        if order.remaining <= EPSILON:
+            status = "filled"
+        elif order_type == "limit" and not self_trade:
+            status = "open"
+            book.add(order)
+        else:
+            status = "cancelled"
+
+        cursor.executemany("""
+            UPDATE market_orders SET remaining = ?, status = ? WHERE id = ?
+        """, [(max(maker.remaining, 0), "open" if maker.remaining > EPSILON else "filled", maker.id)
+              for maker, _ in fills] + [(max(order.remaining, 0), status, order.id)])
+        conn.commit()
+    except Exception:
+        # The in-memory book may no longer match SQLite; rebuild it on next use
+        conn.rollback()
+        discard_book(base_currency_id, quote_currency_id)
+        raise
+    finally:
+        book.lock.release()
+
+    return {
+        "order_id": order.id,
+        "status": status,
+        "remaining": max(order.remaining, 0),
+        "self_trade": self_trade,
+        "fills": [{"maker_order_id": maker.id, "price": maker.price, "quantity": quantity} for maker, quantity in fills]
+    }
+
+def cancel_order(conn, order_id, player_id):
+    """Cancel a player's resting order; returns False if it is not open."""
+    cursor = conn.cursor()
+    row = cursor.execute("""
+        SELECT base_currency_id, quote_currency_id FROM market_orders
+        WHERE id = ? AND player_id = ? AND status = 'open'
+    """, (order_id, player_id)).fetchone()
+    if not row:
+        return False
+
+    book = lock_book(cursor, row["base_currency_id"], row["quote_currency_id"])
+    try:
+        cursor.execute("""
+            UPDATE market_orders SET status = 'cancelled' WHERE id = ? AND status = 'open'
+        """, (order_id,))
+        cancelled = cursor.rowcount == 1
+        conn.commit()
+        if cancelled:
+            book.cancel(order_id)
+    finally:
+        book.lock.release()
+    return cancelled
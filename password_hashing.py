@@ -0,0 +1,121 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Hashing pool limits
+HASHING_SETTINGS = {
+    "workers": os.cpu_count() or 1,  # Processes running key derivations
+    "max_pending": 64,               # Hashes queued or running before callers are turned away
+    "timeout": 10.0,                 # Seconds a caller waits for its result
+}
+
+class HashingBusy(Exception):
+    """Raised when a hash cannot be done now (queue full, timed out, worker died); callers should ask the client to retry."""
+
+class HashingPool:
+    """Bounded process pool for password key derivation.
+
+    Hashing is CPU-bound and deliberately slow, so it runs in worker
+    processes instead of on request threads; at most `max_pending` hashes
+    are queued or running, and further requests fail fast with HashingBusy.
+    A pool broken by a dead worker is dropped and the next hash starts a
+    new one.
+    """
+
+    def __init__(self):
+        self.executor = None
+        self.slots = None
+        self.lock = threading.Lock()
+        self.stats = {"submitted": 0, "rejected": 0, "completed": 0, "timeouts": 0, "broken": 0}
+
+    def start(self):
+        """Create the worker processes on first use; return the executor and its queue slots."""
+        with self.lock:
+            if self.executor is None:
+                self.slots = threading.BoundedSemaphore(HASHING_SETTINGS["max_pending"])
+                self.executor = ProcessPoolExecutor(max_workers=HASHING_SETTINGS["workers"])
+            return self.executor, self.slots
+
+    def run(self, function, *args):
+        """Run `function(*args)` in a worker and wait for the result."""
+        executor, slots = self.start()
+        if not slots.acquire(blocking=False):
+            with self.lock:
+                self.stats["rejected"] += 1
+            raise HashingBusy("Too many password hashes in progress.")
+
+        with self.lock:
+            self.stats["submitted"] += 1
+        try:
+            future = executor.submit(function, *args)
+        except BaseException as error:
+            slots.release()
+            if isinstance(error, BrokenProcessPool):
+                self.discard(executor)
+                raise HashingBusy("Password hashing workers restarting.") from error
+            raise
+        # Release the slot of the pool it was taken from, even if that pool has been replaced
+        future.add_done_callback(lambda future: self.finish(slots))
+
+        try:
+            return future.result(timeout=HASHING_SETTINGS["timeout"])
+        except FuturesTimeout as error:
+            with self.lock:
+                self.stats["timeouts"] += 1
+            raise HashingBusy("Password hashing timed out.") from error
+        except BrokenProcessPool as error:
+            self.discard(executor)
+            raise HashingBusy("Password hashing workers restarting.") from error
+
+    def finish(self, slots):
+        """Free the queue slot of a finished hash."""
+        slots.release()
+        with self.lock:
+            self.stats["completed"] += 1
+
+    def discard(self, executor):
+        """Drop a pool broken by a dead worker, so the next hash starts a new one."""
+        with self.lock:
+            if self.executor is not executor:
+                return
+            self.executor = None
+            self.stats["broken"] += 1
+        executor.shutdown(wait=False)
+
+    def shutdown(self):
+        """Stop the workers; the next hash starts a new pool with current settings."""
+        with self.lock:
+            executor, self.executor = self.executor, None
+        # Outside the lock: finish() callbacks of in-flight hashes take it
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def snapshot(self):
+        """Return counters and limits."""
+        with self.lock:
+            return {**self.stats, **{f"limit_{key}": value for key, value in HASHING_SETTINGS.items()}}
+
+_pool = HashingPool()
+
+def hash_password(password):
+    """Hash a password in the hashing pool."""
+    return _pool.run(generate_password_hash, password)
+
+def verify_password(password_hash, password):
+    """Check a password against its hash in the hashing pool."""
+    return _pool.run(check_password_hash, password_hash, password)
+
+def configure_hashing(**settings):
+    """Change pool limits; the pool restarts with them on the next hash."""
+    unknown = set(settings) - set(HASHING_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown hashing settings: {', '.join(sorted(unknown))}")
+    HASHING_SETTINGS.update(settings)
+    _pool.shutdown()
+
+def hashing_stats():
+    """Return hashing pool counters and limits."""
+    return _pool.snapshot()
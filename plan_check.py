@@ -0,0 +1,233 @@
+"""Fail if any SQL statement issued by the routes fully scans a large table.
+
+Builds a scratch database with the migrations, fills the tables that grow
+with the player base, drives every route once through the Flask test
+client while tracing statements, then runs EXPLAIN QUERY PLAN on each one.
+
+    python plan_check.py
+"""
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+import db
+from migrations import migrate
+
+# Tables with at least this many rows after seeding count as large
+LARGE_TABLE_ROWS = 1000
+
+# Rows seeded into each player-scaled table
+SEED_ROWS = 5000
+
+# Seeded data; `n` counts from 1 to SEED_ROWS
+SEED_STATEMENTS = [
+    "INSERT INTO players (id, name, resources) SELECT i, 'Player ' || i, '{}' FROM n",
+    "INSERT INTO player_resources (player_id, resource, amount) SELECT i, 'energy', 100 FROM n",
+    "INSERT INTO users (username, password_hash) SELECT 'user' || i, 'x' FROM n",
+    "INSERT INTO tasks (name, required_resources, rewards, duration) VALUES ('Survey', '{\"energy\": 10}', '{\"data\": 5}', 3)",
+    "INSERT INTO active_tasks (player_id, task_id, ticks_remaining, due_tick) SELECT i, 1, 3, 1000 + i FROM n",
+    "INSERT INTO currencies (name, type) SELECT 'Currency ' || i, 'planetary' FROM n WHERE i <= 10",
+    """INSERT INTO currency_exchange (buyer_id, seller_id, currency_from_id, currency_to_id, amount, rate, ticks_remaining, due_tick)
+       SELECT i, i + 1, 2, 1, 1, 2, 5, 1000 + i FROM n""",
+    """INSERT INTO currency_exchange_history (id, buyer_id, seller_id, currency_from_id, currency_to_id, amount, rate, due_tick, settled_tick)
+       SELECT 100000 + i, i, i + 1, 2, 1, 1, 2, 0, 0 FROM n""",
+    "INSERT INTO currency_balances (player_id, currency_id, amount) SELECT i, 1, 10 FROM n",
+    "INSERT INTO notifications (player_id, message) SELECT i % 500 + 1, 'Seeded ' || i FROM n",
+    "INSERT INTO celestial_bodies (name, type, resources, x, y) SELECT 'Body ' || i, 'planet', '{}', i * 7 % 65536, i * 13 % 65536 FROM n",
+    """INSERT INTO market_orders (id, player_id, base_currency_id, quote_currency_id, side, order_type, price, quantity, remaining, status, created_tick)
+       SELECT i, i % 500 + 1, 1, 2, CASE i % 2 WHEN 0 THEN 'buy' ELSE 'sell' END, 'limit',
+              CASE i % 2 WHEN 0 THEN 90 ELSE 110 END, 1, 1, CASE WHEN i % 10 = 0 THEN 'open' ELSE 'filled' END, 0
+       FROM n""",
+    """INSERT INTO exchange_candles (base_currency_id, quote_currency_id, resolution, bucket, open, high, low, close, volume, notional)
+       SELECT 1, 2, 1, i, 2, 2, 2, 2, 1, 2 FROM n""",
+    "INSERT INTO alliances (name, leader_id) SELECT 'Alliance ' || i, i FROM n",
+    "INSERT INTO alliance_members (alliance_id, player_id, role) SELECT i % 100 + 1, i, 'member' FROM n",
+    "INSERT INTO governments (alliance_id, type, constitution) SELECT i, 'democracy', '{}' FROM n WHERE i <= 100",
+    """INSERT INTO legislation (government_id, proposer_id, title, description, status, deadline_tick)
+       SELECT i % 100 + 1, i, 'Bill ' || i, '', CASE WHEN i % 10 = 0 THEN 'proposed' ELSE 'enacted' END, 1000 + i FROM n""",
+    "INSERT INTO votes (legislation_id, player_id, vote) SELECT i % 50 + 1, i, 'yes' FROM n",
+]
+
+# One request per route: (method, path, JSON body); every URL rule must be covered
+SAMPLE_REQUESTS = [
+    ("GET", "/", None),
+    ("GET", "/moon_base", None),
+    ("GET", "/galactic_map", None),
+    ("GET", "/alliance_management", None),
+    ("GET", "/marketplace", None),
+    ("GET", "/static/js/script.js", None),
+    ("POST", "/api/player/create", {"name": "Plan Check"}),
+    ("POST", "/api/player/create_batch", {"players": [{"name": "Plan Check A"}, {"name": "Plan Check B"}]}),
+    ("GET", "/api/player/1", None),
+    ("POST", "/api/task/assign", {"player_id": 1, "task_name": "Survey"}),
+    ("POST", "/api/currency/create_planetary", {"planet_id": 1, "planet_name": "Plan Check"}),
+    ("POST", "/api/currency/buy", {"buyer_id": 1, "seller_id": 2, "currency_from_id": 2, "currency_to_id": 1, "amount": 1, "rate": 2}),
+    ("POST", "/api/currency/buy_batch", {"exchanges": [{"buyer_id": 1, "seller_id": 2, "currency_from_id": 2, "currency_to_id": 1, "amount": 1, "rate": 2}]}),
+    ("GET", "/api/currency/exchange_rates", None),
+    ("GET", "/api/currency/rate/1/2", None),
+    ("GET", "/api/currency/history/1/2?from_tick=0", None),
+    ("GET", "/api/currency/notify?player_id=1&after=0", None),
+    ("POST", "/api/currency/clear_notifications", {"player_id": 1, "up_to": 5}),
+    ("POST", "/api/alliance/create", {"name": "Plan Check", "leader_id": 1}),
+    ("GET", "/api/alliance/members/1?after_id=10&limit=5", None),
+    ("GET", "/api/alliance/1/stats", None),
+    ("GET", "/api/alliance/leaderboard", None),
+    ("GET", "/api/alliance/leaderboard?by=members&offset=10", None),
+    ("GET", "/api/alliance/leaderboard?by=energy", None),
+    ("POST", "/api/government/create", {"alliance_id": 1, "type": "democracy"}),
+    ("POST", "/api/legislation/propose", {"government_id": 1, "player_id": 100, "title": "Plan Check", "voting_ticks": 1}),
+    ("POST", "/api/legislation/100/vote", {"player_id": 1000, "vote": "no"}),
+    ("GET", "/api/legislation/100", None),
+    ("GET", "/api/map?bbox=0,0,4096,4096", None),
+    ("GET", "/api/map?bbox=0,0,65536,65536", None),
+    ("GET", "/api/map?after_id=100", None),
+    ("GET", "/api/map/tiles/2/1/1", None),
+    ("GET", "/api/map/body/1", None),
+    ("POST", "/api/map/add", {"name": "Plan Check", "type": "planet", "x": 1, "y": 2}),
+    ("POST", "/api/map/add_batch", {"bodies": [{"name": "Plan Check Batch", "type": "moon", "x": 3, "y": 4}]}),
+    ("POST", "/api/map/explore", {"id": 1}),
+    ("GET", "/api/market/book/1/2", None),
+    ("POST", "/api/market/orders", {"player_id": 1, "base_currency_id": 1, "quote_currency_id": 2, "side": "buy", "price": 95, "quantity": 1}),
+    ("POST", "/api/market/orders", {"player_id": 1, "base_currency_id": 1, "quote_currency_id": 2, "side": "sell", "type": "market", "quantity": 2}),
+    ("POST", "/api/market/orders/10/cancel", {"player_id": 11}),
+    ("GET", "/api/tasks/1", None),
+    ("POST", "/api/tasks/available", {"player_ids": [1, 2, 3]}),
+    ("POST", "/api/tasks/assign", {"player_id": 1, "task_id": 1}),
+    ("POST", "/api/tasks/assign_batch", {"assignments": [{"player_id": 1, "task_id": 1}, {"player_id": 2, "task_id": 1}]}),
+    ("GET", "/api/tasks/active/1", None),
+    ("POST", "/api/tasks/complete", {}),
+    ("POST", "/api/tick/run", None),
+    ("GET", "/api/tick/stats", None),
+    ("GET", "/api/stream/1", None),
+    ("GET", "/api/system/db_pool", None),
+    ("GET", "/api/system/response_cache", None),
+    ("GET", "/api/system/auth", None),
+    ("GET", "/api/system/player_cache", None),
+    ("GET", "/metrics", None),
+    ("POST", "/api/auth/register", {"username": "plan_check", "password": "secret"}),
+    ("POST", "/api/auth/login", {"username": "user1", "password": "secret"}),
+    ("GET", "/api/auth/session", None),
+    ("POST", "/api/auth/logout", None),
+]
+
+# Index scans that walk a ranking in index order and stop at the query's LIMIT: (table, index)
+ORDERED_INDEX_SCANS = {
+    ("alliance_stats", "idx_alliance_stats_total"),
+    ("alliance_stats", "idx_alliance_stats_members"),
+}
+
+# Words that can follow a table name without being an alias
+SQL_KEYWORDS = {
+    "where", "join", "left", "inner", "cross", "on", "using", "group", "order", "limit", "set",
+    "values", "select", "default", "as", "natural", "outer", "union", "returning", "window"
+}
+
+TABLE_REFERENCE = re.compile(r"\b(?:FROM|JOIN|UPDATE|INTO)\s+([A-Za-z_]\w*)(?:\s+(?:AS\s+)?([A-Za-z_]\w*))?", re.IGNORECASE)
+
+def seed(path):
+    """Fill the player-scaled tables of a migrated database."""
+    conn = sqlite3.connect(path)
+    for statement in SEED_STATEMENTS:
+        conn.execute(f"WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {SEED_ROWS}) {statement}")
+    conn.commit()
+    conn.close()
+
+def large_tables(conn):
+    """Return the tables holding at least LARGE_TABLE_ROWS rows."""
+    tables = [row[0] for row in conn.execute("""
+        SELECT name FROM sqlite_master
+        WHERE type = 'table' AND sql NOT LIKE 'CREATE VIRTUAL%' AND name NOT LIKE '%_rtree_%'
+    """)]
+    return {table for table in tables
+            if conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] >= LARGE_TABLE_ROWS}
+
+def table_aliases(sql):
+    """Map the names used for tables in `sql` (aliases included) to the tables."""
+    aliases = {}
+    for table, alias in TABLE_REFERENCE.findall(sql):
+        aliases[table] = table
+        if alias and alias.lower() not in SQL_KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+def full_scans(conn, sql, large):
+    """Return the large tables that `sql` scans in full, per EXPLAIN QUERY PLAN."""
+    aliases = table_aliases(sql)
+    scans = []
+    for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+        detail = row[3]
+        match = re.match(r"SCAN (\w+)", detail)
+        if not match or "VIRTUAL TABLE" in detail:
+            continue
+        table = aliases.get(match.group(1), match.group(1))
+        index = re.search(r"USING (?:COVERING )?INDEX (\w+)", detail)
+        if index and (table, index.group(1)) in ORDERED_INDEX_SCANS and "LIMIT" in sql.upper():
+            continue
+        if table in large:
+            scans.append(f"{table}: {detail}")
+    return scans
+
+def exercise_routes(app, statements):
+    """Issue SAMPLE_REQUESTS, recording each traced statement with its route.
+
+    Returns the URL rules that no sample request reached.
+    """
+    client = app.test_client()
+    adapter = app.url_map.bind("localhost")
+    covered = set()
+    for method, path, body in SAMPLE_REQUESTS:
+        rule, _ = adapter.match(path.split("?")[0], method=method, return_rule=True)
+        covered.add(rule.rule)
+        statements.route = f"{method} {path}"
+        response = client.open(path, method=method, json=body, buffered=False)
+        # Streaming routes run their queries while the first chunk is produced
+        if response.is_streamed:
+            next(iter(response.response), None)
+        response.close()
+        if response.status_code >= 500:
+            print(f"warning: {method} {path} returned {response.status_code}")
+    return {rule.rule for rule in app.url_map.iter_rules()} - covered
+
+class StatementLog(dict):
+    """Distinct traced statements, each mapped to the first route that issued it."""
+
+    route = None
+
+    def __call__(self, sql):
+        sql = sql.strip()
+        if sql and not re.match(r"(--|BEGIN|COMMIT|ROLLBACK|PRAGMA|CREATE|SAVEPOINT|RELEASE)", sql, re.IGNORECASE):
+            self.setdefault(sql, self.route)
+
+def main():
+    """Run the check and return the process exit status."""
+    os.environ["EXOGENESIS_TICK_THREAD"] = "0"
+    os.environ["EXOGENESIS_MANUAL_TICKS"] = "1"
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(), "plan_check.db")
+    migrate()
+    seed(db.DB_PATH)
+
+    statements = StatementLog()
+    db.set_statement_trace(statements)
+    from app import app
+    uncovered = exercise_routes(app, statements)
+    db.set_statement_trace(None)
+
+    conn = sqlite3.connect(db.DB_PATH)
+    large = large_tables(conn)
+    failures = []
+    for sql, route in statements.items():
+        for scan in full_scans(conn, sql, large):
+            failures.append(f"{route}\n    {scan}\n    {' '.join(sql.split())[:300]}")
+    conn.close()
+
+    print(f"Checked {len(statements)} statements from {len(SAMPLE_REQUESTS)} requests; large tables: {', '.join(sorted(large))}")
+    for rule in sorted(uncovered):
+        print(f"no sample request for route {rule}")
+    for failure in failures:
+        print(f"full scan of a large table in {failure}")
+    return 1 if failures or uncovered else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
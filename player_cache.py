@@ -0,0 +1,373 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from db import get_connection
+
+logger = logging.getLogger(__name__)
+
+def parse_owner(value):
+    """Parse an "index/count" ownership setting into (index, count)."""
+    index, _, count = value.partition("/")
+    return int(index), int(count or 1)
+
+# Write-behind cache of player state. Only players with
+# player_id % owners == owner_index are cached by this process; route each
+# player's requests to their owner when running several worker processes.
+PLAYER_CACHE_SETTINGS = {
+    "max_players": int(os.environ.get("EXOGENESIS_PLAYER_CACHE", "0")),  # LRU size; 0 disables the cache
+    "max_dirty_players": int(os.environ.get("EXOGENESIS_PLAYER_CACHE_MAX_DIRTY", "10000")),  # Flush early past this many
+    "flush_seconds": 10.0,  # Flush interval in processes that do not run the tick
+    "owner_index": parse_owner(os.environ.get("EXOGENESIS_PLAYER_CACHE_OWNER", "0/1"))[0],
+    "owners": parse_owner(os.environ.get("EXOGENESIS_PLAYER_CACHE_OWNER", "0/1"))[1],
+}
+
+def add_amounts(changes, amounts, sign):
+    """Add (sign=1) or subtract (sign=-1) amounts from a {resource: change} dict, dropping zeros."""
+    for resource, amount in amounts.items():
+        change = changes.get(resource, 0) + sign * amount
+        if change:
+            changes[resource] = change
+        else:
+            changes.pop(resource, None)
+
+class CachedPlayer:
+    """A player's row, their balances as last committed, and changes not yet flushed.
+
+    `flushing` holds the part of `delta` already written by flushes whose
+    transactions have not finished, so a concurrent flush does not write it
+    again. `versions` records which write each base balance came from.
+    """
+
+    __slots__ = ("player", "base", "versions", "delta", "flushing", "pending")
+
+    def __init__(self, player, base):
+        self.player = player
+        self.base = base
+        self.versions = {}
+        self.delta = {}
+        self.flushing = {}
+        self.pending = 0
+
+    def resources(self):
+        """Return the balances including unflushed changes."""
+        resources = dict(self.base)
+        for resource, change in self.delta.items():
+            resources[resource] = resources.get(resource, 0) + change
+        return resources
+
+    def change(self, amounts, sign):
+        """Add (sign=1) or subtract (sign=-1) amounts from the unflushed changes."""
+        add_amounts(self.delta, amounts, sign)
+
+    def fold(self, resource, amount, version):
+        """Take a committed balance, unless one from a later write is already in."""
+        if version > self.versions.get(resource, 0):
+            self.base[resource] = amount
+            self.versions[resource] = version
+
+    def unwritten(self):
+        """Return the unflushed changes no flush in progress has written."""
+        changes = dict(self.delta)
+        add_amounts(changes, self.flushing, -1)
+        return changes
+
+class PlayerCache:
+    """Bounded LRU of recently active players with write-behind balances.
+
+    Grants change only the cached entry and mark it dirty once the
+    request's transaction commits. Deductions are held against the cached
+    balance straight away (and given back on rollback), and the caller
+    flushes the player in the same transaction, so a committed deduction
+    is always in SQLite. flush() writes every dirty player's changes as
+    deltas in one upsert; the tick runs it as its first stage, and its
+    commit brings the cached balances up to date with what the tick wrote.
+    At most max_dirty_players players', and at most one tick of, unflushed
+    grants are lost if the process dies.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.entries = OrderedDict()
+        self.dirty = set()
+        self.generation = 0
+        self.writes = 0  # Numbers flushes in the order they hold the write lock
+        self.seen_tick = None
+        self.flush_thread = None
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "flushes": 0, "players_flushed": 0,
+                      "rows_flushed": 0, "early_flushes": 0, "conflicts": 0}
+
+    def caches(self, player_id):
+        """Whether this process caches the player."""
+        settings = PLAYER_CACHE_SETTINGS
+        return settings["max_players"] > 0 and player_id % settings["owners"] == settings["owner_index"]
+
+    def get(self, player_id):
+        """Return the cached entry, or None, without touching SQLite."""
+        with self.lock:
+            entry = self.entries.get(player_id)
+            if entry is not None:
+                self.entries.move_to_end(player_id)
+                self.stats["hits"] += 1
+            return entry
+
+    def load(self, cursor, player_id):
+        """Return the player's entry, reading it from SQLite on a miss; None if there is no such player.
+
+        Entries read through a read-only connection are returned but not
+        kept, since a read copy may be behind the database.
+        """
+        while True:
+            entry = self.get(player_id)
+            if entry is not None:
+                return entry
+            with self.lock:
+                self.stats["misses"] += 1
+                generation = self.generation
+
+            player = cursor.execute("SELECT * FROM players WHERE id = ?", (player_id,)).fetchone()
+            if not player:
+                return None
+            rows = cursor.execute("""
+                SELECT resource, amount FROM player_resources WHERE player_id = ?
+            """, (player_id,)).fetchall()
+            entry = CachedPlayer(dict(player), {row["resource"]: row["amount"] for row in rows})
+            if getattr(cursor.connection, "read_only", False):
+                return entry
+
+            with self.lock:
+                # A tick committed while reading; read again so the balances include it
+                if generation != self.generation:
+                    continue
+                if player_id not in self.entries:
+                    self.evict(room=1)
+                    self.entries[player_id] = entry
+                return self.entries[player_id]
+
+    def evict(self, room=0):
+        """Drop least recently used entries with no unflushed changes until `room` more fit under max_players."""
+        excess = len(self.entries) + room - PLAYER_CACHE_SETTINGS["max_players"]
+        if excess <= 0:
+            return
+        for player_id in list(self.entries):
+            entry = self.entries[player_id]
+            if not entry.delta and not entry.pending:
+                del self.entries[player_id]
+                self.stats["evictions"] += 1
+                excess -= 1
+                if excess == 0:
+                    return
+
+    def deduct(self, cursor, player_id, costs):
+        """Deduct costs from the cached balances if they cover all of them.
+
+        The deduction counts against the balance at once, so concurrent
+        requests cannot overdraw, and is given back if the transaction
+        rolls back.
+        """
+        entry = self.load(cursor, player_id)
+        if entry is None:
+            return False
+        with self.lock:
+            resources = entry.resources()
+            if any(resources.get(resource, 0) < amount for resource, amount in costs.items()):
+                return False
+            entry.change(costs, -1)
+            entry.pending += 1
+            self.dirty.add(player_id)
+        cursor.connection.on_commit(lambda committed: self.settle(player_id, costs, committed, refund=True))
+        return True
+
+    def grant(self, cursor, player_id, amounts):
+        """Add amounts to the cached balances once the transaction commits."""
+        entry = self.load(cursor, player_id)
+        if entry is None:
+            return
+        with self.lock:
+            entry.pending += 1
+        cursor.connection.on_commit(lambda committed: self.settle(player_id, amounts, committed, refund=False))
+
+    def settle(self, player_id, amounts, committed, refund):
+        """Finish a deduction (refund=True) or grant when its transaction ends."""
+        with self.lock:
+            entry = self.entries.get(player_id)
+            if entry is None:
+                # Dropped by configure_player_cache()
+                return
+            entry.pending -= 1
+            if committed != refund:
+                entry.change(amounts, 1)
+            if entry.delta:
+                self.dirty.add(player_id)
+            early = committed and len(self.dirty) > PLAYER_CACHE_SETTINGS["max_dirty_players"]
+            if early:
+                self.stats["early_flushes"] += 1
+        if early:
+            self.flush_now()
+
+    def flush(self, cursor, events=None, player_ids=None):
+        """Write every dirty player's changes (or just `player_ids`') in one statement, as deltas.
+
+        Deltas add to whatever the row holds, so writes made meanwhile by
+        the tick are kept. When the transaction commits, the flushed
+        changes move into the cached balances, as do the balances the tick
+        recorded in `events`.
+        """
+        with self.lock:
+            flushing = set(self.dirty) if player_ids is None else self.dirty.intersection(player_ids)
+            self.dirty -= flushing
+            taken = {}
+            for player_id in flushing:
+                entry = self.entries.get(player_id)
+                changes = entry.unwritten() if entry is not None else None
+                if changes:
+                    taken[player_id] = changes
+                    add_amounts(entry.flushing, changes, 1)
+        changes = [[player_id, resource, change] for player_id, delta in taken.items() for resource, change in delta.items()]
+
+        balances = []
+        if changes:
+            balances = cursor.execute("""
+                INSERT INTO player_resources (player_id, resource, amount)
+                SELECT value ->> 0, value ->> 1, value ->> 2 FROM json_each(?) WHERE true
+                ON CONFLICT (player_id, resource) DO UPDATE SET amount = amount + excluded.amount
+                RETURNING player_id, resource, amount
+            """, (json.dumps(changes),)).fetchall()
+        balances = [(row["player_id"], row["resource"], row["amount"]) for row in balances]
+        # Callers hold the write lock by now, so versions follow commit order
+        # even when commit callbacks run out of order
+        with self.lock:
+            self.writes += 1
+            version = self.writes
+        cursor.connection.on_commit(lambda committed: self.flushed(committed, taken, balances, events, version))
+        return {"players_flushed": len(taken), "rows_written": len(balances)}
+
+    def flushed(self, committed, taken, balances, events, version):
+        """Fold a committed flush, and the tick's new balances, into the cached balances."""
+        with self.lock:
+            for player_id, changes in taken.items():
+                entry = self.entries.get(player_id)
+                if entry is not None:
+                    add_amounts(entry.flushing, changes, -1)
+            if not committed:
+                self.dirty.update(player_id for player_id in taken if player_id in self.entries)
+                return
+            self.generation += 1
+            for player_id, changes in taken.items():
+                entry = self.entries.get(player_id)
+                if entry is not None:
+                    entry.change(changes, -1)
+                    if entry.delta:
+                        self.dirty.add(player_id)
+            for player_id, resource, amount in balances:
+                entry = self.entries.get(player_id)
+                if entry is not None:
+                    entry.fold(resource, amount, version)
+                if amount < 0:
+                    # Only possible when another process changed a player this process owns
+                    self.stats["conflicts"] += 1
+                    logger.warning("Player %s overdrawn on %s after flush: %s", player_id, resource, amount)
+            for player_id, payload in (events.players.items() if events is not None else ()):
+                entry = self.entries.get(player_id)
+                if entry is not None and "resources" in payload:
+                    for resource, amount in payload["resources"].items():
+                        entry.fold(resource, amount, version)
+            self.stats["flushes"] += 1
+            self.stats["players_flushed"] += len(taken)
+            self.stats["rows_flushed"] += len(balances)
+
+    def flush_now(self):
+        """Flush in a transaction of its own."""
+        conn = get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            self.flush(cursor)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def invalidate_clean(self):
+        """Drop every entry without unflushed changes; they are read again on next use."""
+        with self.lock:
+            for player_id in [player_id for player_id, entry in self.entries.items() if not entry.delta and not entry.pending]:
+                del self.entries[player_id]
+
+    def flush_loop(self):
+        """Flush every flush_seconds, dropping clean entries once another process has run a tick.
+
+        Ticks only add to balances, so entries read before a tick
+        understate them until dropped, never overstate them.
+        """
+        while True:
+            time.sleep(PLAYER_CACHE_SETTINGS["flush_seconds"])
+            try:
+                self.flush_now()
+                conn = get_connection()
+                tick = conn.execute("SELECT current_tick FROM game_clock WHERE id = 1").fetchone()[0]
+                conn.close()
+                if tick != self.seen_tick:
+                    self.seen_tick = tick
+                    self.invalidate_clean()
+            except Exception:
+                logger.exception("Player cache flush failed; retrying next interval")
+
+    def start_flush_thread(self):
+        """Flush on a timer, for processes whose ticks run elsewhere."""
+        if self.flush_thread is None:
+            self.flush_thread = threading.Thread(target=self.flush_loop, daemon=True)
+            self.flush_thread.start()
+
+    def snapshot(self):
+        """Return cache counters and current size."""
+        with self.lock:
+            return {**self.stats, "players": len(self.entries), "dirty_players": len(self.dirty),
+                    "max_players": PLAYER_CACHE_SETTINGS["max_players"]}
+
+cache = PlayerCache()
+
+def get_player(cursor, player_id):
+    """Return a player's row with their resources, or None, from the cache when this process owns them."""
+    if cache.caches(player_id):
+        entry = cache.load(cursor, player_id)
+        return {**entry.player, "resources": entry.resources()} if entry else None
+    player = cursor.execute("SELECT * FROM players WHERE id = ?", (player_id,)).fetchone()
+    if not player:
+        return None
+    rows = cursor.execute("""
+        SELECT resource, amount FROM player_resources WHERE player_id = ?
+    """, (player_id,)).fetchall()
+    return {**dict(player), "resources": {row["resource"]: row["amount"] for row in rows}}
+
+def flush_player_cache(cursor, tick, events=None):
+    """Tick stage: write the cached players' unflushed changes."""
+    if PLAYER_CACHE_SETTINGS["max_players"] <= 0:
+        return {"players_flushed": 0, "rows_written": 0}
+    return cache.flush(cursor, events)
+
+def configure_player_cache(**settings):
+    """Change cache settings; flushes first and starts over with an empty cache."""
+    unknown = set(settings) - set(PLAYER_CACHE_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown player cache settings: {', '.join(sorted(unknown))}")
+    if cache.dirty:
+        cache.flush_now()
+    PLAYER_CACHE_SETTINGS.update(settings)
+    with cache.lock:
+        cache.entries.clear()
+        cache.dirty.clear()
+
+def init_app(app, runs_tick):
+    """Flush on exit and, when this process does not run the tick, on a timer."""
+    if PLAYER_CACHE_SETTINGS["max_players"] <= 0:
+        return
+    atexit.register(cache.flush_now)
+    if not runs_tick:
+        cache.start_flush_thread()
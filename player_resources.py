@@ -0,0 +1,119 @@
+import json
+
+from player_cache import cache
+
+# Starting resources for a newly created player
+STARTING_RESOURCES = {"energy": 50, "materials": 100}
+
+def get_resources(cursor, player_id):
+    """Return a player's resources as a {resource: amount} dict."""
+    if cache.caches(player_id):
+        entry = cache.load(cursor, player_id)
+        return entry.resources() if entry else {}
+    rows = cursor.execute("""
+        SELECT resource, amount FROM player_resources WHERE player_id = ?
+    """, (player_id,)).fetchall()
+    return {row["resource"]: row["amount"] for row in rows}
+
+def get_resources_batch(cursor, player_ids):
+    """Return {player_id: {resource: amount}} for many players in one query.
+
+    Cached players are answered from the player cache; the rest are read
+    without being added to it.
+    """
+    resources_by_player = {player_id: {} for player_id in player_ids}
+    uncached = []
+    for player_id in player_ids:
+        entry = cache.get(player_id) if cache.caches(player_id) else None
+        if entry is not None:
+            resources_by_player[player_id] = entry.resources()
+        else:
+            uncached.append(player_id)
+    rows = cursor.execute("""
+        SELECT player_id, resource, amount FROM player_resources
+        WHERE player_id IN (SELECT value FROM json_each(?))
+    """, (json.dumps(uncached),)).fetchall()
+    for row in rows:
+        resources_by_player[row["player_id"]][row["resource"]] = row["amount"]
+    return resources_by_player
+
+def grant_resources(cursor, player_id, amounts):
+    """Add amounts to a player's resources, creating missing rows."""
+    if not amounts:
+        return
+    if cache.caches(player_id) and cache.get(player_id) is not None:
+        cache.grant(cursor, player_id, amounts)
+        return
+    cursor.execute("""
+        INSERT INTO player_resources (player_id, resource, amount)
+        SELECT ?, key, value FROM json_each(?) WHERE true
+        ON CONFLICT (player_id, resource) DO UPDATE SET amount = amount + excluded.amount
+    """, (player_id, json.dumps(amounts)))
+
+def deduct_resources(cursor, player_id, costs):
+    """Atomically deduct costs from a player's resources.
+
+    One conditional UPDATE deducts every cost only if all balances cover
+    them, so concurrent deductions can never overdraw a player. Returns
+    False (and changes nothing) when any balance is too low. A cached
+    player is checked against the cache and then flushed in the caller's
+    transaction, so the deduction commits or rolls back with it.
+    """
+    costs = {resource: amount for resource, amount in costs.items() if amount > 0}
+    if not costs:
+        return True
+    if cache.caches(player_id):
+        if not cache.deduct(cursor, player_id, costs):
+            return False
+        cache.flush(cursor, player_ids=[player_id])
+        return True
+    cursor.execute("""
+        UPDATE player_resources
+        SET amount = amount - (SELECT c.value FROM json_each(:costs) c WHERE c.key = player_resources.resource)
+        WHERE player_id = :player_id
+          AND resource IN (SELECT key FROM json_each(:costs))
+          AND NOT EXISTS (
+              SELECT 1 FROM json_each(:costs) c
+              LEFT JOIN player_resources pr ON pr.player_id = :player_id AND pr.resource = c.key
+              WHERE COALESCE(pr.amount, 0) < c.value
+          )
+    """, {"player_id": player_id, "costs": json.dumps(costs)})
+    return cursor.rowcount == len(costs)
+
+def deduct_resources_in_order(cursor, deductions):
+    """Apply a list of (player_id, costs) deductions in order, each only if still covered.
+
+    Later deductions for a player see the earlier ones. Uncached balances
+    are read once and written back with executemany, and cached players
+    are flushed together at the end, so the caller must hold the write
+    lock (BEGIN IMMEDIATE). Returns one bool per deduction and the new
+    balances of every player that changed.
+    """
+    uncached = sorted({player_id for player_id, _ in deductions if not cache.caches(player_id)})
+    balances = get_resources_batch(cursor, uncached)
+
+    applied = []
+    changed = set()
+    for player_id, costs in deductions:
+        costs = {resource: amount for resource, amount in costs.items() if amount > 0}
+        if cache.caches(player_id):
+            ok = not costs or cache.deduct(cursor, player_id, costs)
+        else:
+            balance = balances[player_id]
+            ok = all(balance.get(resource, 0) >= amount for resource, amount in costs.items())
+            if ok:
+                for resource, amount in costs.items():
+                    balance[resource] -= amount
+                    changed.add((player_id, resource))
+        applied.append(ok)
+
+    cursor.executemany("""
+        UPDATE player_resources SET amount = ? WHERE player_id = ? AND resource = ?
+    """, [(balances[player_id][resource], player_id, resource) for player_id, resource in changed])
+    cached = {player_id for player_id, _ in deductions if cache.caches(player_id)}
+    if cached:
+        cache.flush(cursor, player_ids=cached)
+
+    changed_players = {player_id for (player_id, _), ok in zip(deductions, applied) if ok}
+    return applied, {player_id: balances[player_id] if player_id in balances else get_resources(cursor, player_id)
+                     for player_id in changed_players}
@@ -0,0 +1,166 @@
+import threading
+from collections import deque
+
+from settlement import CANDLE_RESOLUTIONS
+from tick import current_tick
+
+# Ticks covered by the rolling rate window
+RATE_WINDOW = 60
+
+# Most candles returned by one history query
+MAX_CANDLES = 1000
+
+class RollingWindow:
+    """OHLC and VWAP of one pair over the last `ticks` ticks.
+
+    Fed one per-tick candle at a time; volume and notional are running sums
+    and high/low come from monotonic deques, so each push or eviction is
+    O(1) amortized.
+    """
+
+    def __init__(self, ticks, start_tick):
+        self.ticks = ticks
+        self.last_tick = start_tick
+        self.candles = deque()
+        self.highs = deque()
+        self.lows = deque()
+        self.volume = 0.0
+        self.notional = 0.0
+
+    def push(self, tick, open_rate, high, low, close, volume, notional):
+        """Append the candle of a tick newer than any already pushed."""
+        self.candles.append((tick, open_rate, close, volume, notional))
+        self.volume += volume
+        self.notional += notional
+        while self.highs and self.highs[-1][1] <= high:
+            self.highs.pop()
+        self.highs.append((tick, high))
+        while self.lows and self.lows[-1][1] >= low:
+            self.lows.pop()
+        self.lows.append((tick, low))
+        self.last_tick = tick
+
+    def evict(self, now):
+        """Drop candles that fell out of the window ending at tick `now`."""
+        oldest = now - self.ticks
+        while self.candles and self.candles[0][0] <= oldest:
+            _, _, _, volume, notional = self.candles.popleft()
+            self.volume -= volume
+            self.notional -= notional
+        while self.highs and self.highs[0][0] <= oldest:
+            self.highs.popleft()
+        while self.lows and self.lows[0][0] <= oldest:
+            self.lows.popleft()
+
+    def snapshot(self):
+        """Return the window's OHLC, volume and VWAP (None values when no trades)."""
+        if not self.candles:
+            return {"window_ticks": self.ticks, "open": None, "high": None, "low": None,
+                    "close": None, "volume": 0.0, "vwap": None}
+        return {
+            "window_ticks": self.ticks,
+            "open": self.candles[0][1],
+            "high": self.highs[0][1],
+            "low": self.lows[0][1],
+            "close": self.candles[-1][2],
+            "volume": self.volume,
+            "vwap": self.notional / self.volume if self.volume else None
+        }
+
+# Rolling windows by (base_currency_id, quote_currency_id)
+windows = {}
+windows_lock = threading.Lock()
+
+def pair_window(pair, now):
+    """Return a pair's window, starting a new one if it is missing or ahead of `now`; call under windows_lock."""
+    window = windows.get(pair)
+    if window is None or window.last_tick > now:
+        window = windows[pair] = RollingWindow(RATE_WINDOW, now - RATE_WINDOW)
+    return window
+
+def catch_up(window, candles, now):
+    """Push the candles newer than the window's last tick, then evict those older than the window ending at `now`."""
+    for candle in candles:
+        if candle[0] > window.last_tick:
+            window.push(*candle)
+    window.last_tick = max(window.last_tick, now)
+    window.evict(now)
+
+def pair_rate(pair, now, window):
+    """Return a pair's rolling rate as of tick `now`."""
+    return {"base_currency_id": pair[0], "quote_currency_id": pair[1], "tick": now, **window.snapshot()}
+
+def rolling_rate(cursor, base_currency_id, quote_currency_id):
+    """Return the rolling rate of a pair, catching its window up from the 1-tick candles.
+
+    Only candles newer than the window's last tick are read (a primary
+    key range), so windows stay correct whichever process runs the tick.
+    The read happens outside windows_lock.
+    """
+    pair = (base_currency_id, quote_currency_id)
+    now = current_tick(cursor)
+    while True:
+        with windows_lock:
+            window = pair_window(pair, now)
+            since = max(window.last_tick, now - RATE_WINDOW)
+
+        candles = cursor.execute("""
+            SELECT bucket, open, high, low, close, volume, notional FROM exchange_candles
+            WHERE base_currency_id = ? AND quote_currency_id = ? AND resolution = 1
+              AND bucket > ? AND bucket <= ?
+            ORDER BY bucket
+        """, (base_currency_id, quote_currency_id, since, now)).fetchall()
+
+        with windows_lock:
+            # Another request restarted the window meanwhile; read again for the new one
+            if windows.get(pair) is not window:
+                continue
+            catch_up(window, candles, now)
+            return pair_rate(pair, now, window)
+
+def rolling_rates(cursor):
+    """Return the rolling rates of every pair traded within the window.
+
+    One read of the window's 1-tick candles, in bucket order through the
+    recent-candles index, catches every pair's window up at once.
+    """
+    now = current_tick(cursor)
+    rows = cursor.execute("""
+        SELECT base_currency_id, quote_currency_id, bucket, open, high, low, close, volume, notional
+        FROM exchange_candles
+        WHERE resolution = 1 AND bucket > ? AND bucket <= ?
+        ORDER BY bucket
+    """, (now - RATE_WINDOW, now)).fetchall()
+    candles_by_pair = {}
+    for row in rows:
+        candles_by_pair.setdefault((row[0], row[1]), []).append(tuple(row)[2:])
+
+    with windows_lock:
+        rates = []
+        for pair, candles in sorted(candles_by_pair.items()):
+            window = pair_window(pair, now)
+            catch_up(window, candles, now)
+            rates.append(pair_rate(pair, now, window))
+        return rates
+
+def pick_resolution(from_tick, to_tick):
+    """Return the finest resolution that covers the range in at most MAX_CANDLES candles."""
+    for resolution in CANDLE_RESOLUTIONS:
+        if (to_tick - from_tick) // resolution < MAX_CANDLES:
+            return resolution
+    return CANDLE_RESOLUTIONS[-1]
+
+# Fields of each candle candle_history() returns, in order
+CANDLE_COLUMNS = ("tick", "open", "high", "low", "close", "volume", "vwap")
+
+def candle_history(cursor, base_currency_id, quote_currency_id, from_tick, to_tick, resolution):
+    """Return up to MAX_CANDLES candles of one resolution from a primary key range, as CANDLE_COLUMNS rows."""
+    return cursor.execute("""
+        SELECT bucket AS tick, open, high, low, close, volume, notional / volume AS vwap
+        FROM exchange_candles
+        WHERE base_currency_id = ? AND quote_currency_id = ? AND resolution = ?
+          AND bucket >= ? AND bucket <= ?
+        ORDER BY bucket
+        LIMIT ?
+    """, (base_currency_id, quote_currency_id, resolution,
+          from_tick // resolution * resolution, to_tick, MAX_CANDLES)).fetchall()
@@ -0,0 +1,173 @@
+import contextlib
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import db
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Where @read_only views read from:
+#   "primary"  - the read-write pool, like every other view
+#   "snapshot" - read-only connections to the live database; each request
+#                reads one WAL snapshot, so ticks never block or change it
+#   "backup"   - read-only connections to a copy made with the online backup
+#                API every `refresh_seconds`; reads never touch the live file
+READ_PATH_SETTINGS = {
+    "mode": os.environ.get("EXOGENESIS_READ_PATH", "primary"),
+    "refresh_seconds": float(os.environ.get("EXOGENESIS_READ_REFRESH_SECONDS", "5")),
+}
+
+READ_PATH_MODES = ("primary", "snapshot", "backup")
+
+class BackupReplica:
+    """Copy of the database refreshed in a background thread.
+
+    Each refresh writes a new file and then points the read pool at it, so
+    requests already reading the previous copy finish undisturbed; that
+    file is then unlinked (open connections keep it readable until they
+    close).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stop_event = None
+        self.thread = None
+        self.path = None
+        self.tick = None
+        self.copied_at = None
+        self.generation = 0
+        self.stats = {"copies": 0, "failures": 0, "last_copy_ms": 0.0}
+
+    def refresh(self):
+        """Copy the live database into a new file and start serving reads from it."""
+        with self.lock:
+            self.generation += 1
+            path = f"{db.DB_PATH}.read-{os.getpid()}-{self.generation}"
+            started = time.perf_counter()
+            copied_at = time.time()
+            with contextlib.closing(sqlite3.connect(db.DB_PATH)) as source, \
+                    contextlib.closing(sqlite3.connect(path)) as copy:
+                # The copy is thrown away on a crash, so it is never synced to disk
+                copy.execute("PRAGMA synchronous = OFF")
+                source.backup(copy)
+                # Keep the copy self-contained so it can be opened immutable
+                copy.execute("PRAGMA journal_mode = DELETE")
+                tick = copy.execute("SELECT current_tick FROM game_clock WHERE id = 1").fetchone()[0]
+            seconds = time.perf_counter() - started
+
+            previous, self.path, self.tick, self.copied_at = self.path, path, tick, copied_at
+            db.set_read_source(path)
+            if previous:
+                os.remove(previous)
+            self.stats["copies"] += 1
+            self.stats["last_copy_ms"] = round(seconds * 1000, 3)
+        registry.observe("exogenesis_read_backup_duration_seconds", seconds)
+
+    def run(self, stop_event, interval):
+        """Refresh every `interval` seconds until `stop_event` is set."""
+        while not stop_event.wait(interval):
+            try:
+                self.refresh()
+            except sqlite3.Error:
+                self.stats["failures"] += 1
+                logger.exception("Read copy refresh failed; serving the previous copy")
+
+    def start(self):
+        """Make the first copy now and keep refreshing it in the background."""
+        self.refresh()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, args=(self.stop_event, READ_PATH_SETTINGS["refresh_seconds"]), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop refreshing, send reads back to the live database and delete the copy."""
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+        with self.lock:
+            db.set_read_source(None)
+            if self.path:
+                os.remove(self.path)
+            self.path = self.tick = self.copied_at = None
+
+    def snapshot(self):
+        """Return refresh counters and the age of the current copy."""
+        return {
+            **self.stats,
+            "tick": self.tick,
+            "age_seconds": round(time.time() - self.copied_at, 3) if self.copied_at else None,
+        }
+
+replica = BackupReplica()
+
+def read_only(view):
+    """Serve a GET view from the read path chosen by READ_PATH_SETTINGS["mode"].
+
+    The view's get_connection() calls share one read-only connection whose
+    transaction is opened before the view runs, so every query sees the
+    same state. Responses say where they were read from: X-Read-Source,
+    X-Read-Tick (the game tick of the data) and X-Read-Staleness-Ms (how
+    long before the request the data was current; 0 for the live file).
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        mode = READ_PATH_SETTINGS["mode"]
+        if mode == "primary":
+            response = view(*args, **kwargs)
+            headers = {"X-Read-Source": "primary"}
+        else:
+            # Noted before connecting, so a copy swapped in meanwhile only overstates staleness
+            copied_at = replica.copied_at if mode == "backup" else None
+            with db.read_only_connections():
+                conn = db.get_connection()
+                try:
+                    # The first read fixes the snapshot for the rest of the request
+                    conn.execute("BEGIN")
+                    tick = conn.execute("SELECT current_tick FROM game_clock WHERE id = 1").fetchone()[0]
+                    response = view(*args, **kwargs)
+                finally:
+                    conn.close()
+            staleness = max(time.time() - copied_at, 0) if copied_at else 0
+            registry.observe("exogenesis_read_staleness_seconds", staleness, mode=mode)
+            headers = {
+                "X-Read-Source": mode,
+                "X-Read-Tick": str(tick),
+                "X-Read-Staleness-Ms": str(round(staleness * 1000)),
+            }
+
+        target = response[0] if isinstance(response, tuple) else response
+        if hasattr(target, "headers"):
+            target.headers.update(headers)
+        return response
+    return wrapper
+
+def configure_read_path(**settings):
+    """Change read path settings, starting or stopping the backup copy as needed."""
+    unknown = set(settings) - set(READ_PATH_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown read path settings: {', '.join(sorted(unknown))}")
+    if settings.get("mode", READ_PATH_SETTINGS["mode"]) not in READ_PATH_MODES:
+        raise ValueError(f"Read path mode must be one of: {', '.join(READ_PATH_MODES)}")
+    replica.stop()
+    READ_PATH_SETTINGS.update(settings)
+    if READ_PATH_SETTINGS["mode"] == "backup":
+        replica.start()
+
+def read_path_stats():
+    """Return the read path mode, read pool counters and backup copy state."""
+    return {
+        "mode": READ_PATH_SETTINGS["mode"],
+        "pool": db.read_pool_stats(),
+        "backup": replica.snapshot(),
+    }
+
+def init_app(app):
+    """Start the backup copy if the configured mode needs one."""
+    configure_read_path()
@@ -0,0 +1,124 @@
+import functools
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import Response, request
+
+from db import get_connection
+from response_encoding import wants_msgpack
+
+# Limits of the response cache
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+RESPONSE_CACHE_MAX_ENTRIES = 10000
+
+class ResponseCache:
+    """LRU cache of serialized GET responses keyed by URL and table versions.
+
+    An entry is valid only while the versions of the tables it was built
+    from are unchanged; writes bump those versions (see db.VERSIONED_TABLES),
+    so stale entries are never served and simply age out of the LRU.
+    """
+
+    def __init__(self, max_bytes=RESPONSE_CACHE_MAX_BYTES, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0, "evictions": 0, "uncacheable": 0}
+
+    def get(self, key, versions):
+        """Return the entry for `key` if it was built from `versions`."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry["versions"] != versions:
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry
+
+    def put(self, key, versions, body, mimetype):
+        """Store a response body, evicting least recently used entries over the limits."""
+        entry = {
+            "versions": versions,
+            "body": body,
+            "mimetype": mimetype,
+            "etag": hashlib.sha1(body).hexdigest()
+        }
+        if len(body) > self.max_bytes:
+            return entry
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous["body"])
+            self.entries[key] = entry
+            self.size += len(body)
+            while self.size > self.max_bytes or len(self.entries) > self.max_entries:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted["body"])
+                self.stats["evictions"] += 1
+        return entry
+
+    def count(self, stat):
+        """Increment one of the counters."""
+        with self.lock:
+            self.stats[stat] += 1
+
+    def snapshot(self):
+        """Return hit/miss counters and current usage."""
+        with self.lock:
+            return {
+                **self.stats,
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "max_entries": self.max_entries
+            }
+
+# Shared cache for the read-heavy GET endpoints
+cache = ResponseCache()
+
+def read_versions(tables):
+    """Read the current versions of `tables` in one query."""
+    conn = get_connection()
+    rows = conn.execute(f"""
+        SELECT name, version FROM table_versions
+        WHERE name IN ({", ".join("?" for _ in tables)})
+    """, tables).fetchall()
+    conn.close()
+    versions = dict(rows)
+    return tuple(versions.get(table, 0) for table in tables)
+
+def cached_response(*tables):
+    """Cache a GET view's successful responses until any of `tables` changes.
+
+    Responses carry a strong ETag; a request whose If-None-Match matches
+    the current entry gets a bodyless 304. JSON and MessagePack bodies are
+    cached separately.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (request.full_path, wants_msgpack())
+            versions = read_versions(tables)
+            entry = cache.get(key, versions)
+
+            if entry is None:
+                response = view(*args, **kwargs)
+                if isinstance(response, tuple) or response.status_code != 200 or response.is_streamed:
+                    cache.count("uncacheable")
+                    return response
+                entry = cache.put(key, versions, response.get_data(), response.mimetype)
+
+            # Weak comparison, so the weak ETag of a compressed copy matches too
+            if request.if_none_match.contains_weak(entry["etag"]):
+                cache.count("not_modified")
+                response = Response(status=304)
+            else:
+                response = Response(entry["body"], mimetype=entry["mimetype"])
+            response.set_etag(entry["etag"])
+            return response
+        return wrapper
+    return decorator
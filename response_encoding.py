@@ -0,0 +1,157 @@
+import gzip
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import msgpack
+from flask import Response, jsonify, request
+
+# Bodies /api views can be encoded as; clients ask for MessagePack with Accept
+JSON_MIMETYPE = "application/json"
+MSGPACK_MIMETYPE = "application/msgpack"
+MSGPACK_MIMETYPES = (MSGPACK_MIMETYPE, "application/x-msgpack")
+
+# Compression of large /api responses for clients sending Accept-Encoding: gzip
+ENCODING_SETTINGS = {
+    "compress": os.environ.get("EXOGENESIS_COMPRESS", "1") != "0",
+    "compress_min_bytes": int(os.environ.get("EXOGENESIS_COMPRESS_MIN_BYTES", "1024")),  # Smaller bodies are sent as is
+    "compress_level": 6,  # gzip level, 1 (fastest) to 9 (smallest)
+    "compressed_cache_bytes": 16 * 1024 * 1024,  # Compressed copies of ETagged bodies kept for reuse
+}
+
+class CompressedBodies:
+    """LRU of gzipped bodies keyed by the strong ETag of the uncompressed body.
+
+    Cached GET responses carry an ETag derived from their bytes, so a body
+    served many times is compressed once.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+        self.stats = {"msgpack_encoded": 0, "compressed": 0, "reused": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def get(self, etag):
+        """Return the compressed body for `etag`, or None."""
+        with self.lock:
+            body = self.entries.get(etag)
+            if body is not None:
+                self.entries.move_to_end(etag)
+                self.stats["reused"] += 1
+            return body
+
+    def put(self, etag, body):
+        """Keep a compressed body, evicting least recently used ones over the limit."""
+        with self.lock:
+            previous = self.entries.pop(etag, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.entries[etag] = body
+            self.size += len(body)
+            while self.size > ENCODING_SETTINGS["compressed_cache_bytes"]:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def count(self, bytes_in=0, bytes_out=0, **counters):
+        """Add to the counters."""
+        with self.lock:
+            self.stats["bytes_in"] += bytes_in
+            self.stats["bytes_out"] += bytes_out
+            for stat, value in counters.items():
+                self.stats[stat] += value
+
+    def snapshot(self):
+        """Return encoding counters and the size of the compressed body cache."""
+        with self.lock:
+            return {**self.stats, "cached_bodies": len(self.entries), "cached_bytes": self.size}
+
+compressed_bodies = CompressedBodies()
+
+def wants_msgpack():
+    """Whether the request's Accept header prefers MessagePack to JSON (JSON wins ties)."""
+    best = request.accept_mimetypes.best_match((JSON_MIMETYPE, *MSGPACK_MIMETYPES), default=JSON_MIMETYPE)
+    return best in MSGPACK_MIMETYPES
+
+def respond(payload, status=200):
+    """Return `payload` encoded as MessagePack or JSON, whichever the client asked for.
+
+    `payload` may also be JSON text already serialized (by SQLite, say),
+    which JSON clients get as is.
+    """
+    if wants_msgpack():
+        if isinstance(payload, str):
+            payload = json.loads(payload)
+        compressed_bodies.count(msgpack_encoded=1)
+        return Response(msgpack.packb(payload), status=status, mimetype=MSGPACK_MIMETYPE)
+    if isinstance(payload, str):
+        return Response(payload, status=status, mimetype=JSON_MIMETYPE)
+    response = jsonify(payload)
+    response.status_code = status
+    return response
+
+def records(columns, rows):
+    """Encode a list of rows, each a sequence of values in `columns` order.
+
+    JSON clients get a list of objects. MessagePack clients get one
+    {"columns": [...], "rows": [[...], ...]} table, so field names are
+    sent once per list rather than once per item.
+    """
+    if wants_msgpack():
+        return {"columns": list(columns), "rows": [list(row) for row in rows]}
+    return [dict(zip(columns, row)) for row in rows]
+
+def compress_response(response):
+    """gzip a large successful /api response if the client accepts gzip.
+
+    A compressed response's ETag becomes weak, since its bytes differ
+    from the identity encoding's; If-None-Match still matches it.
+    """
+    settings = ENCODING_SETTINGS
+    if (not settings["compress"] or response.status_code != 200 or response.is_streamed
+            or response.direct_passthrough or "Content-Encoding" in response.headers):
+        return response
+    response.vary.add("Accept-Encoding")
+    if "gzip" not in request.accept_encodings:
+        return response
+    body = response.get_data()
+    if len(body) < settings["compress_min_bytes"]:
+        return response
+
+    etag, weak = response.get_etag()
+    compressed = compressed_bodies.get(etag) if etag and not weak else None
+    if compressed is None:
+        compressed = gzip.compress(body, settings["compress_level"], mtime=0)
+        if etag and not weak:
+            compressed_bodies.put(etag, compressed)
+    compressed_bodies.count(compressed=1, bytes_in=len(body), bytes_out=len(compressed))
+
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = "gzip"
+    if etag:
+        response.set_etag(etag, weak=True)
+    return response
+
+def configure_encoding(**settings):
+    """Change compression settings; the compressed body cache starts over."""
+    unknown = set(settings) - set(ENCODING_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown response encoding settings: {', '.join(sorted(unknown))}")
+    ENCODING_SETTINGS.update(settings)
+    with compressed_bodies.lock:
+        compressed_bodies.entries.clear()
+        compressed_bodies.size = 0
+
+def encoding_stats():
+    """Return MessagePack and compression counters."""
+    return compressed_bodies.snapshot()
+
+def init_app(app):
+    """Mark /api responses as varying with Accept and compress the large ones."""
+    @app.after_request
+    def encode_api_response(response):
+        if not request.path.startswith("/api/"):
+            return response
+        response.vary.add("Accept")
+        return compress_response(response)
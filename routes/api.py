@@ -1,61 +1,101 @@
-from flask import Blueprint, jsonify, request
-import json
+from flask import Blueprint, request
 from db import get_connection
-import sqlite3
+from response_encoding import records, respond
+from response_cache import cached_response
+from read_path import read_only
+from tick import current_tick
+from player_resources import STARTING_RESOURCES, deduct_resources, grant_resources
+from player_cache import get_player
+from notifications import INBOX_PAGE_SIZE, MAX_INBOX_PAGE_SIZE, MAX_LONG_POLL, read_inbox, wait_for_inbox
+from rates import CANDLE_COLUMNS, MAX_CANDLES, candle_history, pick_resolution, rolling_rate, rolling_rates
+from settlement import CANDLE_RESOLUTIONS
+from batch import batch_response, next_ids, read_batch
+import json
+import math
 
 api_blueprint = Blueprint('api', __name__)
 
+# Alliance members returned per page by default, and at most
+MEMBER_PAGE_SIZE = 100
+MAX_MEMBER_PAGE_SIZE = 1000
+
+# Alliances returned per leaderboard page by default, at most, and the deepest offset served
+LEADERBOARD_SIZE = 50
+MAX_LEADERBOARD_SIZE = 500
+MAX_LEADERBOARD_OFFSET = 10000
+
 # Player APIs
 @api_blueprint.route("/api/player/create", methods=["POST"])
 def create_player():
     data = request.json
     name = data["name"]
-    resources = {"energy": 50, "materials": 100}
 
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("""
         INSERT INTO players (name, resources)
-        VALUES (?, ?)
-    """, (name, json.dumps(resources)))
+        VALUES (?, '{}')
+    """, (name,))
+    grant_resources(cursor, cursor.lastrowid, STARTING_RESOURCES)
     conn.commit()
     conn.close()
 
-    return jsonify({"message": "Player created successfully!"})
+    return respond({"message": "Player created successfully!"})
+
+@api_blueprint.route("/api/player/create_batch", methods=["POST"])
+def create_players():
+    """Create a list of players, each with the starting resources, in one transaction."""
+    try:
+        items = read_batch(request.json, "players")
+    except ValueError as error:
+        return respond({"error": str(error)}), 400
+
+    results = [None] * len(items)
+    accepted = []
+    for index, item in enumerate(items):
+        name = item.get("name")
+        if isinstance(name, str) and name:
+            accepted.append((index, name))
+        else:
+            results[index] = {"index": index, "ok": False, "error": "name is required."}
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        ids = next_ids(cursor, "players", len(accepted))
+        cursor.executemany("""
+            INSERT INTO players (id, name, resources)
+            VALUES (?, ?, '{}')
+        """, [(player_id, name) for player_id, (_, name) in zip(ids, accepted)])
+        cursor.executemany("""
+            INSERT INTO player_resources (player_id, resource, amount)
+            VALUES (?, ?, ?)
+        """, [(player_id, resource, amount) for player_id in ids for resource, amount in STARTING_RESOURCES.items()])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    for player_id, (index, _) in zip(ids, accepted):
+        results[index] = {"index": index, "ok": True, "id": player_id}
+    return respond(batch_response(results))
 
 @api_blueprint.route("/api/player/<int:player_id>", methods=["GET"])
+@read_only
 def get_player_state(player_id):
     """Fetch player state by ID."""
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.row_factory = sqlite3.Row  # Ensures rows are returned as sqlite3.Row objects
-
-    player = cursor.execute("SELECT * FROM players WHERE id = ?", (player_id,)).fetchone()
+    player = get_player(conn.cursor(), player_id)
     conn.close()
 
     if player:
-        # Convert to a dictionary for modification
-        player_dict = dict(player)
-        player_dict["resources"] = json.loads(player_dict["resources"])
-        return jsonify(player_dict)
-
-    return jsonify({"error": "Player not found"}), 404
+        return respond(player)
+    return respond({"error": "Player not found"}), 404
 
 # Task APIs
-@api_blueprint.route("/api/tasks/<int:player_id>", methods=["GET"])
-def get_tasks(player_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    player = cursor.execute("SELECT * FROM players WHERE id = ?", (player_id,)).fetchone()
-
-    tasks = [
-        {"name": "Gather Energy", "required_traits": ["High Efficiency"], "reward": {"energy": 10}},
-        {"name": "Build Storage", "required_traits": ["Structural Stability"], "reward": {"materials": 20}},
-    ]
-
-    conn.close()
-    return jsonify({"tasks": tasks})
-
 @api_blueprint.route("/api/task/assign", methods=["POST"])
 def assign_task():
     data = request.json
@@ -66,15 +106,14 @@ def assign_task():
     cursor = conn.cursor()
 
     # Deduct resources or check traits (logic can be added here)
-    cursor.execute("""
-        UPDATE players
-        SET resources = JSON_SET(resources, '$.energy', JSON_EXTRACT(resources, '$.energy') - 10)
-        WHERE id = ?
-    """, (player_id,))
+    if not deduct_resources(cursor, player_id, {"energy": 10}):
+        conn.rollback()
+        conn.close()
+        return respond({"error": "Insufficient resources for this task."}), 400
 
     conn.commit()
     conn.close()
-    return jsonify({"message": f"Task {task_name} assigned successfully!"})
+    return respond({"message": f"Task {task_name} assigned successfully!"})
 
 # Currency APIs
 @api_blueprint.route("/api/currency/create_planetary", methods=["POST"])
@@ -92,7 +131,7 @@ def create_planetary_currency():
     conn.commit()
     conn.close()
 
-    return jsonify({"message": f"{currency_name} created successfully."})
+    return respond({"message": f"{currency_name} created successfully."})
 
 @api_blueprint.route("/api/currency/buy", methods=["POST"])
 def buy_currency():
@@ -107,51 +146,152 @@ def buy_currency():
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("""
-        INSERT INTO currency_exchange (buyer_id, seller_id, currency_from_id, currency_to_id, amount, rate, ticks_remaining)
-        VALUES (?, ?, ?, ?, ?, ?, 5) -- Delay of 5 ticks
-    """, (buyer_id, seller_id, currency_from_id, currency_to_id, amount, rate))
+        INSERT INTO currency_exchange (buyer_id, seller_id, currency_from_id, currency_to_id, amount, rate, ticks_remaining, due_tick)
+        VALUES (?, ?, ?, ?, ?, ?, 5, ?) -- Delay of 5 ticks
+    """, (buyer_id, seller_id, currency_from_id, currency_to_id, amount, rate, current_tick(cursor) + 5))
     conn.commit()
     conn.close()
 
-    return jsonify({"message": "Currency exchange transaction initiated. It will complete in 5 ticks."})
+    return respond({"message": "Currency exchange transaction initiated. It will complete in 5 ticks."})
+
+@api_blueprint.route("/api/currency/buy_batch", methods=["POST"])
+def buy_currency_batch():
+    """Initiate a list of currency exchanges in one transaction; each settles in 5 ticks."""
+    try:
+        items = read_batch(request.json, "exchanges")
+    except ValueError as error:
+        return respond({"error": str(error)}), 400
+
+    results = [None] * len(items)
+    accepted = []
+    for index, item in enumerate(items):
+        try:
+            row = (
+                int(item["buyer_id"]), int(item["seller_id"]),
+                int(item["currency_from_id"]), int(item["currency_to_id"]),
+                float(item["amount"]), float(item["rate"]),
+            )
+            amount, rate = row[4], row[5]
+            if not (math.isfinite(amount) and amount > 0 and math.isfinite(rate) and rate > 0):
+                raise ValueError
+        except (KeyError, TypeError, ValueError):
+            results[index] = {"index": index, "ok": False, "error": "buyer_id, seller_id, currency_from_id, currency_to_id, amount and rate are required; amount and rate must be positive and finite."}
+            continue
+        accepted.append((index, row))
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        due_tick = current_tick(cursor) + 5
+        ids = next_ids(cursor, "currency_exchange", len(accepted))
+        cursor.executemany("""
+            INSERT INTO currency_exchange (id, buyer_id, seller_id, currency_from_id, currency_to_id, amount, rate, ticks_remaining, due_tick)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 5, ?) -- Delay of 5 ticks
+        """, [(exchange_id, *row, due_tick) for exchange_id, (_, row) in zip(ids, accepted)])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    for exchange_id, (index, _) in zip(ids, accepted):
+        results[index] = {"index": index, "ok": True, "id": exchange_id, "due_tick": due_tick}
+    return respond(batch_response(results))
 
 @api_blueprint.route("/api/currency/exchange_rates", methods=["GET"])
+@read_only
 def get_exchange_rates():
+    """List the currencies' reference rates and the rolling rates of recently traded pairs."""
     conn = get_connection()
     cursor = conn.cursor()
     rates = cursor.execute("""
         SELECT id, name, exchange_rate FROM currencies
     """).fetchall()
+    markets = rolling_rates(cursor)
     conn.close()
 
-    return jsonify({"rates": rates})
+    return respond({"rates": [dict(rate) for rate in rates], "markets": markets})
 
-@api_blueprint.route("/api/currency/notify", methods=["GET"])
-def notify_transactions():
+@api_blueprint.route("/api/currency/rate/<int:base_currency_id>/<int:quote_currency_id>", methods=["GET"])
+@read_only
+def get_pair_rate(base_currency_id, quote_currency_id):
+    """Rolling OHLC and VWAP of a pair over the last RATE_WINDOW ticks."""
+    conn = get_connection()
+    rate = rolling_rate(conn.cursor(), base_currency_id, quote_currency_id)
+    conn.close()
+    return respond(rate)
+
+@api_blueprint.route("/api/currency/history/<int:base_currency_id>/<int:quote_currency_id>", methods=["GET"])
+@read_only
+def get_pair_history(base_currency_id, quote_currency_id):
+    """Candles of a pair (?from_tick=&to_tick=&resolution=), read from exchange_candles only."""
     conn = get_connection()
     cursor = conn.cursor()
+    to_tick = request.args.get("to_tick", current_tick(cursor), type=int)
+    from_tick = request.args.get("from_tick", max(to_tick - MAX_CANDLES, 0), type=int)
+    resolution = request.args.get("resolution", pick_resolution(from_tick, to_tick), type=int)
 
-    notifications = cursor.execute("""
-        SELECT * FROM currency_exchange
-        WHERE ticks_remaining = 0
-    """).fetchall()
+    if resolution not in CANDLE_RESOLUTIONS or from_tick > to_tick:
+        conn.close()
+        return respond({"error": f"resolution must be one of {list(CANDLE_RESOLUTIONS)} and from_tick <= to_tick."}), 400
 
+    candles = candle_history(cursor, base_currency_id, quote_currency_id, from_tick, to_tick, resolution)
     conn.close()
-    return jsonify({"notifications": notifications})
+    return respond({
+        "base_currency_id": base_currency_id,
+        "quote_currency_id": quote_currency_id,
+        "resolution": resolution,
+        "candles": records(CANDLE_COLUMNS, candles)
+    })
+
+@api_blueprint.route("/api/currency/notify", methods=["GET"])
+def notify_transactions():
+    """Page through a player's inbox (?player_id=&after=&limit=), optionally long-polling (&wait=seconds)."""
+    player_id = request.args.get("player_id", type=int)
+    if player_id is None:
+        return respond({"error": "player_id is required."}), 400
+    after = request.args.get("after", 0, type=int)
+    limit = min(max(request.args.get("limit", INBOX_PAGE_SIZE, type=int), 1), MAX_INBOX_PAGE_SIZE)
+    wait = request.args.get("wait", 0, type=float)
+    if not math.isfinite(wait):
+        return respond({"error": "wait must be a finite number of seconds."}), 400
+    wait = min(max(wait, 0), MAX_LONG_POLL)
+
+    if wait:
+        notifications = wait_for_inbox(player_id, after, limit, wait)
+    else:
+        conn = get_connection()
+        notifications = read_inbox(conn.cursor(), player_id, after, limit)
+        conn.close()
+
+    # The cursor only advances past what was returned
+    next_after = notifications[-1]["id"] if notifications else after
+    return respond({"notifications": notifications, "next_after": next_after})
 
 @api_blueprint.route("/api/currency/clear_notifications", methods=["POST"])
 def clear_notifications():
-    player_id = request.json["player_id"]
+    """Delete a player's notifications, up to and including id `up_to` if given."""
+    data = request.json
+    player_id = data["player_id"]
+    up_to = data.get("up_to")
+
     conn = get_connection()
     cursor = conn.cursor()
-
-    cursor.execute("""
-        DELETE FROM notifications WHERE player_id = ?
-    """, (player_id,))
+    if up_to is None:
+        cursor.execute("""
+            DELETE FROM notifications WHERE player_id = ?
+        """, (player_id,))
+    else:
+        cursor.execute("""
+            DELETE FROM notifications WHERE player_id = ? AND id <= ?
+        """, (player_id, up_to))
+    cleared = cursor.rowcount
     conn.commit()
     conn.close()
 
-    return jsonify({"message": "Notifications cleared."})
+    return respond({"message": "Notifications cleared.", "cleared": cleared})
 
 # Alliance APIs
 @api_blueprint.route("/api/alliance/create", methods=["POST"])
@@ -176,15 +316,94 @@ def create_alliance():
 
     conn.commit()
     conn.close()
-    return jsonify({"message": "Alliance created successfully.", "alliance_id": alliance_id})
+    return respond({"message": "Alliance created successfully.", "alliance_id": alliance_id})
 
 @api_blueprint.route("/api/alliance/members/<int:alliance_id>", methods=["GET"])
+@read_only
+@cached_response("alliance_members")
 def get_alliance_members(alliance_id):
+    """Page through an alliance's members (?after_id=&limit=) in join order."""
+    after_id = request.args.get("after_id", 0, type=int)
+    limit = min(max(request.args.get("limit", MEMBER_PAGE_SIZE, type=int), 1), MAX_MEMBER_PAGE_SIZE)
+
     conn = get_connection()
     cursor = conn.cursor()
     members = cursor.execute("""
-        SELECT player_id, role FROM alliance_members WHERE alliance_id = ?
+        SELECT id, player_id, role FROM alliance_members
+        WHERE alliance_id = ? AND id > ?
+        ORDER BY id
+        LIMIT ?
+    """, (alliance_id, after_id, limit + 1)).fetchall()
+    member_count = cursor.execute("""
+        SELECT member_count FROM alliance_stats WHERE alliance_id = ?
+    """, (alliance_id,)).fetchone()
+    conn.close()
+
+    next_after_id = members[limit - 1]["id"] if len(members) > limit else None
+    return respond({
+        "members": records(("player_id", "role"), (member[1:] for member in members[:limit])),
+        "member_count": member_count[0] if member_count else 0,
+        "next_after_id": next_after_id,
+    })
+
+@api_blueprint.route("/api/alliance/<int:alliance_id>/stats", methods=["GET"])
+@read_only
+def get_alliance_stats(alliance_id):
+    """Return an alliance's member count and resource totals from the aggregates."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    stats = cursor.execute("""
+        SELECT a.name, s.member_count, s.total_resources
+        FROM alliance_stats s JOIN alliances a ON a.id = s.alliance_id
+        WHERE s.alliance_id = ?
+    """, (alliance_id,)).fetchone()
+    if not stats:
+        conn.close()
+        return respond({"error": "Alliance not found"}), 404
+    resources = cursor.execute("""
+        SELECT resource, amount FROM alliance_resources WHERE alliance_id = ?
     """, (alliance_id,)).fetchall()
     conn.close()
 
-    return jsonify({"members": members})
+    return respond({
+        "alliance_id": alliance_id,
+        **dict(stats),
+        "resources": {row["resource"]: row["amount"] for row in resources},
+    })
+
+@api_blueprint.route("/api/alliance/leaderboard", methods=["GET"])
+@read_only
+def get_alliance_leaderboard():
+    """Rank alliances (?by=total_resources|members|<resource>&limit=&offset=) from the aggregates."""
+    by = request.args.get("by", "total_resources")
+    limit = min(max(request.args.get("limit", LEADERBOARD_SIZE, type=int), 1), MAX_LEADERBOARD_SIZE)
+    offset = min(max(request.args.get("offset", 0, type=int), 0), MAX_LEADERBOARD_OFFSET)
+
+    # Each ranking reads the top of its own index
+    if by == "total_resources":
+        ranking = "SELECT alliance_id, total_resources AS score FROM alliance_stats ORDER BY total_resources DESC, alliance_id"
+        params = ()
+    elif by == "members":
+        ranking = "SELECT alliance_id, member_count AS score FROM alliance_stats ORDER BY member_count DESC, alliance_id"
+        params = ()
+    else:
+        ranking = "SELECT alliance_id, amount AS score FROM alliance_resources WHERE resource = ? ORDER BY amount DESC, alliance_id"
+        params = (by,)
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    rows = cursor.execute(f"""
+        SELECT r.alliance_id, a.name, r.score
+        FROM ({ranking} LIMIT ? OFFSET ?) r
+        JOIN alliances a ON a.id = r.alliance_id
+        ORDER BY r.score DESC, r.alliance_id
+    """, (*params, limit, offset)).fetchall()
+    conn.close()
+
+    return respond({
+        "by": by,
+        "leaderboard": records(
+            ("rank", "alliance_id", "name", "score"),
+            ((offset + index + 1, *row) for index, row in enumerate(rows))
+        ),
+    })
@@ -1,9 +1,18 @@
-from flask import Blueprint, request, jsonify, session
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Blueprint, request, session
+import sqlite3
 from db import get_connection
+from response_encoding import respond
+from password_hashing import HashingBusy, hash_password, verify_password
+from users import find_user, user_cache
 
 auth_blueprint = Blueprint('auth', __name__)
 
+def busy_response():
+    """Tell the client the hashing queue is full and to retry shortly."""
+    response = respond({"error": "Authentication is busy, please retry."}, 503)
+    response.headers["Retry-After"] = "1"
+    return response
+
 # User Registration
 @auth_blueprint.route('/api/auth/register', methods=['POST'])
 def register_user():
@@ -12,31 +21,39 @@ def register_user():
     password = data.get('password')
 
     if not username or not password:
-        return jsonify({"error": "Username and password are required."}), 400
-
-    hashed_password = generate_password_hash(password)
+        return respond({"error": "Username and password are required."}), 400
 
+    # Check if username already exists before paying for a hash
     conn = get_connection()
-    cursor = conn.cursor()
-
-    # Check if username already exists
-    existing_user = cursor.execute("""
-        SELECT * FROM users WHERE username = ?
-    """, (username,)).fetchone()
+    existing_user = find_user(conn.cursor(), username)
+    conn.close()
 
     if existing_user:
+        return respond({"error": "Username already exists."}), 409
+
+    # Hash in the hashing pool, without holding a database connection
+    try:
+        hashed_password = hash_password(password)
+    except HashingBusy:
+        return busy_response()
+
+    # Insert new user; the unique username still guards against a concurrent registration
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            INSERT INTO users (username, password_hash)
+            VALUES (?, ?)
+        """, (username, hashed_password))
+        conn.commit()
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        return respond({"error": "Username already exists."}), 409
+    finally:
         conn.close()
-        return jsonify({"error": "Username already exists."}), 409
-
-    # Insert new user
-    cursor.execute("""
-        INSERT INTO users (username, password)
-        VALUES (?, ?)
-    """, (username, hashed_password))
-    conn.commit()
-    conn.close()
+        user_cache.invalidate(username)
 
-    return jsonify({"message": "User registered successfully!"}), 201
+    return respond({"message": "User registered successfully!"}), 201
 
 # User Login
 @auth_blueprint.route('/api/auth/login', methods=['POST'])
@@ -46,35 +63,36 @@ def login_user():
     password = data.get('password')
 
     if not username or not password:
-        return jsonify({"error": "Username and password are required."}), 400
+        return respond({"error": "Username and password are required."}), 400
 
+    # Fetch user from the lookup cache or the database
     conn = get_connection()
-    cursor = conn.cursor()
-
-    # Fetch user from the database
-    user = cursor.execute("""
-        SELECT * FROM users WHERE username = ?
-    """, (username,)).fetchone()
-
+    user = find_user(conn.cursor(), username)
     conn.close()
 
-    if user and check_password_hash(user["password"], password):
-        # Set session
-        session['user_id'] = user['id']
-        return jsonify({"message": "Login successful!"}), 200
+    if user:
+        user_id, password_hash = user
+        try:
+            valid = verify_password(password_hash, password)
+        except HashingBusy:
+            return busy_response()
+        if valid:
+            # Set session
+            session['user_id'] = user_id
+            return respond({"message": "Login successful!"}), 200
 
-    return jsonify({"error": "Invalid username or password."}), 401
+    return respond({"error": "Invalid username or password."}), 401
 
 # User Logout
 @auth_blueprint.route('/api/auth/logout', methods=['POST'])
 def logout_user():
     session.clear()
-    return jsonify({"message": "Logout successful!"}), 200
+    return respond({"message": "Logout successful!"}), 200
 
 # Check Current Session
 @auth_blueprint.route('/api/auth/session', methods=['GET'])
 def check_session():
     user_id = session.get('user_id')
     if user_id:
-        return jsonify({"user_id": user_id}), 200
-    return jsonify({"error": "No active session."}), 401
+        return respond({"user_id": user_id}), 200
+    return respond({"error": "No active session."}), 401
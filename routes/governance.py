@@ -0,0 +1,114 @@
+import json
+
+from flask import Blueprint, request
+from db import get_connection
+from response_encoding import respond
+from read_path import read_only
+from legislation import MAX_VOTING_TICKS, VOTING_TICKS, cast_vote, is_member, propose
+from tick import current_tick
+
+governance_blueprint = Blueprint('governance', __name__)
+
+# Form a government for an alliance
+@governance_blueprint.route('/api/government/create', methods=['POST'])
+def create_government():
+    """Create a government (type and JSON constitution) for an existing alliance."""
+    data = request.json
+    alliance_id = data.get("alliance_id")
+    government_type = data.get("type")
+    if not alliance_id or not government_type:
+        return respond({"error": "alliance_id and type are required."}), 400
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    if not cursor.execute("SELECT 1 FROM alliances WHERE id = ?", (alliance_id,)).fetchone():
+        conn.close()
+        return respond({"error": "Alliance not found."}), 404
+    cursor.execute("""
+        INSERT INTO governments (alliance_id, type, constitution)
+        VALUES (?, ?, ?)
+    """, (alliance_id, government_type, json.dumps(data.get("constitution", {}))))
+    government_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return respond({"message": "Government created.", "government_id": government_id})
+
+# Put legislation to a vote
+@governance_blueprint.route('/api/legislation/propose', methods=['POST'])
+def propose_legislation():
+    """Open legislation for votes by the government's alliance; it resolves on the tick at its deadline."""
+    data = request.json
+    government_id = data.get("government_id")
+    player_id = data.get("player_id")
+    title = data.get("title")
+    if not government_id or not player_id or not title:
+        return respond({"error": "government_id, player_id and title are required."}), 400
+    voting_ticks = data.get("voting_ticks", VOTING_TICKS)
+    if not isinstance(voting_ticks, int) or not 1 <= voting_ticks <= MAX_VOTING_TICKS:
+        return respond({"error": f"voting_ticks must be between 1 and {MAX_VOTING_TICKS}."}), 400
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    if not is_member(cursor, government_id, player_id):
+        conn.close()
+        return respond({"error": "Only members of the government's alliance can propose legislation."}), 403
+    deadline_tick = current_tick(cursor) + voting_ticks
+    legislation_id = propose(cursor, government_id, player_id, title, data.get("description", ""), deadline_tick)
+    conn.commit()
+    conn.close()
+    return respond({"legislation_id": legislation_id, "deadline_tick": deadline_tick})
+
+# Cast or change a vote
+@governance_blueprint.route('/api/legislation/<int:legislation_id>/vote', methods=['POST'])
+def vote_on_legislation(legislation_id):
+    """Record the player's yes/no vote, replacing any earlier one, and return the tallies."""
+    data = request.json
+    player_id = data.get("player_id")
+    vote = data.get("vote")
+    if not player_id or vote not in ("yes", "no"):
+        return respond({"error": "player_id and a vote of 'yes' or 'no' are required."}), 400
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        # Hold the write lock so the vote cannot land after the tick resolves the item
+        cursor.execute("BEGIN IMMEDIATE")
+        legislation = cursor.execute("""
+            SELECT government_id, status, deadline_tick FROM legislation WHERE id = ?
+        """, (legislation_id,)).fetchone()
+        if not legislation:
+            conn.rollback()
+            return respond({"error": "Legislation not found."}), 404
+        if legislation["status"] != "proposed" or legislation["deadline_tick"] <= current_tick(cursor):
+            conn.rollback()
+            return respond({"error": "Voting on this legislation has closed."}), 409
+        if not is_member(cursor, legislation["government_id"], player_id):
+            conn.rollback()
+            return respond({"error": "Only members of the government's alliance can vote."}), 403
+        tallies = cast_vote(cursor, legislation_id, player_id, vote)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    return respond({"legislation_id": legislation_id, "vote": vote, **dict(tallies)})
+
+# Show legislation with its running tallies
+@governance_blueprint.route('/api/legislation/<int:legislation_id>', methods=['GET'])
+@read_only
+def get_legislation(legislation_id):
+    """Return a legislation item, its status and vote counters."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    legislation = cursor.execute("""
+        SELECT id, government_id, proposer_id, title, description, status,
+               deadline_tick, resolved_tick, yes_votes, no_votes
+        FROM legislation WHERE id = ?
+    """, (legislation_id,)).fetchone()
+    conn.close()
+
+    if not legislation:
+        return respond({"error": "Legislation not found."}), 404
+    return respond(dict(legislation))
@@ -1,25 +1,195 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, request
+import json
+import math
 from db import get_connection
+from response_encoding import records, respond, wants_msgpack
+from batch import batch_response, finite_float, next_ids, read_batch
+from response_cache import cached_response
+from read_path import read_only
 
 map_blueprint = Blueprint('map', __name__)
 
-# Fetch all celestial bodies for the galactic map
+# Side length of the square galaxy; tile (z, x, y) covers MAP_SIZE / 2**z units
+MAP_SIZE = 65536.0
+
+# Deepest zoom level accepted by the viewport and tile endpoints
+MAX_ZOOM = 30
+
+# Most bodies returned by one map query; denser viewports are aggregated
+MAP_RESULT_CAP = 2000
+
+# Cells per side of the level-of-detail grid used for dense viewports
+LOD_GRID = 32
+
+# Each body is serialized to JSON inside SQLite from its stored resources
+# text, so reads never parse resources in Python
+BODY_JSON = """
+    json_object(
+        'id', b.id,
+        'name', b.name,
+        'type', b.type,
+        'x', b.x,
+        'y', b.y,
+        'explored', json(CASE WHEN b.explored THEN 'true' ELSE 'false' END),
+        'resources', json(COALESCE(b.resources, '{}'))
+    )
+"""
+
+# The same fields as plain columns, for fixed-schema (MessagePack) responses
+BODY_COLUMNS = ("id", "name", "type", "x", "y", "explored", "resources")
+BODY_ROW = "b.id, b.name, b.type, b.x, b.y, b.explored, COALESCE(b.resources, '{}')"
+
+# Per-cell aggregates of a dense viewport, as JSON and as plain columns
+CLUSTER_JSON = """
+    json_object(
+        'cell_x', CAST(b.x / :cell AS INTEGER),
+        'cell_y', CAST(b.y / :cell AS INTEGER),
+        'count', COUNT(*),
+        'explored', SUM(b.explored),
+        'x', AVG(b.x),
+        'y', AVG(b.y)
+    )
+"""
+CLUSTER_COLUMNS = ("cell_x", "cell_y", "count", "explored", "x", "y")
+CLUSTER_ROW = "CAST(b.x / :cell AS INTEGER), CAST(b.y / :cell AS INTEGER), COUNT(*), SUM(b.explored), AVG(b.x), AVG(b.y)"
+
+def body_records(rows):
+    """Encode BODY_ROW rows with records(), parsing all their resources in one json.loads call."""
+    resources = json.loads(f"[{','.join(row[6] for row in rows)}]")
+    return records(BODY_COLUMNS, ((*row[:5], bool(row[5]), parsed) for row, parsed in zip(rows, resources)))
+
+def normalize_resources(resources):
+    """Validate a resources mapping once at write time and return compact JSON."""
+    if not isinstance(resources, dict) or not all(
+        isinstance(amount, (int, float)) and not isinstance(amount, bool) and math.isfinite(amount)
+        for amount in resources.values()
+    ):
+        raise ValueError("Resources must map resource names to finite numbers.")
+    return json.dumps(resources, separators=(",", ":"), sort_keys=True)
+
+def parse_bbox(value):
+    """Parse a "min_x,min_y,max_x,max_y" query parameter."""
+    parts = value.split(",")
+    if len(parts) != 4:
+        raise ValueError("bbox must be min_x,min_y,max_x,max_y.")
+    min_x, min_y, max_x, max_y = (float(part) for part in parts)
+    if not all(math.isfinite(bound) for bound in (min_x, min_y, max_x, max_y)):
+        raise ValueError("Bounding box coordinates must be finite numbers.")
+    if min_x > max_x or min_y > max_y:
+        raise ValueError("Bounding box minimums must not exceed maximums.")
+    return min_x, min_y, max_x, max_y
+
+def query_viewport(cursor, bbox, cell_size):
+    """Return the bodies in `bbox`, or a level-of-detail aggregate if too dense.
+
+    Bodies are found through the R*Tree. If more than MAP_RESULT_CAP fall
+    inside the box, bodies are grouped into square cells of `cell_size`
+    and only per-cell counts and centroids are returned. JSON clients get
+    text serialized by SQLite; MessagePack clients get fixed-schema tables.
+    """
+    binary = wants_msgpack()
+    min_x, min_y, max_x, max_y = bbox
+    params = {"min_x": min_x, "min_y": min_y, "max_x": max_x, "max_y": max_y}
+    viewport = """
+        FROM celestial_bodies_rtree r
+        JOIN celestial_bodies b ON b.id = r.id
+        WHERE r.min_x <= :max_x AND r.max_x >= :min_x
+          AND r.min_y <= :max_y AND r.max_y >= :min_y
+    """
+
+    bodies = cursor.execute(f"""
+        SELECT {BODY_ROW if binary else BODY_JSON} {viewport}
+        ORDER BY b.id
+        LIMIT :limit
+    """, {**params, "limit": MAP_RESULT_CAP + 1}).fetchall()
+
+    bbox_json = json.dumps(list(bbox))
+    if len(bodies) <= MAP_RESULT_CAP:
+        if binary:
+            return {"bbox": list(bbox), "aggregated": False,
+                    "celestial_bodies": body_records(bodies)}
+        items = ",".join(row[0] for row in bodies)
+        return f'{{"bbox":{bbox_json},"aggregated":false,"celestial_bodies":[{items}]}}'
+
+    clusters = cursor.execute(f"""
+        SELECT {CLUSTER_ROW if binary else CLUSTER_JSON}
+        {viewport}
+        GROUP BY CAST(b.x / :cell AS INTEGER), CAST(b.y / :cell AS INTEGER)
+    """, {**params, "cell": cell_size}).fetchall()
+    if binary:
+        return {"bbox": list(bbox), "aggregated": True, "cell_size": cell_size,
+                "clusters": records(CLUSTER_COLUMNS, clusters)}
+    items = ",".join(row[0] for row in clusters)
+    return f'{{"bbox":{bbox_json},"aggregated":true,"cell_size":{json.dumps(cell_size)},"clusters":[{items}]}}'
+
+# Fetch celestial bodies for the galactic map
 @map_blueprint.route('/api/map', methods=['GET'])
+@read_only
+@cached_response("celestial_bodies")
 def get_celestial_bodies():
-    """Fetch all celestial bodies for the galactic map."""
+    """Fetch celestial bodies in a viewport (?bbox=min_x,min_y,max_x,max_y&zoom=z), or page through all of them."""
     conn = get_connection()
     cursor = conn.cursor()
-    celestial_bodies = cursor.execute("""
-        SELECT id, name, type, resources, explored
-        FROM celestial_bodies
-    """).fetchall()
+
+    if "bbox" in request.args:
+        try:
+            bbox = parse_bbox(request.args["bbox"])
+            zoom = request.args.get("zoom", type=int)
+            if zoom is not None and not 0 <= zoom <= MAX_ZOOM:
+                raise ValueError(f"zoom must be between 0 and {MAX_ZOOM}.")
+        except ValueError as error:
+            conn.close()
+            return respond({"error": str(error)}), 400
+
+        # Cell size follows the zoom level when given, otherwise the viewport width
+        if zoom is not None:
+            cell_size = MAP_SIZE / 2 ** zoom / LOD_GRID
+        else:
+            cell_size = max(bbox[2] - bbox[0], bbox[3] - bbox[1]) / LOD_GRID or 1.0
+        body = query_viewport(cursor, bbox, cell_size)
+        conn.close()
+        return respond(body)
+
+    # Without a viewport, page through bodies by id
+    after_id = request.args.get("after_id", 0, type=int)
+    binary = wants_msgpack()
+    bodies = cursor.execute(f"""
+        SELECT b.id, {BODY_ROW if binary else BODY_JSON}
+        FROM celestial_bodies b
+        WHERE b.id > ?
+        ORDER BY b.id
+        LIMIT ?
+    """, (after_id, MAP_RESULT_CAP + 1)).fetchall()
     conn.close()
 
-    # Format the resources field as JSON
-    for body in celestial_bodies:
-        body['resources'] = json.loads(body['resources'])
+    next_after_id = bodies[MAP_RESULT_CAP - 1][0] if len(bodies) > MAP_RESULT_CAP else None
+    if binary:
+        return respond({
+            "celestial_bodies": body_records([row[1:] for row in bodies[:MAP_RESULT_CAP]]),
+            "next_after_id": next_after_id,
+        })
+    items = ",".join(row[1] for row in bodies[:MAP_RESULT_CAP])
+    return respond(f'{{"celestial_bodies":[{items}],"next_after_id":{json.dumps(next_after_id)}}}')
+
+# Fetch one map tile
+@map_blueprint.route('/api/map/tiles/<int:zoom>/<int:tile_x>/<int:tile_y>', methods=['GET'])
+@read_only
+@cached_response("celestial_bodies")
+def get_map_tile(zoom, tile_x, tile_y):
+    """Fetch the bodies (or their aggregate, if dense) inside one map tile."""
+    if zoom > MAX_ZOOM:
+        return respond({"error": f"zoom must be between 0 and {MAX_ZOOM}."}), 400
+    tile_size = MAP_SIZE / 2 ** zoom
+    if not (0 <= tile_x < 2 ** zoom and 0 <= tile_y < 2 ** zoom):
+        return respond({"error": "Tile out of range."}), 404
 
-    return jsonify({"celestial_bodies": celestial_bodies})
+    bbox = (tile_x * tile_size, tile_y * tile_size, (tile_x + 1) * tile_size, (tile_y + 1) * tile_size)
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    body = query_viewport(cursor, bbox, tile_size / LOD_GRID)
+    conn.close()
+    return respond(body)
 
 # Mark a celestial body as explored
 @map_blueprint.route('/api/map/explore', methods=['POST'])
@@ -38,7 +208,7 @@ def explore_celestial_body():
 
     if not body:
         conn.close()
-        return jsonify({"error": "Celestial body not found."}), 404
+        return respond({"error": "Celestial body not found."}), 404
 
     # Mark the celestial body as explored
     cursor.execute("""
@@ -49,7 +219,7 @@ def explore_celestial_body():
     conn.commit()
     conn.close()
 
-    return jsonify({"message": f"{body['name']} has been explored!"})
+    return respond({"message": f"{body['name']} has been explored!"})
 
 # Add a new celestial body
 @map_blueprint.route('/api/map/add', methods=['POST'])
@@ -58,33 +228,102 @@ def add_celestial_body():
     data = request.json
     name = data.get('name')
     body_type = data.get('type')
-    resources = json.dumps(data.get('resources', {}))
     explored = data.get('explored', False)
 
+    # Resources are validated and serialized once, here, rather than on every read
+    try:
+        resources = normalize_resources(data.get('resources', {}))
+        x = finite_float(data.get('x', 0))
+        y = finite_float(data.get('y', 0))
+    except (TypeError, ValueError) as error:
+        return respond({"error": str(error)}), 400
+
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("""
-        INSERT INTO celestial_bodies (name, type, resources, explored)
-        VALUES (?, ?, ?, ?)
-    """, (name, body_type, resources, explored))
+        INSERT INTO celestial_bodies (name, type, resources, explored, x, y)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (name, body_type, resources, explored, x, y))
     conn.commit()
     conn.close()
 
-    return jsonify({"message": f"Celestial body '{name}' added successfully!"})
+    return respond({"message": f"Celestial body '{name}' added successfully!"})
+
+# Add many celestial bodies at once
+@map_blueprint.route('/api/map/add_batch', methods=['POST'])
+def add_celestial_bodies():
+    """Validate and insert a list of bodies in one transaction, reporting per item."""
+    try:
+        items = read_batch(request.json, "bodies")
+    except ValueError as error:
+        return respond({"error": str(error)}), 400
+
+    # Validate every item up front
+    results = [None] * len(items)
+    rows = []
+    seen = set()
+    for index, item in enumerate(items):
+        name = item.get('name')
+        body_type = item.get('type')
+        try:
+            if not isinstance(name, str) or not name or not isinstance(body_type, str) or not body_type:
+                raise ValueError("name and type are required.")
+            if name in seen:
+                raise ValueError("Duplicate name in batch.")
+            resources = normalize_resources(item.get('resources', {}))
+            row = (name, body_type, resources, bool(item.get('explored', False)), finite_float(item.get('x', 0)), finite_float(item.get('y', 0)))
+        except (TypeError, ValueError) as error:
+            results[index] = {"index": index, "ok": False, "error": str(error)}
+            continue
+        seen.add(name)
+        rows.append((index, row))
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+
+        # Names must be unique; check them all with one query under the write lock
+        taken = {row[0] for row in cursor.execute("""
+            SELECT name FROM celestial_bodies WHERE name IN (SELECT value FROM json_each(?))
+        """, (json.dumps([row[0] for _, row in rows]),))}
+        accepted = []
+        for index, row in rows:
+            if row[0] in taken:
+                results[index] = {"index": index, "ok": False, "error": "Name already exists."}
+            else:
+                accepted.append((index, row))
+
+        ids = next_ids(cursor, "celestial_bodies", len(accepted))
+        cursor.executemany("""
+            INSERT INTO celestial_bodies (id, name, type, resources, explored, x, y)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(body_id, *row) for body_id, (_, row) in zip(ids, accepted)])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    for body_id, (index, _) in zip(ids, accepted):
+        results[index] = {"index": index, "ok": True, "id": body_id}
+    return respond(batch_response(results))
 
 # Fetch details of a specific celestial body
 @map_blueprint.route('/api/map/body/<int:body_id>', methods=['GET'])
+@read_only
+@cached_response("celestial_bodies")
 def get_celestial_body_details(body_id):
     """Fetch detailed information about a specific celestial body."""
     conn = get_connection()
     cursor = conn.cursor()
-    body = cursor.execute("""
-        SELECT * FROM celestial_bodies WHERE id = ?
+    body = cursor.execute(f"""
+        SELECT {BODY_JSON} FROM celestial_bodies b WHERE b.id = ?
     """, (body_id,)).fetchone()
 
     conn.close()
     if not body:
-        return jsonify({"error": "Celestial body not found."}), 404
+        return respond({"error": "Celestial body not found."}), 404
 
-    body['resources'] = json.loads(body['resources'])
-    return jsonify({"celestial_body": body})
+    return respond(f'{{"celestial_body":{body[0]}}}')
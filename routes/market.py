@@ -0,0 +1,92 @@
+from flask import Blueprint, request
+import math
+from db import get_connection
+from response_encoding import respond
+from order_book import MatchingUnavailable, cancel_order, lock_book, submit_order
+
+market_blueprint = Blueprint('market', __name__)
+
+# Most price levels returned per side by the depth endpoint
+MAX_DEPTH = 100
+
+def parse_order(data):
+    """Validate an order request body and return submit_order's arguments."""
+    side = data.get("side")
+    order_type = data.get("type", "limit")
+    if side not in ("buy", "sell"):
+        raise ValueError("side must be 'buy' or 'sell'.")
+    if order_type not in ("limit", "market"):
+        raise ValueError("type must be 'limit' or 'market'.")
+
+    base_currency_id = int(data["base_currency_id"])
+    quote_currency_id = int(data["quote_currency_id"])
+    if base_currency_id == quote_currency_id:
+        raise ValueError("base and quote currencies must differ.")
+
+    quantity = float(data["quantity"])
+    if not (math.isfinite(quantity) and quantity > 0):
+        raise ValueError("quantity must be positive and finite.")
+
+    price = None
+    if order_type == "limit":
+        price = float(data["price"])
+        if not (math.isfinite(price) and price > 0):
+            raise ValueError("price must be positive and finite.")
+
+    return int(data["player_id"]), base_currency_id, quote_currency_id, side, order_type, price, quantity
+
+# Place a limit or market order
+@market_blueprint.route('/api/market/orders', methods=['POST'])
+def place_order():
+    """Match an order against the pair's book; any limit remainder rests in the book."""
+    try:
+        order = parse_order(request.json)
+    except (KeyError, TypeError, ValueError) as error:
+        return respond({"error": f"Invalid order: {error}"}), 400
+
+    conn = get_connection()
+    try:
+        result = submit_order(conn, *order)
+    except MatchingUnavailable as error:
+        return respond({"error": str(error)}), 503
+    finally:
+        conn.close()
+    return respond(result)
+
+# Cancel a resting order
+@market_blueprint.route('/api/market/orders/<int:order_id>/cancel', methods=['POST'])
+def cancel_resting_order(order_id):
+    """Cancel one of the player's open orders."""
+    player_id = request.json["player_id"]
+
+    conn = get_connection()
+    try:
+        cancelled = cancel_order(conn, order_id, player_id)
+    except MatchingUnavailable as error:
+        return respond({"error": str(error)}), 503
+    finally:
+        conn.close()
+
+    if not cancelled:
+        return respond({"error": "Open order not found."}), 404
+    return respond({"message": f"Order {order_id} cancelled."})
+
+# Fetch the order book for a currency pair
+@market_blueprint.route('/api/market/book/<int:base_currency_id>/<int:quote_currency_id>', methods=['GET'])
+def get_order_book(base_currency_id, quote_currency_id):
+    """Return top of book and aggregated depth (?depth=N levels per side)."""
+    levels = min(max(request.args.get("depth", 10, type=int), 1), MAX_DEPTH)
+
+    conn = get_connection()
+    try:
+        book = lock_book(conn.cursor(), base_currency_id, quote_currency_id)
+    except MatchingUnavailable as error:
+        return respond({"error": str(error)}), 503
+    finally:
+        conn.close()
+
+    try:
+        depth = book.depth(levels)
+    finally:
+        book.lock.release()
+    return respond(depth)
@@ -0,0 +1,99 @@
+from flask import Blueprint, Response, request
+import json
+from db import get_connection
+from response_encoding import respond
+from events import bus
+from player_resources import get_resources
+from tick import current_tick
+
+stream_blueprint = Blueprint('stream', __name__)
+
+# Seconds between keep-alive comments on an idle stream
+KEEPALIVE_INTERVAL = 15
+
+# Notifications included in a snapshot
+SNAPSHOT_NOTIFICATIONS = 20
+
+def load_snapshot(player_id):
+    """Load everything a client needs to render a player from scratch."""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    player = cursor.execute("SELECT id FROM players WHERE id = ?", (player_id,)).fetchone()
+    if not player:
+        conn.close()
+        return None
+
+    tick = current_tick(cursor)
+    active_tasks = cursor.execute("""
+        SELECT at.id, t.name, t.duration, at.due_tick
+        FROM active_tasks at
+        JOIN tasks t ON at.task_id = t.id
+        WHERE at.player_id = ?
+    """, (player_id,)).fetchall()
+    notifications = cursor.execute("""
+        SELECT id, message, created_at FROM notifications
+        WHERE player_id = ?
+        ORDER BY id DESC LIMIT ?
+    """, (player_id, SNAPSHOT_NOTIFICATIONS)).fetchall()
+
+    snapshot = {
+        "tick": tick,
+        "resources": get_resources(cursor, player_id),
+        "active_tasks": [dict(task) for task in active_tasks],
+        "notifications": [dict(notification) for notification in notifications]
+    }
+    conn.close()
+    return snapshot
+
+def format_event(event_type, data, event_id):
+    """Encode one Server-Sent Event; its id carries the bus epoch so a resume after a restart is detected."""
+    return f"id: {bus.epoch}-{event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+def resume_position(last_event_id):
+    """Return the bus position to resume after, or None if the client needs a snapshot."""
+    epoch, _, position = last_event_id.partition("-")
+    if epoch != bus.epoch or not position.isdigit() or int(position) > bus.last_id:
+        return None
+    return int(position)
+
+# Stream a player's changes as Server-Sent Events
+@stream_blueprint.route('/api/stream/<int:player_id>', methods=['GET'])
+def stream_player_updates(player_id):
+    """Push a snapshot, then only what changed for the player after each tick or action."""
+    last_event_id = request.headers.get("Last-Event-ID", request.args.get("last_event_id", ""))
+
+    # A client can resume from its last event unless the server restarted since
+    after_id = resume_position(last_event_id)
+    snapshot = None
+    if after_id is None:
+        # Note the bus position first so changes committed while loading are replayed
+        after_id = bus.last_id
+        snapshot = load_snapshot(player_id)
+        if snapshot is None:
+            return respond({"error": "Player not found."}), 404
+
+    def generate():
+        position = after_id
+        if snapshot is not None:
+            yield format_event("snapshot", snapshot, position)
+        while True:
+            messages, newest, missed = bus.wait(player_id, position, KEEPALIVE_INTERVAL)
+            if missed:
+                # The client fell behind the event buffer; start it over
+                fresh = load_snapshot(player_id)
+                if fresh is None:
+                    # The player was deleted; end the stream
+                    return
+                yield format_event("snapshot", fresh, newest)
+            elif messages:
+                for event_id, payload in messages:
+                    yield format_event("update", payload, event_id)
+            else:
+                yield ": keepalive\n\n"
+            position = newest
+
+    return Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
@@ -0,0 +1,51 @@
+from flask import Blueprint, Response
+from db import pool_stats
+from read_path import read_path_stats
+from metrics import registry
+from player_cache import cache as player_cache
+from password_hashing import hashing_stats
+from response_cache import cache
+from response_encoding import encoding_stats, respond
+from users import user_cache
+
+system_blueprint = Blueprint('system', __name__)
+
+# Report database connection pool usage
+@system_blueprint.route('/api/system/db_pool', methods=['GET'])
+def get_pool_stats():
+    """Return connection pool counters and limits, and the read path's."""
+    return respond({"pool": pool_stats(), "read_path": read_path_stats()})
+
+# Report response cache effectiveness
+@system_blueprint.route('/api/system/response_cache', methods=['GET'])
+def get_response_cache_stats():
+    """Return response cache hit/miss counters and memory use, and MessagePack/compression counters."""
+    return respond({"response_cache": cache.snapshot(), "encoding": encoding_stats()})
+
+# Report password hashing and login lookup load
+@system_blueprint.route('/api/system/auth', methods=['GET'])
+def get_auth_stats():
+    """Return hashing pool counters and user lookup cache usage."""
+    return respond({"hashing": hashing_stats(), "user_cache": user_cache.snapshot()})
+
+# Report player state cache usage
+@system_blueprint.route('/api/system/player_cache', methods=['GET'])
+def get_player_cache_stats():
+    """Return player cache hit/miss and flush counters."""
+    return respond({"player_cache": player_cache.snapshot()})
+
+# Expose request, query and tick metrics for Prometheus
+@system_blueprint.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Return every metric, plus pool, cache and hashing stats as gauges, in Prometheus text format."""
+    gauges = {}
+    read_path = read_path_stats()
+    for prefix, snapshot in (("db_pool", pool_stats()), ("read_pool", read_path["pool"]),
+                             ("read_backup", read_path["backup"]), ("response_cache", cache.snapshot()),
+                             ("response_encoding", encoding_stats()),
+                             ("player_cache", player_cache.snapshot()),
+                             ("hashing", hashing_stats()), ("user_cache", user_cache.snapshot())):
+        for key, value in snapshot.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                gauges[f"exogenesis_{prefix}_{key}"] = value
+    return Response(registry.render(gauges), mimetype="text/plain; version=0.0.4")
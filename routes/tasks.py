@@ -1,11 +1,20 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, request
 from db import get_connection
+from response_encoding import records, respond
+from read_path import read_only
+from tick import complete_due_tasks, current_tick
+from player_cache import flush_player_cache
+from player_resources import deduct_resources, deduct_resources_in_order, get_resources, get_resources_batch
+from task_catalog import catalog
+from events import TickEvents, bus
+from batch import batch_response, next_ids, read_batch
 import json
 
 tasks_blueprint = Blueprint('tasks', __name__)
 
 # Fetch all tasks available to a player
 @tasks_blueprint.route('/api/tasks/<int:player_id>', methods=['GET'])
+@read_only
 def get_available_tasks(player_id):
     """Fetch all tasks available to the player based on their traits and resources."""
     conn = get_connection()
@@ -13,34 +22,37 @@ def get_available_tasks(player_id):
 
     # Fetch player data
     player = cursor.execute("""
-        SELECT resources FROM players WHERE id = ?
+        SELECT id FROM players WHERE id = ?
     """, (player_id,)).fetchone()
 
     if not player:
         conn.close()
-        return jsonify({"error": "Player not found."}), 404
-
-    resources = json.loads(player["resources"])
-
-    # Fetch all tasks
-    tasks = cursor.execute("SELECT * FROM tasks").fetchall()
-
-    # Filter tasks based on player resources
-    available_tasks = []
-    for task in tasks:
-        task_resources = json.loads(task["required_resources"])
-        if all(resources.get(resource, 0) >= amount for resource, amount in task_resources.items()):
-            available_tasks.append({
-                "id": task["id"],
-                "name": task["name"],
-                "description": task["description"],
-                "required_resources": task_resources,
-                "rewards": json.loads(task["rewards"]),
-                "duration": task["duration"]
-            })
+        return respond({"error": "Player not found."}), 404
 
+    resources = get_resources(cursor, player_id)
+
+    # Filter the cached task catalog against the player's resources
+    available_tasks = catalog.affordable(cursor, resources)
+
+    conn.close()
+    return respond({"tasks": available_tasks})
+
+# Fetch available tasks for many players at once
+@tasks_blueprint.route('/api/tasks/available', methods=['POST'])
+def get_available_tasks_batch():
+    """Fetch the tasks each of the given players can currently afford."""
+    try:
+        player_ids = read_batch(request.json, "player_ids", item_type=int)
+    except ValueError as error:
+        return respond({"error": str(error)}), 400
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    resources_by_player = get_resources_batch(cursor, player_ids)
+    available = catalog.affordable_batch(cursor, resources_by_player)
     conn.close()
-    return jsonify({"tasks": available_tasks})
+
+    return respond({"tasks": {str(player_id): tasks for player_id, tasks in available.items()}})
 
 # Assign a task to a player
 @tasks_blueprint.route('/api/tasks/assign', methods=['POST'])
@@ -53,16 +65,14 @@ def assign_task():
     conn = get_connection()
     cursor = conn.cursor()
 
-    # Fetch player resources
+    # Check the player exists
     player = cursor.execute("""
-        SELECT resources FROM players WHERE id = ?
+        SELECT id FROM players WHERE id = ?
     """, (player_id,)).fetchone()
 
     if not player:
         conn.close()
-        return jsonify({"error": "Player not found."}), 404
-
-    resources = json.loads(player["resources"])
+        return respond({"error": "Player not found."}), 404
 
     # Fetch task details
     task = cursor.execute("""
@@ -71,96 +81,162 @@ def assign_task():
 
     if not task:
         conn.close()
-        return jsonify({"error": "Task not found."}), 404
+        return respond({"error": "Task not found."}), 404
 
     task_resources = json.loads(task["required_resources"])
 
-    # Check if player has sufficient resources
-    if not all(resources.get(resource, 0) >= amount for resource, amount in task_resources.items()):
+    # Deduct resources in one conditional UPDATE; fails if any balance is too low
+    if not deduct_resources(cursor, player_id, task_resources):
+        conn.rollback()
         conn.close()
-        return jsonify({"error": "Insufficient resources for this task."}), 400
-
-    # Deduct resources from player
-    for resource, amount in task_resources.items():
-        resources[resource] -= amount
-
-    cursor.execute("""
-        UPDATE players
-        SET resources = ?
-        WHERE id = ?
-    """, (json.dumps(resources), player_id))
+        return respond({"error": "Insufficient resources for this task."}), 400
 
-    # Start the task
+    # Start the task, scheduled against the absolute tick it completes on
+    due_tick = current_tick(cursor) + task["duration"]
     cursor.execute("""
-        INSERT INTO active_tasks (player_id, task_id, ticks_remaining)
-        VALUES (?, ?, ?)
-    """, (player_id, task_id, task["duration"]))
+        INSERT INTO active_tasks (player_id, task_id, ticks_remaining, due_tick)
+        VALUES (?, ?, ?, ?)
+    """, (player_id, task_id, task["duration"], due_tick))
+    active_task_id = cursor.lastrowid
+    resources = get_resources(cursor, player_id)
 
     conn.commit()
     conn.close()
 
-    return jsonify({"message": f"Task '{task['name']}' assigned successfully!"})
+    # Push the new balances and task to the player's stream
+    bus.publish_player(player_id, {
+        "resources": resources,
+        "new_tasks": [{"id": active_task_id, "name": task["name"], "duration": task["duration"], "due_tick": due_tick}]
+    })
+
+    return respond({"message": f"Task '{task['name']}' assigned successfully!"})
+
+# Assign many tasks at once
+@tasks_blueprint.route('/api/tasks/assign_batch', methods=['POST'])
+def assign_tasks_batch():
+    """Assign a list of {player_id, task_id} in order, in one transaction, reporting per item.
+
+    Deductions run in request order under the write lock, so later items
+    for the same player see earlier deductions; the final balances and
+    the new tasks are then written with executemany.
+    """
+    try:
+        items = read_batch(request.json, "assignments")
+    except ValueError as error:
+        return respond({"error": str(error)}), 400
+
+    results = [None] * len(items)
+    requested = []
+    for index, item in enumerate(items):
+        try:
+            requested.append((index, int(item["player_id"]), int(item["task_id"])))
+        except (KeyError, TypeError, ValueError):
+            results[index] = {"index": index, "ok": False, "error": "player_id and task_id must be integers."}
+
+    player_ids = sorted({player_id for _, player_id, _ in requested})
+    task_ids = sorted({task_id for _, _, task_id in requested})
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        players = {row[0] for row in cursor.execute("""
+            SELECT id FROM players WHERE id IN (SELECT value FROM json_each(?))
+        """, (json.dumps(player_ids),))}
+        tasks = {row["id"]: row for row in cursor.execute("""
+            SELECT id, name, required_resources, duration FROM tasks WHERE id IN (SELECT value FROM json_each(?))
+        """, (json.dumps(task_ids),))}
+        tick = current_tick(cursor)
+
+        valid = []
+        for index, player_id, task_id in requested:
+            if player_id not in players:
+                results[index] = {"index": index, "ok": False, "error": "Player not found."}
+            elif task_id not in tasks:
+                results[index] = {"index": index, "ok": False, "error": "Task not found."}
+            else:
+                valid.append((index, player_id, task_id))
+
+        # Deduct in request order
+        applied, balances = deduct_resources_in_order(
+            cursor, [(player_id, json.loads(tasks[task_id]["required_resources"])) for _, player_id, task_id in valid])
+        assigned = []
+        for (index, player_id, task_id), ok in zip(valid, applied):
+            if ok:
+                assigned.append((index, player_id, task_id))
+            else:
+                results[index] = {"index": index, "ok": False, "error": "Insufficient resources for this task."}
+
+        ids = next_ids(cursor, "active_tasks", len(assigned))
+        cursor.executemany("""
+            INSERT INTO active_tasks (id, player_id, task_id, ticks_remaining, due_tick)
+            VALUES (?, ?, ?, ?, ?)
+        """, [(task_row_id, player_id, task_id, tasks[task_id]["duration"], tick + tasks[task_id]["duration"])
+              for task_row_id, (_, player_id, task_id) in zip(ids, assigned)])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    # Push new balances and tasks to the affected players' streams in one event
+    events = TickEvents()
+    for task_row_id, (index, player_id, task_id) in zip(ids, assigned):
+        task = tasks[task_id]
+        due_tick = tick + task["duration"]
+        results[index] = {"index": index, "ok": True, "id": task_row_id, "due_tick": due_tick}
+        events.append(player_id, "new_tasks", {"id": task_row_id, "name": task["name"], "duration": task["duration"], "due_tick": due_tick})
+    for player_id, resources in balances.items():
+        events.set_resources(player_id, resources)
+    bus.publish(players=events.players)
+
+    return respond(batch_response(results))
 
 # Fetch active tasks for a player
 @tasks_blueprint.route('/api/tasks/active/<int:player_id>', methods=['GET'])
+@read_only
 def get_active_tasks(player_id):
     """Fetch all active tasks for a player."""
     conn = get_connection()
     cursor = conn.cursor()
 
-    # Fetch active tasks for the player
+    # Fetch active tasks for the player; remaining ticks derive from the clock
     active_tasks = cursor.execute("""
-        SELECT at.id, t.name, at.ticks_remaining
+        SELECT at.id, t.name, t.duration, at.due_tick - gc.current_tick AS ticks_remaining
         FROM active_tasks at
         JOIN tasks t ON at.task_id = t.id
+        JOIN game_clock gc ON gc.id = 1
         WHERE at.player_id = ?
     """, (player_id,)).fetchall()
 
     conn.close()
-    return jsonify({"active_tasks": active_tasks})
+    return respond({"active_tasks": records(("id", "name", "duration", "ticks_remaining"), active_tasks)})
 
 # Complete tasks at the end of their duration
 @tasks_blueprint.route('/api/tasks/complete', methods=['POST'])
 def complete_tasks():
-    """Complete tasks with 0 ticks remaining and grant rewards to the player."""
+    """Complete tasks with 0 ticks remaining and grant rewards to the player.
+
+    Runs the tick's player cache and task stages, so cached balances pick
+    up the rewards and stream clients are told, as after a tick.
+    """
     conn = get_connection()
     cursor = conn.cursor()
+    events = TickEvents()
+
+    # Grant all rewards in bulk within a single transaction
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        tick = current_tick(cursor)
+        flush_player_cache(cursor, tick, events)
+        stats = complete_due_tasks(cursor, tick, events)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
 
-    # Fetch tasks that are ready to be completed
-    completed_tasks = cursor.execute("""
-        SELECT at.id as active_task_id, at.player_id, t.rewards
-        FROM active_tasks at
-        JOIN tasks t ON at.task_id = t.id
-        WHERE at.ticks_remaining = 0
-    """).fetchall()
-
-    for task in completed_tasks:
-        player_id = task["player_id"]
-        rewards = json.loads(task["rewards"])
-
-        # Fetch player resources
-        player = cursor.execute("""
-            SELECT resources FROM players WHERE id = ?
-        """, (player_id,)).fetchone()
-
-        resources = json.loads(player["resources"])
-
-        # Grant rewards to the player
-        for resource, amount in rewards.items():
-            resources[resource] = resources.get(resource, 0) + amount
-
-        cursor.execute("""
-            UPDATE players
-            SET resources = ?
-            WHERE id = ?
-        """, (json.dumps(resources), player_id))
-
-        # Remove the completed task
-        cursor.execute("""
-            DELETE FROM active_tasks WHERE id = ?
-        """, (task["active_task_id"],))
-
-    conn.commit()
-    conn.close()
-
-    return jsonify({"message": "All completed tasks have been processed."})
+    bus.publish(players=events.players)
+    return respond({"message": "All completed tasks have been processed.", **stats})
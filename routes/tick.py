@@ -0,0 +1,24 @@
+import os
+from flask import Blueprint
+from response_encoding import respond
+import tick
+
+tick_blueprint = Blueprint('tick', __name__)
+
+# Whether POST /api/tick/run may advance game time on demand; off unless a
+# load test or local debugging session sets EXOGENESIS_MANUAL_TICKS=1
+MANUAL_TICKS = os.environ.get("EXOGENESIS_MANUAL_TICKS", "0") == "1"
+
+# Report the stats of the most recent tick
+@tick_blueprint.route('/api/tick/stats', methods=['GET'])
+def get_tick_stats():
+    """Return duration and row counts of the most recent tick."""
+    return respond({"last_tick": tick.last_tick_stats})
+
+# Run a tick immediately
+@tick_blueprint.route('/api/tick/run', methods=['POST'])
+def run_tick_now():
+    """Run one tick right away and return its stats (only with manual ticks enabled)."""
+    if not MANUAL_TICKS:
+        return respond({"error": "Manual ticks are disabled."}), 403
+    return respond({"tick": tick.run_tick()})
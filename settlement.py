@@ -0,0 +1,97 @@
+import json
+
+from notifications import notify_from_select
+
+# Candle sizes in ticks; each settled trade updates one candle per resolution
+CANDLE_RESOLUTIONS = (1, 60, 3600)
+
+def record_candles(cursor, tick):
+    """Fold the exchanges due by `tick` into the candles of every resolution.
+
+    A trade buys `amount` of currency_to at `rate` units of currency_from,
+    so pairs are keyed as (base = currency_to_id, quote = currency_from_id).
+    """
+    cursor.execute("""
+        INSERT INTO exchange_candles
+            (base_currency_id, quote_currency_id, resolution, bucket, open, high, low, close, volume, notional)
+        SELECT t.base, t.quote, r.value, :tick / r.value * r.value,
+               MIN(t.open_rate), MAX(t.rate), MIN(t.rate), MIN(t.close_rate), SUM(t.amount), SUM(t.amount * t.rate)
+        FROM (
+            SELECT currency_to_id AS base, currency_from_id AS quote, amount, rate,
+                   FIRST_VALUE(rate) OVER pair AS open_rate,
+                   LAST_VALUE(rate) OVER pair AS close_rate
+            FROM currency_exchange
+            WHERE due_tick <= :tick
+            WINDOW pair AS (
+                PARTITION BY currency_to_id, currency_from_id ORDER BY id
+                ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+            )
+        ) t, json_each(:resolutions) r
+        GROUP BY t.base, t.quote, r.value
+        ON CONFLICT (base_currency_id, quote_currency_id, resolution, bucket) DO UPDATE SET
+            high = max(high, excluded.high),
+            low = min(low, excluded.low),
+            close = excluded.close,
+            volume = volume + excluded.volume,
+            notional = notional + excluded.notional
+    """, {"tick": tick, "resolutions": json.dumps(CANDLE_RESOLUTIONS)})
+    return cursor.rowcount
+
+def settle_due_exchanges(cursor, tick, events=None):
+    """Settle every currency exchange due by `tick` in bulk.
+
+    The buyer receives `amount` of currency_to and pays `amount * rate` of
+    currency_from; the seller gets the mirror image. All legs are summed per
+    (player, currency) and upserted into currency_balances with one
+    statement, buyer and seller notifications are inserted with one more,
+    the settled rows move to currency_exchange_history, and their prices
+    are folded into exchange_candles.
+    """
+    due = "FROM currency_exchange WHERE due_tick <= :tick"
+    params = {"tick": tick}
+
+    # Price history first, while the due rows are still in currency_exchange
+    candles_updated = record_candles(cursor, tick)
+
+    # Apply the aggregated balance changes
+    cursor.execute(f"""
+        INSERT INTO currency_balances (player_id, currency_id, amount)
+        SELECT player_id, currency_id, SUM(delta)
+        FROM (
+            SELECT buyer_id AS player_id, currency_to_id AS currency_id, amount AS delta {due}
+            UNION ALL
+            SELECT buyer_id, currency_from_id, -amount * rate {due}
+            UNION ALL
+            SELECT seller_id, currency_to_id, -amount {due}
+            UNION ALL
+            SELECT seller_id, currency_from_id, amount * rate {due}
+        )
+        GROUP BY player_id, currency_id
+        ON CONFLICT (player_id, currency_id) DO UPDATE SET amount = amount + excluded.amount
+    """, params)
+    balances_updated = cursor.rowcount
+
+    # Notify both sides of every settled exchange
+    notifications_sent = notify_from_select(cursor, f"""
+        SELECT buyer_id, printf('Exchange #%d settled: received %g of currency %d for %g of currency %d.',
+                                id, amount, currency_to_id, amount * rate, currency_from_id) {due}
+        UNION ALL
+        SELECT seller_id, printf('Exchange #%d settled: received %g of currency %d for %g of currency %d.',
+                                 id, amount * rate, currency_from_id, amount, currency_to_id) {due}
+    """, params, events)
+
+    # Archive the settled exchanges
+    cursor.execute(f"""
+        INSERT INTO currency_exchange_history
+            (id, buyer_id, seller_id, currency_from_id, currency_to_id, amount, rate, due_tick, settled_tick)
+        SELECT id, buyer_id, seller_id, currency_from_id, currency_to_id, amount, rate, due_tick, :tick {due}
+    """, params)
+    cursor.execute(f"DELETE {due}", params)
+    exchanges_settled = cursor.rowcount
+
+    return {
+        "exchanges_settled": exchanges_settled,
+        "balances_updated": balances_updated,
+        "notifications_sent": notifications_sent,
+        "candles_updated": candles_updated
+    }
@@ -1,5 +1,9 @@
 // Global Variables
 let playerId = null; // Placeholder for the player's ID
+let updateStream = null; // EventSource pushing the player's changes
+let currentTick = 0; // Latest tick seen on the stream
+let playerResources = {}; // Player resources as last pushed by the server
+let activeTasks = new Map(); // Active task ID -> task with its due_tick
 
 // Toast Notification System
 function showToast(message, type = "info") {
@@ -77,8 +81,11 @@ async function assignTask(taskId) {
         const data = await response.json();
         if (data.error) throw new Error(data.error);
         showToast(data.message, "success");
-        fetchPlayerData();
-        fetchActiveTasks();
+        // With a live stream the new balances and task arrive as an update
+        if (!updateStream) {
+            fetchPlayerData();
+            fetchActiveTasks();
+        }
     } catch (error) {
         showToast(error.message, "error");
     }
@@ -161,11 +168,52 @@ async function exploreBody(bodyId) {
     }
 }
 
+// Render active tasks from the locally tracked due ticks
+function renderActiveTasks() {
+    const tasks = [...activeTasks.values()].map(task => ({
+        ...task,
+        ticks_remaining: Math.max(task.due_tick - currentTick, 0)
+    }));
+    displayActiveTasks(tasks);
+}
+
+// Apply a snapshot or update pushed by the server
+function applyPlayerUpdate(update, isSnapshot) {
+    if (update.tick !== undefined) currentTick = update.tick;
+    if (isSnapshot) {
+        playerResources = {};
+        activeTasks = new Map();
+    }
+    if (update.resources) {
+        Object.assign(playerResources, update.resources);
+        updatePlayerResources(playerResources);
+        fetchAvailableTasks(); // Affordability only changes with resources
+    }
+    (update.active_tasks || []).concat(update.new_tasks || []).forEach(task => activeTasks.set(task.id, task));
+    (update.completed_tasks || []).forEach(taskId => activeTasks.delete(taskId));
+    (update.notifications || []).forEach(notification => {
+        if (!isSnapshot) showToast(notification.message, "info");
+    });
+    renderActiveTasks();
+}
+
+// Subscribe to server-pushed changes instead of polling
+function subscribeToUpdates() {
+    // The browser resends the last event ID when it reconnects
+    updateStream = new EventSource(`/api/stream/${playerId}`);
+    updateStream.addEventListener("snapshot", event => applyPlayerUpdate(JSON.parse(event.data), true));
+    updateStream.addEventListener("update", event => applyPlayerUpdate(JSON.parse(event.data), false));
+}
+
 // Initialize Game
 function initializeGame(playerIdParam) {
     playerId = playerIdParam;
-    fetchPlayerData();
-    fetchAvailableTasks();
-    fetchActiveTasks();
+    if (window.EventSource) {
+        subscribeToUpdates();
+    } else {
+        fetchPlayerData();
+        fetchAvailableTasks();
+        fetchActiveTasks();
+    }
     fetchGalacticMap();
 }
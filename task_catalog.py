@@ -0,0 +1,92 @@
+import json
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from db import table_version
+
+# One immutable build of the catalog; readers take a single reference to it
+CatalogSnapshot = namedtuple("CatalogSnapshot", ("version", "tasks", "resource_columns", "requirements"))
+
+class TaskCatalog:
+    """In-memory copy of the tasks table with requirements as a dense matrix.
+
+    `requirements` has one row per task and one column per resource, so
+    "which tasks can this player afford" is a single vectorized comparison.
+    The catalog is rebuilt whenever the tasks table's version changes; each
+    build is published as one CatalogSnapshot, so a reader never pairs the
+    tasks of one build with the matrix of another.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = CatalogSnapshot(None, [], {}, np.zeros((0, 0)))
+
+    def refresh(self, cursor):
+        """Rebuild the catalog if the tasks table changed since the last build; return the current snapshot."""
+        version = table_version(cursor, "tasks")
+        snapshot = self.current
+        if version == snapshot.version:
+            return snapshot
+        with self.lock:
+            snapshot = self.current
+            if version == snapshot.version:
+                return snapshot
+            rows = cursor.execute("SELECT * FROM tasks ORDER BY id").fetchall()
+
+            tasks = []
+            resource_columns = {}
+            for row in rows:
+                required = json.loads(row["required_resources"])
+                for resource in required:
+                    resource_columns.setdefault(resource, len(resource_columns))
+                tasks.append({
+                    "id": row["id"],
+                    "name": row["name"],
+                    "description": row["description"],
+                    "required_resources": required,
+                    "rewards": json.loads(row["rewards"]),
+                    "duration": row["duration"]
+                })
+
+            requirements = np.zeros((len(tasks), len(resource_columns)))
+            for i, task in enumerate(tasks):
+                for resource, amount in task["required_resources"].items():
+                    requirements[i, resource_columns[resource]] = amount
+            requirements.flags.writeable = False
+
+            self.current = snapshot = CatalogSnapshot(version, tasks, resource_columns, requirements)
+            return snapshot
+
+    @staticmethod
+    def resource_vector(snapshot, resources):
+        """Lay out a {resource: amount} dict along the snapshot's resource columns."""
+        vector = np.zeros(len(snapshot.resource_columns))
+        for resource, column in snapshot.resource_columns.items():
+            vector[column] = resources.get(resource, 0)
+        return vector
+
+    def affordable(self, cursor, resources):
+        """Return the tasks a player holding `resources` can afford."""
+        snapshot = self.refresh(cursor)
+        mask = (snapshot.requirements <= self.resource_vector(snapshot, resources)).all(axis=1)
+        return [snapshot.tasks[i] for i in np.flatnonzero(mask)]
+
+    def affordable_batch(self, cursor, resources_by_player, chunk_size=4096):
+        """Return {player_id: [tasks]} for many players in one pass per chunk."""
+        snapshot = self.refresh(cursor)
+        player_ids = list(resources_by_player)
+        result = {}
+        for start in range(0, len(player_ids), chunk_size):
+            chunk = player_ids[start:start + chunk_size]
+            balances = np.array([self.resource_vector(snapshot, resources_by_player[pid]) for pid in chunk])
+            balances = balances.reshape(len(chunk), len(snapshot.resource_columns))
+            # players x tasks: a task is affordable if every requirement is covered
+            mask = (snapshot.requirements[None, :, :] <= balances[:, None, :]).all(axis=2)
+            for row, player_id in enumerate(chunk):
+                result[player_id] = [snapshot.tasks[i] for i in np.flatnonzero(mask[row])]
+        return result
+
+# Shared catalog used by the task routes
+catalog = TaskCatalog()
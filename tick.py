@@ -0,0 +1,141 @@
+import logging
+import sqlite3
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+from db import get_connection
+from events import TickEvents, bus
+from legislation import resolve_due_legislation
+from metrics import registry
+from player_cache import flush_player_cache
+from settlement import settle_due_exchanges
+from tick_shards import complete_due_tasks_sharded, sharding_enabled, start_tick_shards
+
+logger = logging.getLogger(__name__)
+
+# Tick interval in seconds
+TICK_INTERVAL = 10
+
+# Stats of the most recent tick, served by /api/tick/stats
+last_tick_stats = {}
+
+def current_tick(cursor):
+    """Return the current game tick."""
+    return cursor.execute("SELECT current_tick FROM game_clock WHERE id = 1").fetchone()[0]
+
+def advance_clock(cursor):
+    """Move the game clock forward by one tick and return the new tick."""
+    cursor.execute("UPDATE game_clock SET current_tick = current_tick + 1 WHERE id = 1")
+    return current_tick(cursor)
+
+def complete_due_tasks(cursor, tick, events=None):
+    """Grant rewards for every task due by `tick` in bulk and remove those tasks.
+
+    Only rows due by `tick` are read (via the due_tick index), so the cost
+    follows the number of completions rather than the number of tasks in
+    flight. Rewards are summed per (player, resource) and upserted into
+    player_resources with a single statement. When `events` is given, the
+    new balances and completed task ids are recorded per player.
+    """
+    balances = cursor.execute("""
+        INSERT INTO player_resources (player_id, resource, amount)
+        SELECT at.player_id, r.key, SUM(r.value)
+        FROM active_tasks at INDEXED BY idx_active_tasks_due_tick
+        JOIN tasks t ON at.task_id = t.id, json_each(t.rewards) r
+        WHERE at.due_tick <= ?
+        GROUP BY at.player_id, r.key
+        ON CONFLICT (player_id, resource) DO UPDATE SET amount = amount + excluded.amount
+        RETURNING player_id, resource, amount
+    """, (tick,)).fetchall()
+
+    # Remove the completed tasks
+    completed = cursor.execute("""
+        DELETE FROM active_tasks WHERE due_tick <= ?
+        RETURNING id, player_id
+    """, (tick,)).fetchall()
+
+    if events is not None:
+        for row in balances:
+            events.set_resources(row["player_id"], {row["resource"]: row["amount"]})
+        for row in completed:
+            events.append(row["player_id"], "completed_tasks", row["id"])
+
+    return {"tasks_completed": len(completed), "rewards_granted": len(balances)}
+
+# Stages run in order inside the tick transaction, each called as
+# stage(cursor, tick, events) where events collects per-player changes
+TICK_STAGES = [
+    ("player_cache", flush_player_cache),
+    ("tasks", complete_due_tasks),
+    ("settlement", settle_due_exchanges),
+    ("legislation", resolve_due_legislation),
+]
+
+# The same stages with task rewards summed by worker processes, used when
+# TICK_SHARD_SETTINGS["workers"] > 1 (see tick_shards.py); the other stages
+# run on the tick thread either way. Settlement stays serial: its legs are
+# keyed by buyer and seller alike, so no player_id range splits its scan.
+# A sharded stage gathers every shard's results before writing, so if the
+# pool breaks the matching TICK_STAGES entry runs instead
+SHARDED_TICK_STAGES = [
+    ("player_cache", flush_player_cache),
+    ("tasks", complete_due_tasks_sharded),
+    ("settlement", settle_due_exchanges),
+    ("legislation", resolve_due_legislation),
+]
+
+def run_tick(conn=None):
+    """Run every tick stage in one transaction and return the tick stats."""
+    global last_tick_stats
+    own_connection = conn is None
+    if own_connection:
+        conn = get_connection()
+    cursor = conn.cursor()
+
+    started = time.perf_counter()
+    stats = {}
+    events = TickEvents()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        stats["tick"] = advance_clock(cursor)
+        stage_ms = {}
+        stages = SHARDED_TICK_STAGES if sharding_enabled() else TICK_STAGES
+        for index, (name, stage) in enumerate(stages):
+            stage_started = time.perf_counter()
+            try:
+                stats[name] = stage(cursor, stats["tick"], events)
+            except BrokenProcessPool:
+                stats[name] = TICK_STAGES[index][1](cursor, stats["tick"], events)
+            stage_seconds = time.perf_counter() - stage_started
+            registry.observe("exogenesis_tick_stage_duration_seconds", stage_seconds, stage=name)
+            stage_ms[name] = round(stage_seconds * 1000, 3)
+        commit_started = time.perf_counter()
+        conn.commit()
+        registry.observe("exogenesis_tick_stage_duration_seconds", time.perf_counter() - commit_started, stage="commit")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if own_connection:
+            conn.close()
+
+    # Push the committed changes to stream clients
+    bus.publish(players=events.players, broadcast={"tick": stats["tick"]})
+
+    duration = time.perf_counter() - started
+    registry.observe("exogenesis_tick_duration_seconds", duration)
+    stats["stage_ms"] = stage_ms
+    stats["duration_ms"] = round(duration * 1000, 3)
+    last_tick_stats = stats
+    logger.info("Tick finished in %.1f ms: %s", stats["duration_ms"], stats)
+    return stats
+
+def tick_loop(interval=TICK_INTERVAL):
+    """Run a tick every `interval` seconds, forever."""
+    start_tick_shards()
+    while True:
+        time.sleep(interval)
+        try:
+            run_tick()
+        except sqlite3.Error:
+            logger.exception("Tick failed; retrying next interval")
@@ -0,0 +1,153 @@
+import json
+import os
+import sqlite3
+import threading
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import db
+
+logger = logging.getLogger(__name__)
+
+# Worker processes for partitioned ticks; below 2, ticks run serially on the tick thread
+TICK_SHARD_SETTINGS = {
+    "workers": int(os.environ.get("EXOGENESIS_TICK_WORKERS", "0")),
+}
+
+# Read-only connection per database path, reused by a worker across ticks
+_worker_connections = {}
+
+def worker_connection(db_path):
+    """Return this worker process's read-only connection to `db_path`."""
+    conn = _worker_connections.get(db_path)
+    if conn is None:
+        conn = _worker_connections[db_path] = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    return conn
+
+def open_shard(db_path, tick, shard, shards):
+    """Open the worker's connection ahead of the first tick."""
+    worker_connection(db_path)
+
+def shard_range(conn, shard, shards):
+    """Return the (first, last) player_id of `shard` out of `shards` equal id ranges."""
+    last_id = conn.execute("SELECT IFNULL(MAX(id), 0) FROM players").fetchone()[0]
+    width = last_id // shards + 1
+    return shard * width, (shard + 1) * width - 1
+
+def task_shard(db_path, tick, shard, shards):
+    """Sum the rewards of the shard's tasks due by `tick` and list those tasks.
+
+    Runs in a worker. Players are split into contiguous player_id ranges,
+    one per shard, so each worker walks only its own slice of the
+    (player_id, due_tick) index rather than the whole due set.
+    """
+    conn = worker_connection(db_path)
+    first, last = shard_range(conn, shard, shards)
+    rewards = conn.execute("""
+        SELECT at.player_id, r.key, SUM(r.value)
+        FROM active_tasks at INDEXED BY idx_active_tasks_player_due
+        JOIN tasks t ON at.task_id = t.id, json_each(t.rewards) r
+        WHERE at.player_id BETWEEN ? AND ? AND at.due_tick <= ?
+        GROUP BY at.player_id, r.key
+    """, (first, last, tick)).fetchall()
+    completed = conn.execute("""
+        SELECT id FROM active_tasks INDEXED BY idx_active_tasks_player_due
+        WHERE player_id BETWEEN ? AND ? AND due_tick <= ?
+    """, (first, last, tick)).fetchall()
+    return rewards, [row[0] for row in completed]
+
+class ShardPool:
+    """Process pool that runs one function per shard and waits for all of them.
+
+    The tick coordinator holds the write lock (BEGIN IMMEDIATE) while the
+    workers read, so every shard sees the same committed state, and no
+    stage may write a table a later sharded stage reads in the same tick.
+    If a worker dies the pool is dropped, run() raises BrokenProcessPool,
+    and the next call starts a new pool.
+    """
+
+    def __init__(self):
+        self.executor = None
+        self.workers = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Create the worker processes on first use; return the executor and its worker count."""
+        with self.lock:
+            if self.executor is None:
+                self.workers = TICK_SHARD_SETTINGS["workers"]
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self.executor, self.workers
+
+    def run(self, function, tick):
+        """Run `function(db_path, tick, shard, shards)` for every shard; the results are the barrier."""
+        executor, workers = self.start()
+        try:
+            futures = [executor.submit(function, db.DB_PATH, tick, shard, workers) for shard in range(workers)]
+            return [future.result() for future in futures]
+        except BrokenProcessPool:
+            logger.error("Tick shard worker died; starting a new pool on the next tick")
+            self.discard(executor)
+            raise
+
+    def discard(self, executor):
+        """Drop a pool broken by a dead worker, if it is still the current one."""
+        with self.lock:
+            if self.executor is not executor:
+                return
+            self.executor = None
+        executor.shutdown(wait=False)
+
+    def shutdown(self):
+        """Stop the workers; the next tick starts a new pool with current settings."""
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+_pool = ShardPool()
+
+def sharding_enabled():
+    """Whether ticks run their per-player work in worker processes."""
+    return TICK_SHARD_SETTINGS["workers"] > 1
+
+def start_tick_shards():
+    """Start the worker processes and their connections now rather than on the first tick."""
+    if sharding_enabled():
+        _pool.run(open_shard, 0)
+
+def configure_tick_shards(**settings):
+    """Change shard settings; the pool restarts with them on the next tick."""
+    unknown = set(settings) - set(TICK_SHARD_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown tick shard settings: {', '.join(sorted(unknown))}")
+    TICK_SHARD_SETTINGS.update(settings)
+    _pool.shutdown()
+
+def complete_due_tasks_sharded(cursor, tick, events=None):
+    """Partitioned complete_due_tasks: workers sum rewards per shard, then one upsert applies them all."""
+    results = _pool.run(task_shard, tick)
+    rewards = [row for shard_rewards, _ in results for row in shard_rewards]
+    completed_ids = [task_id for _, shard_completed in results for task_id in shard_completed]
+
+    balances = cursor.execute("""
+        INSERT INTO player_resources (player_id, resource, amount)
+        SELECT value ->> 0, value ->> 1, value ->> 2 FROM json_each(?) WHERE true
+        ON CONFLICT (player_id, resource) DO UPDATE SET amount = amount + excluded.amount
+        RETURNING player_id, resource, amount
+    """, (json.dumps(rewards),)).fetchall()
+
+    # Remove the completed tasks
+    completed = cursor.execute("""
+        DELETE FROM active_tasks WHERE id IN (SELECT value FROM json_each(?))
+        RETURNING id, player_id
+    """, (json.dumps(completed_ids),)).fetchall()
+
+    if events is not None:
+        for row in balances:
+            events.set_resources(row["player_id"], {row["resource"]: row["amount"]})
+        for row in completed:
+            events.append(row["player_id"], "completed_tasks", row["id"])
+
+    return {"tasks_completed": len(completed), "rewards_granted": len(balances)}
@@ -0,0 +1,65 @@
+import threading
+from collections import OrderedDict
+
+# Most usernames kept in the lookup cache
+USER_CACHE_MAX_ENTRIES = 100000
+
+class UserCache:
+    """LRU cache of username -> (id, password_hash) for logins.
+
+    Only existing users are cached, so a registration never has a stale
+    "missing" entry to clear. Any code that changes or removes a user must
+    call invalidate() for that username.
+    """
+
+    def __init__(self, max_entries=USER_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, username):
+        """Return the cached (id, password_hash) of a user, or None."""
+        with self.lock:
+            entry = self.entries.get(username)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(username)
+            self.stats["hits"] += 1
+            return entry
+
+    def put(self, username, entry):
+        """Cache a user, evicting the least recently used beyond the limit."""
+        with self.lock:
+            self.entries[username] = entry
+            self.entries.move_to_end(username)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, username):
+        """Forget a user after a write."""
+        with self.lock:
+            if self.entries.pop(username, None) is not None:
+                self.stats["invalidations"] += 1
+
+    def snapshot(self):
+        """Return hit/miss counters and current usage."""
+        with self.lock:
+            return {**self.stats, "entries": len(self.entries), "max_entries": self.max_entries}
+
+# Shared cache for login lookups
+user_cache = UserCache()
+
+def find_user(cursor, username):
+    """Return (id, password_hash) for a username, or None, using the cache."""
+    entry = user_cache.get(username)
+    if entry is None:
+        row = cursor.execute("""
+            SELECT id, password_hash FROM users WHERE username = ?
+        """, (username,)).fetchone()
+        if row is None:
+            return None
+        entry = (row["id"], row["password_hash"])
+        user_cache.put(username, entry)
+    return entry